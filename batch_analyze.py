@@ -0,0 +1,273 @@
+"""
+Batch Analysis Script for Never-Tired-Archaeologist
+
+Re-analyzes large document collections through the Message Batches API.
+Submission and collection can run in separate invocations (e.g. submit in
+the evening, collect the next morning); batch ids are kept in the database.
+
+Usage:
+    python batch_analyze.py submit <source_dir> [--pattern "*.md"]
+    python batch_analyze.py status
+    python batch_analyze.py collect [--wait]
+    python batch_analyze.py run <source_dir> --fake    # complete offline flow
+"""
+
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from src.batch import BatchAnalyzer
+from src.database import DocDatabase
+from src.embedder import LocalEmbedder
+from src.fake_anthropic import FAKE_DB_PATH, FakeAnthropicServer
+from src.ledger import UsageLedger
+from src.normalize import TextNormalizer
+from src.extractors import extract_document
+
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('batch_analyze.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def submit_directory(
+    analyzer: BatchAnalyzer,
+    db: DocDatabase,
+    source_dir: Path,
+    pattern: str,
+    normalizer: Optional[TextNormalizer] = None
+) -> List[str]:
+    """
+    Submit all new documents of a directory as message batches.
+
+    Args:
+        analyzer: Batch analyzer
+        db: Database (used to skip documents that are already stored)
+        source_dir: Directory to scan
+        pattern: Glob pattern for files
+        normalizer: Optional noise removal applied to the submitted text
+
+    Returns:
+        Created batch ids
+    """
+    documents: List[Tuple[str, str, Optional[str]]] = []
+    seen = set()
+
+    for filepath in sorted(source_dir.glob(pattern)):
+        if not filepath.is_file():
+            continue
+        try:
+            document = extract_document(filepath)
+        except (OSError, ValueError, RuntimeError) as e:
+            logger.error(f"[ERROR] {filepath.name}: {e}")
+            continue
+
+        content, content_hash = document.text, document.content_hash
+        if not content.strip():
+            continue
+
+        if content_hash in seen or db.document_exists(content_hash, content) or analyzer.is_pending(content_hash):
+            logger.info(f"[SKIP] {filepath.name} - already stored or queued")
+            continue
+
+        seen.add(content_hash)
+        if normalizer is not None:
+            content = normalizer.process(content)[0]
+        documents.append((content_hash, content, str(filepath)))
+
+    if not documents:
+        logger.info("No new documents to submit")
+        return []
+
+    logger.info(f"Submitting {len(documents)} documents...")
+    return analyzer.submit(documents)
+
+
+def collect_batch(
+    analyzer: BatchAnalyzer,
+    db: DocDatabase,
+    embedder: LocalEmbedder,
+    batch_id: str,
+    normalizer: Optional[TextNormalizer] = None
+) -> Tuple[int, int]:
+    """
+    Collect an ended batch, embed the documents and store them.
+
+    Args:
+        analyzer: Batch analyzer
+        db: Database to store documents in
+        embedder: Embedding generator
+        batch_id: Message batch id
+        normalizer: Optional noise removal applied to the embedded text
+            (must match the one used at submission)
+
+    Returns:
+        Tuple of (stored, failed) counts
+    """
+    results = analyzer.collect(batch_id)
+    sources = analyzer.get_items(batch_id)
+
+    pending = []
+    failed = 0
+    for content_hash, metadata in results.items():
+        if isinstance(metadata, Exception):
+            logger.error(f"[ERROR] {sources.get(content_hash)}: {metadata}")
+            failed += 1
+            continue
+
+        source_path = sources.get(content_hash)
+        try:
+            document = extract_document(Path(source_path))
+        except (OSError, TypeError, ValueError, RuntimeError) as e:
+            analyzer.mark_item(batch_id, content_hash, "failed", f"Source unavailable: {e}")
+            failed += 1
+            continue
+
+        # The file may have been edited since submission
+        content = document.text
+        if document.content_hash != content_hash:
+            analyzer.mark_item(batch_id, content_hash, "failed", "Source changed since submission")
+            logger.warning(f"[SKIP] {source_path} changed since submission")
+            failed += 1
+            continue
+
+        if db.document_exists(content_hash, content):
+            analyzer.mark_item(batch_id, content_hash, "duplicate")
+            continue
+
+        pending.append((content_hash, content, metadata, source_path))
+
+    stored = 0
+    if pending:
+        embeddings = embedder.generate_embeddings_batch([
+            normalizer.normalize(content) if normalizer else content for _, content, _, _ in pending
+        ])
+        for (content_hash, content, metadata, source_path), embedding in zip(pending, embeddings):
+            try:
+                doc_id = db.add_document(content, metadata, embedding)
+                analyzer.mark_item(batch_id, content_hash, "stored")
+                logger.info(f"[OK] {Path(source_path).name} -> ID {doc_id}: {metadata.title}")
+                stored += 1
+            except (ValueError, RuntimeError) as e:
+                analyzer.mark_item(batch_id, content_hash, "failed", str(e))
+                logger.error(f"[ERROR] {source_path}: {e}")
+                failed += 1
+
+    analyzer.mark_collected(batch_id)
+    return stored, failed
+
+
+def print_status(analyzer: BatchAnalyzer) -> None:
+    """Print all known batches"""
+    batches = analyzer.get_batches()
+    if not batches:
+        print("No batches submitted yet.")
+        return
+
+    print(f"{'Batch ID':<44} {'Status':<12} {'Requests':>8}  Created")
+    print("-" * 90)
+    for row in batches:
+        status = row["status"]
+        if status not in ("ended", "collected"):
+            status = analyzer.refresh(row["batch_id"])
+        print(f"{row['batch_id']:<44} {status:<12} {row['request_count']:>8}  {row['created_at']}")
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk document analysis via the Message Batches API")
+    parser.add_argument("--fake", action="store_true",
+                        help=f"Use an in-process fake API (offline; only meaningful with 'run'); stores into {FAKE_DB_PATH}")
+    parser.add_argument("--db", type=str, help=f"Database path (default: archaeologist.db, {FAKE_DB_PATH} with --fake)")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="Submit and embed the text as read (keep images, boilerplate, whitespace)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="Submit new documents of a directory")
+    submit_parser.add_argument("source_dir", type=str)
+    submit_parser.add_argument("--pattern", "-p", type=str, default="*.md")
+
+    subparsers.add_parser("status", help="Show status of submitted batches")
+
+    collect_parser = subparsers.add_parser("collect", help="Store results of ended batches")
+    collect_parser.add_argument("--wait", action="store_true", help="Wait for in-progress batches")
+    collect_parser.add_argument("--poll-interval", type=float, default=60.0)
+
+    run_parser = subparsers.add_parser("run", help="Submit, wait and collect in one go")
+    run_parser.add_argument("source_dir", type=str)
+    run_parser.add_argument("--pattern", "-p", type=str, default="*.md")
+    run_parser.add_argument("--poll-interval", type=float, default=60.0)
+
+    args = parser.parse_args()
+    args.db = args.db or (FAKE_DB_PATH if args.fake else "archaeologist.db")
+
+    fake_server = FakeAnthropicServer().start() if args.fake else None
+    ledger = UsageLedger(args.db)
+    normalizer = None if args.no_normalize else TextNormalizer()
+    if fake_server:
+        analyzer = BatchAnalyzer(args.db, api_key="fake", base_url=fake_server.url, ledger=ledger)
+        poll_interval = 0.5
+    else:
+        analyzer = BatchAnalyzer(args.db, ledger=ledger)
+        poll_interval = getattr(args, "poll_interval", 60.0)
+
+    db = DocDatabase(args.db)
+
+    try:
+        if args.command == "status":
+            print_status(analyzer)
+            return
+
+        if args.command in ("submit", "run"):
+            source_dir = Path(args.source_dir)
+            if not source_dir.exists():
+                logger.error(f"Source directory does not exist: {source_dir}")
+                sys.exit(1)
+            batch_ids = submit_directory(analyzer, db, source_dir, args.pattern, normalizer)
+            for batch_id in batch_ids:
+                print(f"Submitted: {batch_id}")
+            if args.command == "submit":
+                return
+
+        wait = args.command == "run" or args.wait
+        embedder = LocalEmbedder()
+        total_stored = total_failed = 0
+
+        for row in analyzer.get_batches():
+            batch_id = row["batch_id"]
+            if row["status"] == "collected":
+                continue
+            if wait:
+                analyzer.wait(batch_id, poll_interval=poll_interval)
+            elif analyzer.refresh(batch_id) != "ended":
+                logger.info(f"Batch {batch_id} still in progress")
+                continue
+
+            stored, failed = collect_batch(analyzer, db, embedder, batch_id, normalizer)
+            total_stored += stored
+            total_failed += failed
+
+        print(f"\nStored: {total_stored}, failed: {total_failed}")
+        if total_failed:
+            sys.exit(1)
+
+    finally:
+        db.close()
+        analyzer.close()
+        ledger.close()
+        if fake_server:
+            fake_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,20 @@ Tests the pipeline with multiple sample documents to validate robustness.
 import logging
 import sys
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 import time
 
 from src.database import DocDatabase
 from src.embedder import LocalEmbedder
+from src.cache import MetadataCache
+from src.deadletter import DeadLetterQueue
+from src.fake_anthropic import FAKE_DB_PATH, FakeAnthropicServer
+from src.ledger import UsageLedger
 from src.llm import Analyzer
+from src.routing import ModelRouter
 from src.models import DocumentMetadata
+from src.normalize import TextNormalizer
+from src.reader import read_document
 
 
 # Configure logging
@@ -31,10 +38,29 @@ logger = logging.getLogger(__name__)
 class BatchTester:
     """Batch testing utility for document processing pipeline"""
 
-    def __init__(self):
-        self.db = DocDatabase()
+    def __init__(
+        self,
+        route_models: bool = False,
+        base_url: Optional[str] = None,
+        normalize: bool = True,
+        dead_letters: Optional[DeadLetterQueue] = None,
+        db_path: str = "archaeologist.db"
+    ):
+        self.db = DocDatabase(db_path)
+        # Recorded with dead letters, so retry_failed.py rebuilds the tester with them
+        self.options = {"route_models": route_models, "normalize": normalize}
+        # Failed documents are recorded with their error class for retry_failed.py
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetterQueue(db_path)
+        self.normalizer = TextNormalizer() if normalize else None
         self.embedder = LocalEmbedder()
-        self.analyzer = Analyzer()
+        self.ledger = UsageLedger(db_path)
+        self.analyzer = Analyzer(
+            cache=MetadataCache(db_path),
+            ledger=self.ledger,
+            router=ModelRouter() if route_models else None,
+            api_key="fake" if base_url else None,
+            base_url=base_url
+        )
         self.results: List[Dict] = []
 
     def create_test_documents(self, output_dir: Path = Path("test_documents")):
@@ -167,27 +193,35 @@ Mathematical notation: ∑ ∫ √ ∞ ≈ ≠
         start_time = time.time()
 
         try:
-            # Read file
-            content = filepath.read_text(encoding='utf-8')
+            # Read and hash file in one pass
+            document = read_document(filepath)
+            content, content_hash = document.text, document.content_hash
             result["content_length"] = len(content)
 
             # Check for duplicates
-            content_hash = self.db._compute_hash(content)
-            if self.db.document_exists(content_hash):
+            if self.db.document_exists(content_hash, content):
+                self.dead_letters.resolve(filepath)
                 result["error"] = "Duplicate (already in database)"
                 result["processing_time"] = time.time() - start_time
                 return result
 
+            # Strip noise from the text that is embedded and analyzed
+            text = content
+            if self.normalizer is not None:
+                text, report = self.normalizer.process(content)
+                result["tokens_saved"] = report["tokens_saved"]
+
             # Generate embedding
-            embedding = self.embedder.generate_embedding(content)
+            embedding = self.embedder.generate_embedding(text)
             result["embedding_dim"] = len(embedding)
 
             # Analyze with Claude
-            metadata = self.analyzer.analyze_text(content)
+            metadata = self.analyzer.analyze_text(text)
             result["metadata"] = metadata.model_dump()
 
             # Store in database
             doc_id = self.db.add_document(content, metadata, embedding)
+            self.dead_letters.resolve(filepath, doc_id)
 
             result["success"] = True
             result["doc_id"] = doc_id
@@ -196,9 +230,11 @@ Mathematical notation: ∑ ∫ √ ∞ ≈ ≠
             logger.info(f"[OK] {filepath.name} processed successfully in {result['processing_time']:.2f}s")
 
         except Exception as e:
+            letter = self.dead_letters.record(filepath, e, "batch_test", {"options": self.options})
             result["error"] = str(e)
+            result["error_class"] = letter.error_class
             result["processing_time"] = time.time() - start_time
-            logger.error(f"[ERROR] {filepath.name} failed: {e}")
+            logger.error(f"[ERROR] {filepath.name} failed ({letter.error_class}): {e}")
 
         return result
 
@@ -263,6 +299,13 @@ Mathematical notation: ∑ ∫ √ ∞ ≈ ≠
             "total_processing_time": total_time,
             "avg_processing_time": avg_time,
             "avg_content_length": avg_length,
+            "llm_cache": self.analyzer.cache.stats(),
+            "llm_usage": self.analyzer.get_usage_stats(),
+            "llm_parse": self.analyzer.get_parse_stats(),
+            "llm_routes": self.analyzer.get_route_stats(),
+            "llm_ledger": self.ledger.run_totals(),
+            "normalization": self.normalizer.get_stats() if self.normalizer is not None else None,
+            "dead_letters": self.dead_letters.stats(),
             "errors": errors
         }
 
@@ -279,6 +322,22 @@ Mathematical notation: ∑ ∫ √ ∞ ≈ ≠
         logger.info(f"Total Processing Time: {summary['total_processing_time']:.2f}s")
         logger.info(f"Avg Processing Time:  {summary['avg_processing_time']:.2f}s")
         logger.info(f"Avg Content Length:   {summary['avg_content_length']:.0f} chars")
+        logger.info(f"LLM Cache Hits:       {summary['llm_cache']['hits']} (${summary['llm_cache']['saved_usd']:.4f} saved)")
+        usage = summary['llm_usage']
+        logger.info(f"Prompt Cache Tokens:  {usage['cache_read_input_tokens']} read / {usage['cache_creation_input_tokens']} written")
+        logger.info(f"Avg API Latency:      {usage['avg_latency_s']:.2f}s")
+        parse = summary['llm_parse']
+        logger.info(f"Parse Failures:       {parse['failure_rate'] * 100:.1f}% (first pass {parse['first_pass_failure_rate'] * 100:.1f}%, {parse['repaired']} repaired)")
+        if summary['normalization']:
+            logger.info(f"Tokens Normalized Away: ~{summary['normalization']['tokens_saved']} ({summary['normalization']['saved_ratio'] * 100:.1f}%)")
+        ledger = summary['llm_ledger']
+        logger.info(f"Estimated API Cost:   ${ledger['cost_usd']:.4f} ({ledger['requests']} requests, run {ledger['run']})")
+        for route, stats in summary['llm_routes'].items():
+            logger.info(f"Route {route + ':':<15}{stats['documents']} docs, {stats['escalations']} escalated, avg {stats['avg_latency_s']:.2f}s, ${stats['cost_usd']:.4f}")
+
+        letters = summary['dead_letters']
+        if letters['open']:
+            logger.info(f"Dead Letters:         {letters['open']} open, {letters['retrying']} retry scheduled (retry_failed.py)")
 
         if summary['errors']:
             logger.info("")
@@ -305,7 +364,16 @@ def main():
     """Main entry point"""
     logger.info("Initializing Batch Tester...")
 
-    tester = BatchTester()
+    # --fake: deterministic local API (seeded latency), no network and no costs; results
+    # go to a separate database so fake metadata never reaches real runs
+    fake_server = FakeAnthropicServer(latency=0.5, jitter=0.25, seed=0).start() if "--fake" in sys.argv else None
+
+    tester = BatchTester(
+        route_models="--route-models" in sys.argv,
+        base_url=fake_server.url if fake_server else None,
+        normalize="--no-normalize" not in sys.argv,
+        db_path=FAKE_DB_PATH if fake_server else "archaeologist.db"
+    )
 
     # Create test documents if they don't exist
     test_dir = Path("test_documents")
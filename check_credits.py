@@ -1,15 +1,21 @@
 """
 Check Anthropic API Credits and Usage
+
+Usage:
+    python check_credits.py                       # test request against the API
+    python check_credits.py --offline             # usage/cost report from the ledger, no API call
+    python check_credits.py --offline --by day --since 2025-01-01
 """
 
 import os
+import sys
+from pathlib import Path
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from src.ledger import REPORT_GROUPS, UsageLedger
 
-function calculateSum(
 
-)
 # Load environment variables
 load_dotenv()
 
@@ -128,5 +134,69 @@ def check_credits():
         print("=" * 70)
 
 
+def print_ledger_report(db_path: str, groupings, since=None):
+    """
+    Print token usage and estimated cost recorded in the usage ledger.
+
+    Args:
+        db_path: Path to SQLite database file
+        groupings: Report groupings to print ('run', 'day', 'model')
+        since: Optional ISO date; earlier requests are ignored
+    """
+    if not Path(db_path).exists():
+        print(f"ERROR: Database not found: {db_path}")
+        sys.exit(1)
+
+    with UsageLedger(db_path) as ledger:
+        print("=" * 70)
+        print("Usage Ledger (estimated cost, no API call)")
+        print("=" * 70)
+
+        for group_by in groupings:
+            report = ledger.report(group_by, since)
+            print()
+            print(f"Per {group_by}:")
+            if not report:
+                print("  (no requests recorded)")
+                continue
+
+            print(f"  {group_by.capitalize():<28} {'Req':>5} {'Docs':>5} {'Input':>10} "
+                  f"{'Output':>9} {'Cache rd':>9} {'Cost $':>10}")
+            for entry in report:
+                print(f"  {str(entry[group_by]):<28} {entry['requests']:>5} {entry['documents']:>5} "
+                      f"{entry['input_tokens']:>10} {entry['output_tokens']:>9} "
+                      f"{entry['cache_read_input_tokens']:>9} {entry['cost_usd']:>10.4f}")
+
+            total = sum(entry["cost_usd"] for entry in report)
+            print(f"  {'Total':<28} {sum(e['requests'] for e in report):>5} {'':>5} "
+                  f"{sum(e['input_tokens'] for e in report):>10} "
+                  f"{sum(e['output_tokens'] for e in report):>9} "
+                  f"{sum(e['cache_read_input_tokens'] for e in report):>9} {total:>10.4f}")
+
+        print()
+        print("Costs are estimates from list prices (src/pricing.py).")
+        print("For the actual balance visit: https://console.anthropic.com/settings/billing")
+        print("=" * 70)
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check Anthropic API credits and recorded usage")
+    parser.add_argument("--offline", action="store_true",
+                        help="Report usage and cost from the ledger instead of calling the API")
+    parser.add_argument("--db", type=str, default="archaeologist.db", help="Database path")
+    parser.add_argument("--by", choices=list(REPORT_GROUPS), action="append",
+                        help="Report grouping (repeatable; default: run, day and model)")
+    parser.add_argument("--since", type=str, help="Only include requests from this date on (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if args.offline:
+        print_ledger_report(args.db, args.by or list(REPORT_GROUPS), args.since)
+    else:
+        check_credits()
+
+
 if __name__ == "__main__":
-    check_credits()
+    main()
@@ -0,0 +1,90 @@
+"""
+Near-Duplicate Report for Never-Tired-Archaeologist
+
+Lists clusters of near-duplicate documents in the database (edited
+revisions, copies, translated twins as far as the embedding model
+recognizes them).
+
+Usage:
+    python find_duplicates.py
+    python find_duplicates.py --jaccard 0.7 --cosine 0.9 --json duplicates.json
+"""
+
+import json
+import logging
+import sys
+from pathlib import Path
+
+from src.database import DocDatabase
+from src.dedup import NearDuplicateIndex
+from src.normalize import TextNormalizer
+
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report clusters of near-duplicate documents")
+    parser.add_argument("--db", type=str, default="archaeologist.db", help="Database path")
+    parser.add_argument("--jaccard", type=float, default=0.8,
+                        help="Estimated Jaccard similarity of word shingles (default: 0.8)")
+    parser.add_argument("--cosine", type=float, default=0.95,
+                        help="Cosine similarity of embeddings (default: 0.95)")
+    parser.add_argument("--json", type=str, help="Also write the clusters to a JSON file")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        logger.error(f"Database not found: {args.db}")
+        sys.exit(1)
+
+    db = DocDatabase(args.db)
+    index = NearDuplicateIndex(args.db, jaccard_threshold=args.jaccard, embedding_threshold=args.cosine)
+
+    try:
+        added = index.backfill(TextNormalizer().normalize)
+        if added:
+            logger.info(f"Indexed {added} documents")
+
+        clusters = index.clusters()
+        report = []
+
+        print(f"\n{len(clusters)} cluster(s) of near-duplicates\n")
+        for number, cluster in enumerate(clusters, 1):
+            print(f"Cluster {number} ({len(cluster)} documents)")
+            entries = []
+            for doc_id, method, similarity in cluster:
+                document = db.get_document(doc_id)
+                title = document[1].title if document else "?"
+                language = document[1].language if document else "?"
+                via = "" if method == "root" else f"  [{method} {similarity:.2f}]"
+                print(f"  ID {doc_id:>5}  ({language})  {title}{via}")
+                entries.append({
+                    "doc_id": doc_id,
+                    "title": title,
+                    "language": language,
+                    "method": method,
+                    "similarity": round(similarity, 4)
+                })
+            report.append(entries)
+            print()
+
+        if args.json:
+            Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+            logger.info(f"Clusters exported to {args.json}")
+
+    finally:
+        index.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
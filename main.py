@@ -10,9 +10,18 @@ Semantic document analysis tool combining:
 import sys
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
-from src import DocumentMetadata, DocDatabase, LocalEmbedder, Analyzer
+from src import DocumentMetadata, DocDatabase, LocalEmbedder, Analyzer, MetadataCache
+from src.dedup import NearDuplicateIndex, patch_metadata
+from src.ledger import UsageLedger
+from src.local_extractor import FastPathPolicy, LocalExtractor
+from src.normalize import TextNormalizer
+from src.extractors import EXTRACTABLE_PATTERNS, ExtractorPool, extract_document
+from src.sources import is_stream_source, iter_source
+from src.reader import TextFile
+from src.jobs import JobQueue
+from src.pipeline import IngestPipeline, STAGES
 
 
 # Configure logging
@@ -28,19 +37,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def read_text_file(file_path: str) -> str:
+def read_text_file(file_path: str) -> TextFile:
     """
-    Read content from a text file.
+    Read, decode and hash a text file in one pass (see src/reader.py); PDF,
+    DOCX, HTML and CSV files are converted to text (see src/extractors.py).
 
     Args:
-        file_path: Path to the text file
+        file_path: Path to the document file
 
     Returns:
-        File content as string
+        TextFile with the content, its SHA256 hash and the detected encoding
 
     Raises:
         FileNotFoundError: If file doesn't exist
-        RuntimeError: If file cannot be read
+        ValueError: If the path is not a file, the file is empty, binary or too large
+        RuntimeError: If file cannot be read or its text cannot be extracted
     """
     path = Path(file_path)
 
@@ -51,40 +62,19 @@ def read_text_file(file_path: str) -> str:
         raise ValueError(f"Path is not a file: {file_path}")
 
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        if not content.strip():
-            raise ValueError(f"File is empty: {file_path}")
-
-        logger.info(f"Read {len(content)} characters from {file_path}")
-        return content
-
-    except UnicodeDecodeError:
-        # Try with different encoding
-        try:
-            with open(path, 'r', encoding='latin-1') as f:
-                content = f.read()
-            logger.warning(f"File read with latin-1 encoding: {file_path}")
-            return content
-        except Exception as e:
-            raise RuntimeError(f"Could not read file {file_path}: {e}")
-    except Exception as e:
+        document = extract_document(path)
+    except OSError as e:
         raise RuntimeError(f"Error reading file {file_path}: {e}")
 
+    if not document.text.strip():
+        raise ValueError(f"File is empty: {file_path}")
 
-def compute_content_hash(content: str) -> str:
-    """
-    Compute SHA256 hash of content.
-
-    Args:
-        content: Text content
-
-    Returns:
-        Hexadecimal hash string
-    """
-    import hashlib
-    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    if document.mime_type != "text/plain":
+        logger.info(f"Extracted text from {document.mime_type}: {file_path}")
+    elif document.encoding != "utf-8":
+        logger.warning(f"File read with {document.encoding} encoding: {file_path}")
+    logger.info(f"Read {len(document.text)} characters from {file_path}")
+    return document
 
 
 def process_document(
@@ -92,7 +82,11 @@ def process_document(
     db: DocDatabase,
     embedder: LocalEmbedder,
     analyzer: Analyzer,
-    force_reprocess: bool = False
+    force_reprocess: bool = False,
+    local_extractor: Optional[LocalExtractor] = None,
+    fast_path: Optional[FastPathPolicy] = None,
+    dedup: Optional[NearDuplicateIndex] = None,
+    normalizer: Optional[TextNormalizer] = None
 ) -> Optional[DocumentMetadata]:
     """
     Process a single document through the complete pipeline.
@@ -100,8 +94,9 @@ def process_document(
     Steps:
     1. Read file content
     2. Check if document already exists (via hash)
-    3. Generate embedding (local)
-    4. Analyze with Claude API
+    3. Normalize text (strip images, boilerplate, whitespace) and generate embedding (local)
+    4. Analyze with Claude API (or reuse a near-duplicate's metadata, or
+       extract locally if the fast-path policy allows it)
     5. Store in database
     6. Return extracted metadata
 
@@ -111,6 +106,11 @@ def process_document(
         embedder: Embedding generator
         analyzer: LLM analyzer
         force_reprocess: If True, process even if document exists
+        local_extractor: Extractor for documents that skip the LLM
+        fast_path: Policy deciding when the LLM is skipped (needs local_extractor)
+        dedup: Near-duplicate index; matches reuse the stored metadata
+        normalizer: Noise removal applied to the text that is embedded and analyzed
+            (the stored content and its hash stay as read)
 
     Returns:
         DocumentMetadata if processing was successful, None if skipped (duplicate)
@@ -121,34 +121,74 @@ def process_document(
 
     try:
         # Step 1: Read file
-        content = read_text_file(file_path)
-        content_hash = compute_content_hash(content)
+        document = read_text_file(file_path)
+        content, content_hash = document.text, document.content_hash
         logger.info(f"Content hash: {content_hash[:16]}...")
 
         # Step 2: Check for duplicates
-        if not force_reprocess and db.document_exists(content_hash):
+        if not force_reprocess and db.document_exists(content_hash, content):
             logger.warning(f"[WARNING] Document already exists in database (hash: {content_hash[:16]}...)")
             logger.info("Skipping processing. Use --force to reprocess.")
             return None
 
-        # Step 3: Generate embedding (local)
+        # Step 3: Normalize, then generate embedding (local)
+        text = content
+        if normalizer is not None:
+            text, report = normalizer.process(content)
+            if report["tokens_saved"]:
+                logger.info(
+                    f"Normalized: ~{report['tokens_saved']} tokens saved "
+                    f"({report['tokens_before']} -> {report['tokens_after']}; {report['images']} images, "
+                    f"{report['boilerplate_lines']} boilerplate, {report['repeated_lines']} repeated lines)"
+                )
+
         logger.info("Generating embedding (local)...")
-        embedding = embedder.generate_embedding(content)
+        embedding = embedder.generate_embedding(text)
         logger.info(f"[OK] Embedding generated ({len(embedding)} dimensions)")
 
-        # Step 4: Analyze with Claude
-        logger.info("Analyzing document with Claude API...")
-        metadata = analyzer.analyze_text(content)
+        # Step 4: Analyze with Claude, unless the document is a near-duplicate or trivial
+        use_local, reason = (False, "llm")
+        duplicate = signature = None
+        if dedup is not None:
+            signature = dedup.signature(text)
+            if not force_reprocess:
+                duplicate = dedup.find(text, embedding, signature)
+        if duplicate is None and fast_path is not None and local_extractor is not None:
+            use_local, reason = fast_path.decide(text)
+
+        stored = db.get_document(duplicate[0]) if duplicate else None
+        if stored is not None:
+            duplicate_id, method, similarity = duplicate
+            logger.info(f"Near-duplicate of ID {duplicate_id} ({method}, {similarity:.2f}) - reusing metadata")
+            metadata = patch_metadata(stored[1], text)
+            extraction_path = "dedup"
+            reason = f"near-duplicate of ID {duplicate_id}, {method} {similarity:.2f}"
+        elif use_local:
+            logger.info(f"Fast path ({reason}) - extracting metadata locally...")
+            metadata = local_extractor.extract(text)
+            extraction_path = "local"
+        else:
+            logger.info("Analyzing document with Claude API...")
+            metadata = analyzer.analyze_text(text)
+            extraction_path = "llm"
         logger.info(f"[OK] Analysis complete: {metadata.title}")
 
-        # Step 5: Store in database
+        # Step 5: Store in database (a reprocessed document is updated in place)
         logger.info("Storing in database...")
-        doc_id = db.add_document(
+        doc_id, created = db.upsert_document(
             content=content,
             metadata=metadata,
-            embedding=embedding
+            embedding=embedding,
+            extraction_path=extraction_path
         )
-        logger.info(f"[OK] Document stored with ID: {doc_id}")
+        if local_extractor is not None and created:
+            local_extractor.add_to_corpus(text)
+        if dedup is not None:
+            dedup.add(doc_id, text, embedding, duplicate if stored is not None else None, signature)
+        if created:
+            logger.info(f"[OK] Document stored with ID: {doc_id}")
+        else:
+            logger.info(f"[OK] Document ID {doc_id} updated (previous metadata kept in history)")
 
         # Step 6: Display results
         print("\n" + "="*60)
@@ -161,6 +201,7 @@ def process_document(
         print(f"\nSummary:\n{metadata.summary}")
         print("="*60)
         print(f"[OK] Document ID: {doc_id}")
+        print(f"[OK] Extracted by: {extraction_path}" + (f" ({reason})" if extraction_path != "llm" else ""))
         print(f"[OK] Embedding: {len(embedding)} dimensions")
         print("="*60 + "\n")
 
@@ -180,6 +221,101 @@ def process_document(
         return None
 
 
+def process_directory(
+    directory: str,
+    pipeline: IngestPipeline,
+    patterns: List[str],
+    recursive: bool = False
+) -> dict:
+    """
+    Process all matching files of a directory (or members of a ZIP/tar archive
+    or records of an NDJSON export) through the concurrent pipeline.
+
+    Files are read, embedded, analyzed and stored in overlapping stages (see
+    src/pipeline.py); the per-stage throughput is printed at the end. If the
+    pipeline has a job queue, the run resumes an interrupted run over the same
+    directory and patterns. Archive members and NDJSON records are read without
+    unpacking them (see src/sources.py); their source ids (e.g.
+    'dump.zip!letters/brief.txt') identify them in the job.
+
+    Args:
+        directory: Directory, archive or NDJSON file to process
+        pipeline: Configured ingestion pipeline
+        patterns: Glob patterns of the files to process (e.g. '*.txt'); matched
+            against member file names in archives, not used for NDJSON
+        recursive: Include subdirectories (archives are always read completely)
+
+    Returns:
+        Pipeline summary (stored/skipped/failed counts, stage statistics, results)
+
+    Raises:
+        ValueError: If directory is neither a directory nor an archive or NDJSON file
+    """
+    root = Path(directory)
+    stream = is_stream_source(root)
+    if not stream and not root.is_dir():
+        raise ValueError(f"Path is not a directory: {directory}")
+
+    def files():
+        seen = set()
+        for pattern in patterns:
+            for path in sorted(root.rglob(pattern) if recursive else root.glob(pattern)):
+                if path not in seen:
+                    seen.add(path)
+                    yield path
+
+    logger.info(
+        f"Processing {root} ({', '.join(patterns)}{', recursive' if recursive else ''}) with "
+        f"{pipeline.read_workers} reader(s), {pipeline.analyze_workers} analysis worker(s)"
+    )
+    if pipeline.jobs is not None:
+        status = pipeline.jobs.job_status(pipeline.job_id)
+        done = status["stored"] + status["skipped"]
+        if done or status["embedded"] or status["analyzed"] or status["failed"]:
+            logger.info(
+                f"Resuming job {pipeline.job_id}: {done} file(s) done, {status['embedded']} embedded, "
+                f"{status['analyzed']} analyzed, {status['failed']} failed"
+            )
+    summary = pipeline.run(iter_source(root, patterns) if stream else files())
+
+    print("\n" + "="*60)
+    print("PIPELINE SUMMARY")
+    print("="*60)
+    print(f"Stored:   {summary['stored']}")
+    print(f"Skipped:  {summary['skipped']} (already in database)")
+    print(f"Failed:   {summary['failed']}")
+    if summary["resumed"]:
+        print(f"Resumed:  {summary['resumed']} (saved embedding or metadata reused)")
+    print(f"Time:     {summary['elapsed_s']:.1f}s ({summary['documents_per_s']:.2f} documents/s)")
+    print(f"\n{'Stage':<10}{'Workers':>8}{'Items':>8}{'Busy s':>10}{'Items/s':>10}{'Util.':>8}")
+    for name in STAGES:
+        stage = summary["stages"][name]
+        print(
+            f"{name:<10}{stage['workers']:>8}{stage['items']:>8}{stage['busy_s']:>10.2f}"
+            f"{stage['items_per_busy_s']:>10.2f}{stage['utilization']:>8.0%}"
+        )
+    print("="*60 + "\n")
+
+    if pipeline.jobs is not None:
+        # Files that failed in this run keep the job open for the next run or process_remaining.py
+        if not summary["failed"] and pipeline.jobs.finish(pipeline.job_id):
+            logger.info(f"[OK] Job {pipeline.job_id} finished")
+        else:
+            logger.warning(
+                f"Job {pipeline.job_id} has unfinished files; run again or use process_remaining.py to resume"
+            )
+    return summary
+
+
+def _option_value(name: str, default: str) -> str:
+    """Value following a command line option, e.g. '--workers 8'."""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+
 def main():
     """
     Main entry point for the document analysis pipeline.
@@ -187,6 +323,12 @@ def main():
     Usage:
         python main.py <file_path>
         python main.py <file_path> --force
+        python main.py <file_path> --clear-cache
+        python main.py <file_path> --no-fast-path
+        python main.py <file_path> --no-dedup
+        python main.py <file_path> --no-normalize
+        python main.py <directory> [--recursive] [--pattern '*.md'] [--workers 8]
+        python main.py <archive.zip|archive.tar.gz|export.ndjson> [--pattern '*.md'] [--workers 8]
     """
     print("\n" + "="*60)
     print("NEVER-TIRED-ARCHAEOLOGIST v2.0")
@@ -195,22 +337,40 @@ def main():
 
     # Parse command line arguments
     if len(sys.argv) < 2:
-        print("Usage: python main.py <file_path> [--force]")
+        print("Usage: python main.py <file_path|directory|archive|ndjson> [--force] [--clear-cache] [--no-fast-path] [--no-dedup] [--no-normalize] [--exact-duplicates]")
         print("\nOptions:")
-        print("  --force    Reprocess document even if it already exists")
+        print("  --force          Reprocess document even if it already exists")
+        print("  --clear-cache    Drop all cached LLM analyses before processing")
+        print("  --no-fast-path   Always use Claude, also for trivial documents")
+        print("  --no-dedup       Analyze near-duplicates instead of reusing their metadata")
+        print("  --no-normalize   Embed and analyze the text as read (keep images, boilerplate)")
+        print("  --exact-duplicates  Only skip byte-identical text (ignore line endings, BOM,")
+        print("                   trailing whitespace and Unicode normalization otherwise)")
+        print("\nDirectory options (also for ZIP/tar archives and NDJSON exports):")
+        print("  --recursive, -r  Include subdirectories")
+        print("  --pattern GLOB   Files to process (default: text, Markdown, PDF, DOCX, HTML, CSV)")
+        print("  --workers N      Concurrent Claude analyses (default: 8)")
         print("\nExample:")
         print("  python main.py document.txt")
+        print("  python main.py test_documents --recursive --workers 4")
+        print("  python main.py export.zip --pattern '*.txt'")
         sys.exit(1)
 
     file_path = sys.argv[1]
     force_reprocess = "--force" in sys.argv
+    clear_cache = "--clear-cache" in sys.argv
+    use_fast_path = "--no-fast-path" not in sys.argv
+    use_dedup = "--no-dedup" not in sys.argv
+    normalizer = TextNormalizer() if "--no-normalize" not in sys.argv else None
+    canonical_duplicates = "--exact-duplicates" not in sys.argv
+    directory_mode = Path(file_path).is_dir() or is_stream_source(Path(file_path))
 
     try:
         # Initialize components
         logger.info("Initializing components...")
 
         # Database
-        db = DocDatabase("archaeologist.db")
+        db = DocDatabase("archaeologist.db", canonical_duplicates=canonical_duplicates)
         logger.info("[OK] Database initialized")
 
         # Embedder (local)
@@ -218,25 +378,101 @@ def main():
         embedder = LocalEmbedder()
         logger.info(f"[OK] Embedder ready (dimension: {embedder.get_embedding_dimension()})")
 
-        # Analyzer (Claude API)
-        analyzer = Analyzer()
+        # Analyzer (Claude API), with persistent cache of previous analyses and usage ledger
+        ledger = UsageLedger("archaeologist.db")
+        analyzer = Analyzer(cache=MetadataCache("archaeologist.db"), ledger=ledger)
         logger.info(f"[OK] Analyzer ready ({analyzer.get_model_info()['model']})")
 
-        # Process document
-        metadata = process_document(
-            file_path=file_path,
-            db=db,
-            embedder=embedder,
-            analyzer=analyzer,
-            force_reprocess=force_reprocess
+        # Local extractor for trivial documents, with IDF statistics from the stored corpus
+        local_extractor = None
+        if use_fast_path:
+            local_extractor = LocalExtractor(
+                normalizer.normalize(content) if normalizer else content
+                for _, content, _ in db.get_all_documents()
+            )
+            logger.info(f"[OK] Local fast path ready ({local_extractor.document_count} corpus documents)")
+
+        # Near-duplicate index (MinHash/LSH + embeddings) over the stored documents
+        dedup = None
+        if use_dedup:
+            dedup = NearDuplicateIndex("archaeologist.db")
+            added = dedup.backfill(normalizer.normalize if normalizer else None)
+            if added:
+                logger.info(f"[OK] Indexed {added} stored documents for near-duplicate detection")
+
+        if clear_cache:
+            removed = analyzer.cache.invalidate()
+            logger.info(f"[OK] Cleared {removed} cached LLM analyses")
+
+        if directory_mode:
+            # Process directory concurrently; progress is saved per file so an
+            # interrupted run resumes where it stopped
+            pattern = _option_value("--pattern", "")
+            patterns = [pattern] if pattern else ["*.txt", "*.md", *EXTRACTABLE_PATTERNS]
+            recursive = "--recursive" in sys.argv or "-r" in sys.argv
+            jobs = JobQueue("archaeologist.db")
+            job_id = jobs.start_job(
+                f"{Path(file_path).resolve()} {' '.join(patterns)}{' recursive' if recursive else ''}",
+                resume=not force_reprocess,
+                normalize=normalizer is not None
+            )
+            pipeline = IngestPipeline(
+                db=db,
+                embedder=embedder,
+                analyzer=analyzer,
+                normalizer=normalizer,
+                local_extractor=local_extractor,
+                fast_path=FastPathPolicy() if use_fast_path else None,
+                dedup=dedup,
+                analyze_workers=int(_option_value("--workers", "8")),
+                force_reprocess=force_reprocess,
+                jobs=jobs,
+                job_id=job_id,
+                extractors=ExtractorPool()
+            )
+            summary = process_directory(file_path, pipeline, patterns, recursive=recursive)
+            pipeline.extractors.close()
+            jobs.close()
+            logger.info(
+                f"[OK] Directory processed: {summary['stored']} stored, "
+                f"{summary['skipped']} skipped, {summary['failed']} failed"
+            )
+        else:
+            # Process document
+            metadata = process_document(
+                file_path=file_path,
+                db=db,
+                embedder=embedder,
+                analyzer=analyzer,
+                force_reprocess=force_reprocess,
+                local_extractor=local_extractor,
+                fast_path=FastPathPolicy() if use_fast_path else None,
+                dedup=dedup,
+                normalizer=normalizer
+            )
+
+            if metadata is None:
+                logger.info("No processing performed (document may be duplicate)")
+            else:
+                logger.info("[OK] Processing completed successfully")
+
+        cache_stats = analyzer.cache.stats()
+        logger.info(
+            f"LLM cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es), "
+            f"${cache_stats['saved_usd']:.4f} saved"
         )
 
-        if metadata is None:
-            logger.info("No processing performed (document may be duplicate)")
-        else:
-            logger.info("[OK] Processing completed successfully")
+        run_totals = ledger.run_totals()
+        logger.info(
+            f"LLM usage (run {ledger.run_id}): {run_totals['requests']} request(s), "
+            f"{run_totals['input_tokens']} in / {run_totals['output_tokens']} out, "
+            f"~${run_totals['cost_usd']:.4f}"
+        )
 
         # Close database
+        if dedup is not None:
+            dedup.close()
+        ledger.close()
         db.close()
         logger.info("Database connection closed")
 
@@ -2,7 +2,8 @@
 Document Organization Script for Never-Tired-Archaeologist
 
 Analyzes documents and organizes them into a structured directory hierarchy
-based on language and primary topic.
+based on language and primary topic. The source can also be a ZIP/tar archive
+or an NDJSON export, whose documents are read without unpacking them.
 """
 
 import logging
@@ -16,8 +17,29 @@ from collections import defaultdict
 
 from src.database import DocDatabase
 from src.embedder import LocalEmbedder
+from src.cache import MetadataCache
+from src.deadletter import DeadLetterQueue
+from src.fake_anthropic import FAKE_DB_PATH, FakeAnthropicServer
+from src.ledger import UsageLedger
 from src.llm import Analyzer
+from src.routing import ModelRouter
 from src.models import DocumentMetadata
+from src.local_extractor import LocalExtractor
+from src.manifest import FileManifest
+from src.normalize import TextNormalizer
+from src.extractors import ExtractorPool, extract_document
+from src.reader import TextFile
+from src.sources import SourceDocument, is_stream_source, iter_source
+from src.scheduler import (
+    DECISION_DEFER,
+    DECISION_DEGRADE,
+    ON_EXHAUSTED_DEGRADE,
+    ON_EXHAUSTED_STOP,
+    POLICIES,
+    POLICY_NAME,
+    IngestScheduler,
+    RunBudget,
+)
 
 
 # Configure logging
@@ -35,24 +57,77 @@ logger = logging.getLogger(__name__)
 class DocumentOrganizer:
     """Analyzes and organizes documents into structured directories"""
 
-    def __init__(self, output_base: Path = Path("organized_documents")):
+    def __init__(
+        self,
+        output_base: Path = Path("organized_documents"),
+        few_shot: bool = False,
+        route_models: bool = False,
+        pack: bool = False,
+        base_url: Optional[str] = None,
+        normalize: bool = True,
+        incremental: bool = True,
+        canonical_duplicates: bool = True,
+        dead_letters: Optional[DeadLetterQueue] = None,
+        db_path: str = "archaeologist.db"
+    ):
         """
         Initialize document organizer.
 
         Args:
             output_base: Base directory for organized documents
+            few_shot: Send few-shot examples (cached prompt prefix) with each analysis
+            route_models: Analyze small, simple documents with a cheaper model
+            pack: Analyze short documents several at a time before processing
+            base_url: Optional API base URL (e.g. a FakeAnthropicServer)
+            normalize: Strip images, boilerplate and whitespace before embedding and analysis
+            incremental: Skip files unchanged since the last scan without reading them
+                (file manifest keyed by path, size, mtime and inode)
+            canonical_duplicates: Also skip documents that differ from a stored one only in
+                line endings, BOM, trailing whitespace or Unicode normalization
+            dead_letters: Queue recording failed files (default: one in the database)
+            db_path: Database for documents, LLM cache, ledger, manifest and dead letters
         """
-        self.db = DocDatabase()
+        self.db = DocDatabase(db_path, canonical_duplicates=canonical_duplicates)
         self.embedder = LocalEmbedder()
-        self.analyzer = Analyzer()
+        self.ledger = UsageLedger(db_path)
+        self.analyzer = Analyzer(
+            cache=MetadataCache(db_path),
+            ledger=self.ledger,
+            few_shot=few_shot,
+            router=ModelRouter() if route_models else None,
+            api_key="fake" if base_url else None,
+            base_url=base_url
+        )
         self.output_base = output_base
         self.output_base.mkdir(exist_ok=True)
+        # Recorded with dead letters, so retry_failed.py rebuilds the organizer with them
+        self.options = {
+            "few_shot": few_shot,
+            "route_models": route_models,
+            "pack": pack,
+            "normalize": normalize,
+            "incremental": incremental,
+            "canonical_duplicates": canonical_duplicates
+        }
+        self.pack = pack
+        self.normalizer = TextNormalizer() if normalize else None
+        self.manifest = FileManifest(db_path) if incremental else None
+        # Failed files are recorded with their error class for retry_failed.py
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetterQueue(db_path)
+        # PDF, DOCX, HTML and CSV are converted in worker processes (timeout and memory cap)
+        self.extractors = ExtractorPool()
+        self.scheduler: Optional[IngestScheduler] = None
+        self._local_extractor: Optional[LocalExtractor] = None
 
         self.stats = {
             "total_files": 0,
             "processed": 0,
             "skipped": 0,
+            "unchanged": 0,
+            "renamed": 0,
             "failed": 0,
+            "degraded": 0,
+            "deferred": 0,
             "by_language": defaultdict(int),
             "by_topic": defaultdict(int),
             "processing_times": []
@@ -101,13 +176,14 @@ class DocumentOrganizer:
 
         return target_dir / original_filename
 
-    def process_file(self, filepath: Path, copy_mode: bool = True) -> Optional[Dict]:
+    def process_file(self, filepath: Path, copy_mode: bool = True, degrade: bool = False) -> Optional[Dict]:
         """
         Process a single file: analyze and organize.
 
         Args:
             filepath: Path to file to process
             copy_mode: If True, copy files; if False, move files
+            degrade: Extract metadata locally instead of calling Claude (budget exhausted)
 
         Returns:
             Dictionary with processing results
@@ -126,43 +202,59 @@ class DocumentOrganizer:
         start_time = time.time()
 
         try:
-            # Read file
-            try:
-                content = filepath.read_text(encoding='utf-8')
-            except UnicodeDecodeError:
-                # Try with different encoding
-                content = filepath.read_text(encoding='latin-1')
+            # Read (or extract) and hash file; binary and oversized files are rejected
+            document = self._read(filepath)
+            content, content_hash = document.text, document.content_hash
 
             result["content_length"] = len(content)
 
             # Check for duplicates
-            content_hash = self.db._compute_hash(content)
-            if self.db.document_exists(content_hash):
+            if self.db.document_exists(content_hash, content):
+                self._record_manifest(filepath, content_hash, result)
+                self.dead_letters.resolve(filepath)
                 logger.info(f"[SKIP] {filepath.name} - already in database")
                 result["error"] = "Duplicate"
                 result["processing_time"] = time.time() - start_time
                 self.stats["skipped"] += 1
                 return result
 
+            # Strip noise from the text that is embedded and analyzed
+            text = content
+            if self.normalizer is not None:
+                text, report = self.normalizer.process(content)
+                result["tokens_saved"] = report["tokens_saved"]
+
             # Generate embedding
-            embedding = self.embedder.generate_embedding(content)
+            embedding = self.embedder.generate_embedding(text)
 
-            # Analyze with Claude
-            metadata = self.analyzer.analyze_text(content)
+            # Analyze with Claude, or locally once the run budget is exhausted
+            if degrade:
+                metadata = self.get_local_extractor().extract(text)
+                extraction_path = "local"
+                self.stats["degraded"] += 1
+            else:
+                metadata = self.analyzer.analyze_text(text)
+                extraction_path = "llm"
             result["metadata"] = metadata.model_dump()
+            result["extraction_path"] = extraction_path
 
             # Store in database
-            doc_id = self.db.add_document(content, metadata, embedding)
+            doc_id = self.db.add_document(content, metadata, embedding, extraction_path=extraction_path)
             result["doc_id"] = doc_id
+            self._record_manifest(filepath, content_hash, result)
 
             # Organize file
             organized_path = self.create_organized_path(metadata, filepath.name)
 
-            if copy_mode:
+            if isinstance(filepath, SourceDocument):
+                # Archive members and NDJSON records are written out (never moved)
+                filepath.save(organized_path)
+            elif copy_mode:
                 shutil.copy2(filepath, organized_path)
             else:
                 shutil.move(str(filepath), organized_path)
 
+            self.dead_letters.resolve(filepath, doc_id)
             result["organized_path"] = str(organized_path)
             result["success"] = True
             result["processing_time"] = time.time() - start_time
@@ -176,28 +268,89 @@ class DocumentOrganizer:
             logger.info(f"[OK] {filepath.name} -> {organized_path.relative_to(self.output_base)}")
 
         except Exception as e:
+            letter = self.dead_letters.record(
+                filepath, e, "organize",
+                {"output": str(self.output_base), "copy": copy_mode, "options": self.options}
+            )
             result["error"] = str(e)
+            result["error_class"] = letter.error_class
             result["processing_time"] = time.time() - start_time
             self.stats["failed"] += 1
-            logger.error(f"[ERROR] {filepath.name}: {e}")
+            logger.error(f"[ERROR] {filepath.name} ({letter.error_class}): {e}")
 
         return result
 
+    def _record_manifest(self, filepath: Path, content_hash: str, result: Dict) -> None:
+        """Remember a file as handled, so unchanged re-scans skip it; detects renames by hash."""
+        if self.manifest is None or isinstance(filepath, SourceDocument):
+            return
+        renamed_from = self.manifest.record(filepath, content_hash, result.get("doc_id"))
+        if renamed_from is not None:
+            logger.info(f"[RENAME] {Path(renamed_from).name} -> {filepath.name}")
+            result["renamed_from"] = renamed_from
+            self.stats["renamed"] += 1
+
+    def get_local_extractor(self) -> LocalExtractor:
+        """Local extractor with IDF statistics from the stored corpus, created on first use."""
+        if self._local_extractor is None:
+            self._local_extractor = LocalExtractor(
+                self.normalizer.normalize(content) if self.normalizer else content
+                for _, content, _ in self.db.get_all_documents()
+            )
+        return self._local_extractor
+
+    def _read(self, filepath: Path) -> TextFile:
+        """Read a document, extracting the text of PDF, DOCX, HTML and CSV files."""
+        if isinstance(filepath, SourceDocument):
+            return filepath.read(self.extractors)
+        return extract_document(filepath, self.extractors)
+
+    def prefetch_packed(self, files: List[Path]) -> None:
+        """
+        Analyze short, new documents in packed requests.
+
+        Results land in the metadata cache, so the per-file analysis in
+        process_file() is answered without another API call.
+
+        Args:
+            files: Files that are about to be processed
+        """
+        documents = {}
+        for filepath in files:
+            try:
+                document = self._read(filepath)
+            except (OSError, ValueError, RuntimeError):
+                continue
+            content = document.text
+            if content.strip() and not self.db.document_exists(document.content_hash, content):
+                # Same text process_file() analyzes, so the cache entries match
+                documents[str(filepath)] = self.normalizer.normalize(content) if self.normalizer else content
+
+        if documents:
+            logger.info(f"Packed analysis of {len(documents)} new documents...")
+            self.analyzer.analyze_packed(documents)
+
     def process_directory(
         self,
         source_dir: Path,
         file_pattern: str = "*.md",
         copy_mode: bool = True,
-        max_files: Optional[int] = None
+        max_files: Optional[int] = None,
+        policy: str = POLICY_NAME,
+        priority_tags: List[str] = (),
+        budget: Optional[RunBudget] = None
     ) -> List[Dict]:
         """
         Process all files in a directory.
 
         Args:
-            source_dir: Source directory to process
-            file_pattern: Glob pattern for files (default: *.md)
+            source_dir: Source directory, ZIP/tar archive or NDJSON export to process
+            file_pattern: Glob pattern for files, several separated by commas (default: *.md)
             copy_mode: If True, copy files; if False, move files
             max_files: Optional limit on number of files to process
+            policy: Processing order ('name', 'small', 'newest', 'priority')
+            priority_tags: Tags in descending priority for the 'priority' policy
+            budget: Optional cost/token/time budget of the run
 
         Returns:
             List of processing results
@@ -217,8 +370,16 @@ class DocumentOrganizer:
             logger.error(f"Source directory does not exist: {source_dir}")
             return []
 
-        # Find all matching files
-        files = sorted(source_dir.glob(file_pattern))
+        # Find all matching files (or archive members / NDJSON records, in stored order)
+        patterns = [pattern.strip() for pattern in file_pattern.split(",") if pattern.strip()]
+        stream = is_stream_source(source_dir)
+        if stream:
+            files = list(iter_source(source_dir, patterns))
+        else:
+            files = sorted({
+                path for pattern in patterns
+                for path in source_dir.glob(pattern) if path.is_file()
+            })
 
         if max_files:
             files = files[:max_files]
@@ -226,13 +387,52 @@ class DocumentOrganizer:
         self.stats["total_files"] = len(files)
         logger.info(f"Found {len(files)} files to process")
 
+        # Only new or modified files are opened; unchanged ones are known from the last scan
+        if self.manifest is not None and not stream:
+            scan = self.manifest.scan(files)
+            for old, new in scan.renamed:
+                logger.info(f"[RENAME] {Path(old).name} -> {new.name}")
+            self.stats["unchanged"] = len(scan.unchanged)
+            self.stats["renamed"] = len(scan.renamed)
+            logger.info(
+                f"Manifest: {len(scan.unchanged)} unchanged ({len(scan.renamed)} renamed), "
+                f"{len(scan.new)} new, {len(scan.changed)} modified"
+            )
+            files = sorted(scan.to_read)
+
+        # Estimate every document up front (from its size unless the budget or order needs the
+        # text), then process in policy order within the budget
+        self.scheduler = IngestScheduler(self.analyzer, self.ledger, budget, policy, priority_tags)
+        self.scheduler.add_files(files, self.normalizer.normalize if self.normalizer else None, read=self._read)
+
+        if self.pack:
+            self.prefetch_packed([item.path for item in self.scheduler.plan()])
+
         results = []
 
-        for i, filepath in enumerate(files, 1):
+        for i, (item, decision) in enumerate(self.scheduler, 1):
+            filepath = item.path
+            if decision == DECISION_DEFER:
+                logger.info(f"\n[{i}/{len(files)}] Deferred (budget): {filepath.name}")
+                self.stats["deferred"] += 1
+                results.append({
+                    "filename": filepath.name,
+                    "original_path": str(filepath),
+                    "success": False,
+                    "error": "Deferred (run budget exhausted)",
+                    "estimated_cost_usd": round(item.estimate["cost_usd"], 6)
+                })
+                continue
+
             logger.info(f"\n[{i}/{len(files)}] Processing: {filepath.name}")
-            result = self.process_file(filepath, copy_mode)
+            result = self.process_file(filepath, copy_mode, degrade=decision == DECISION_DEGRADE)
             if result:
                 results.append(result)
+            if self.scheduler.budget.limited:
+                logger.info(self.scheduler.status_line())
+
+        if self.manifest is not None and not stream:
+            self.manifest.prune(source_dir)
 
         # Generate summary
         self._print_summary()
@@ -247,7 +447,17 @@ class DocumentOrganizer:
         logger.info(f"Total Files:          {self.stats['total_files']}")
         logger.info(f"Processed:            {self.stats['processed']} [OK]")
         logger.info(f"Skipped (duplicates): {self.stats['skipped']}")
+        if self.manifest is not None:
+            logger.info(f"Unchanged (manifest): {self.stats['unchanged']} ({self.stats['renamed']} renamed)")
         logger.info(f"Failed:               {self.stats['failed']} [ERROR]")
+        letters = self.dead_letters.stats()
+        if letters["open"]:
+            logger.info(f"Dead Letters:         {letters['open']} open, {letters['retrying']} retry scheduled (retry_failed.py)")
+        if self.stats["degraded"] or self.stats["deferred"]:
+            logger.info(f"Degraded (local):     {self.stats['degraded']}")
+            logger.info(f"Deferred (budget):    {self.stats['deferred']}")
+        if self.scheduler is not None:
+            logger.info(self.scheduler.status_line())
 
         if self.stats["processed"] > 0:
             success_rate = (self.stats["processed"] / self.stats["total_files"]) * 100
@@ -257,6 +467,45 @@ class DocumentOrganizer:
             logger.info(f"Avg Processing Time:  {avg_time:.2f}s")
             logger.info(f"Total Time:           {sum(self.stats['processing_times']):.2f}s")
 
+        cache_stats = self.analyzer.cache.stats()
+        logger.info(f"LLM Cache Hits:       {cache_stats['hits']} (${cache_stats['saved_usd']:.4f} saved)")
+
+        if self.normalizer is not None:
+            normalization = self.normalizer.get_stats()
+            logger.info(
+                f"Normalization:        ~{normalization['tokens_saved']} tokens saved "
+                f"({normalization['saved_ratio'] * 100:.1f}%)"
+            )
+
+        usage = self.analyzer.get_usage_stats()
+        if usage["requests"]:
+            logger.info(f"API Requests:         {usage['requests']} (avg {usage['avg_latency_s']:.2f}s)")
+            logger.info(f"Tokens In/Out:        {usage['input_tokens']} / {usage['output_tokens']}")
+            logger.info(
+                f"Prompt Cache:         {usage['cache_read_input_tokens']} read, "
+                f"{usage['cache_creation_input_tokens']} written "
+                f"({usage['prompt_cache_read_ratio'] * 100:.1f}% of prompt tokens from cache)"
+            )
+
+            parse = self.analyzer.get_parse_stats()
+            logger.info(
+                f"Structured Output:    {parse['repaired']} repaired, {parse['failed']} failed "
+                f"({parse['first_pass_failure_rate'] * 100:.1f}% first-pass failures)"
+            )
+
+            pack = self.analyzer.get_pack_stats()
+            if pack["packs"]:
+                logger.info(
+                    f"Packed Requests:      {pack['packs']} ({pack['documents_per_request']:.1f} docs each, "
+                    f"{pack['retried']} retried alone)"
+                )
+
+            for route, stats in self.analyzer.get_route_stats().items():
+                logger.info(
+                    f"Route {route:<7}       {stats['documents']} docs, {stats['escalations']} escalated, "
+                    f"avg {stats['avg_latency_s']:.2f}s, ${stats['cost_usd']:.4f}"
+                )
+
         if self.stats["by_language"]:
             logger.info("\nDocuments by Language:")
             for lang, count in sorted(self.stats["by_language"].items()):
@@ -284,10 +533,22 @@ class DocumentOrganizer:
                 "total_files": self.stats["total_files"],
                 "processed": self.stats["processed"],
                 "skipped": self.stats["skipped"],
+                "unchanged": self.stats["unchanged"],
+                "renamed": self.stats["renamed"],
                 "failed": self.stats["failed"],
+                "degraded": self.stats["degraded"],
+                "deferred": self.stats["deferred"],
                 "by_language": dict(self.stats["by_language"]),
                 "by_topic": dict(self.stats["by_topic"]),
-                "avg_processing_time": sum(self.stats["processing_times"]) / len(self.stats["processing_times"]) if self.stats["processing_times"] else 0
+                "avg_processing_time": sum(self.stats["processing_times"]) / len(self.stats["processing_times"]) if self.stats["processing_times"] else 0,
+                "llm_cache": self.analyzer.cache.stats(),
+                "llm_usage": self.analyzer.get_usage_stats(),
+                "llm_parse": self.analyzer.get_parse_stats(),
+                "llm_routes": self.analyzer.get_route_stats(),
+                "normalization": self.normalizer.get_stats() if self.normalizer is not None else None,
+                "llm_packing": self.analyzer.get_pack_stats(),
+                "llm_ledger": self.ledger.run_totals(),
+                "budget": self.scheduler.status() if self.scheduler is not None else None
             }
         }
 
@@ -335,30 +596,85 @@ def main():
     import argparse
 
     parser = argparse.ArgumentParser(description="Organize documents by analyzing and categorizing them")
-    parser.add_argument("source_dir", type=str, help="Source directory containing documents")
+    parser.add_argument("source_dir", type=str,
+                       help="Source directory containing documents, or a ZIP/tar archive or NDJSON export")
     parser.add_argument("--output", "-o", type=str, default="organized_documents",
                        help="Output directory for organized documents")
     parser.add_argument("--pattern", "-p", type=str, default="*.md",
-                       help="File pattern to match (default: *.md)")
+                       help="File pattern(s) to match, comma-separated, e.g. '*.md,*.pdf,*.docx' (default: *.md)")
     parser.add_argument("--move", "-m", action="store_true",
                        help="Move files instead of copying")
     parser.add_argument("--limit", "-l", type=int,
                        help="Limit number of files to process")
+    parser.add_argument("--few-shot", action="store_true",
+                       help="Send few-shot examples with each analysis (cached prompt prefix)")
+    parser.add_argument("--route-models", action="store_true",
+                       help="Analyze small, simple documents with a cheaper model")
+    parser.add_argument("--pack", action="store_true",
+                       help="Analyze short documents several at a time (fewer API requests)")
+    parser.add_argument("--fake", action="store_true",
+                       help=f"Use a local fake API (offline, no costs) for benchmarks; stores into {FAKE_DB_PATH}")
+    parser.add_argument("--fake-latency", type=float, default=0.0,
+                       help="Mean latency of the fake API in seconds (lognormal, seeded)")
+    parser.add_argument("--order", choices=POLICIES, default=POLICY_NAME,
+                       help="Processing order: name, small (cheapest first), newest, priority")
+    parser.add_argument("--priority-tags", type=str, default="",
+                       help="Comma-separated tags in descending priority (for --order priority)")
+    parser.add_argument("--max-cost", type=float,
+                       help="Estimated USD the run may spend")
+    parser.add_argument("--max-tokens", type=int,
+                       help="Tokens the run may spend")
+    parser.add_argument("--max-minutes", type=float,
+                       help="Wall-clock minutes the run may take")
+    parser.add_argument("--on-budget", choices=[ON_EXHAUSTED_STOP, ON_EXHAUSTED_DEGRADE], default=ON_EXHAUSTED_STOP,
+                       help="When the budget is reached: stop (defer the rest) or degrade to local extraction")
+    parser.add_argument("--no-normalize", action="store_true",
+                       help="Embed and analyze the text as read (keep images, boilerplate, whitespace)")
+    parser.add_argument("--full-scan", action="store_true",
+                       help="Read every file, also those unchanged since the last scan")
+    parser.add_argument("--db", type=str,
+                       help=f"Database path (default: archaeologist.db, {FAKE_DB_PATH} with --fake)")
+    parser.add_argument("--exact-duplicates", action="store_true",
+                       help="Only skip byte-identical duplicates (no canonicalization before hashing)")
 
     args = parser.parse_args()
 
     source_dir = Path(args.source_dir)
     output_dir = Path(args.output)
 
+    fake_server = None
+    if args.fake:
+        fake_server = FakeAnthropicServer(
+            latency=args.fake_latency, jitter=args.fake_latency / 2, seed=0
+        ).start()
+
     logger.info("Initializing Document Organizer...")
-    organizer = DocumentOrganizer(output_base=output_dir)
+    organizer = DocumentOrganizer(
+        output_base=output_dir,
+        few_shot=args.few_shot,
+        route_models=args.route_models,
+        pack=args.pack,
+        base_url=fake_server.url if fake_server else None,
+        normalize=not args.no_normalize,
+        incremental=not args.full_scan,
+        canonical_duplicates=not args.exact_duplicates,
+        db_path=args.db or (FAKE_DB_PATH if args.fake else "archaeologist.db")
+    )
 
     # Process directory
     results = organizer.process_directory(
         source_dir=source_dir,
         file_pattern=args.pattern,
         copy_mode=not args.move,
-        max_files=args.limit
+        max_files=args.limit,
+        policy=args.order,
+        priority_tags=[tag.strip() for tag in args.priority_tags.split(",") if tag.strip()],
+        budget=RunBudget(
+            max_cost_usd=args.max_cost,
+            max_tokens=args.max_tokens,
+            max_seconds=args.max_minutes * 60 if args.max_minutes is not None else None,
+            on_exhausted=args.on_budget
+        )
     )
 
     # Export results
@@ -366,6 +682,7 @@ def main():
 
     # Create index
     organizer.create_index()
+    organizer.extractors.close()
 
     # Exit code based on results
     if organizer.stats["failed"] > 0:
@@ -1,17 +1,26 @@
 """
-Process Remaining Failed Documents
-Processes the 8 documents that failed during the initial batch run
+Process Remaining Documents
+Resumes unfinished ingestion jobs: every file of the job that is not stored
+yet is processed again, reusing the embedding and metadata saved by the
+interrupted run. Archive members and NDJSON records are read again from
+their archive or export
 """
 
 import sys
-import time
+import asyncio
+import argparse
 import logging
-from pathlib import Path
+from typing import List, Optional, Union
 
 from src.database import DocDatabase
 from src.embedder import LocalEmbedder
-from src.llm import Analyzer
+from src.async_llm import AsyncAnalyzer
+from src.jobs import JobQueue, WorkItem
+from src.ledger import UsageLedger
+from src.normalize import TextNormalizer
 from src.models import DocumentMetadata
+from src.extractors import extract_document
+from src.sources import load_source
 
 # Configure logging
 logging.basicConfig(
@@ -20,123 +29,198 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# The 8 failed documents from resources2
-FAILED_DOCUMENTS = [
-    "Vereinfachte_Confiforms-Lösung_für_Jira-Epic-Erstellung.md",
-    "Verlauf_Promtingqueen_Gemini.md",
-    "virtual_functions.md",
-    "Wichtige_Links_ConfiForms.md",
-    "zed-ai-providers-setup.md",
-    "zed-installation-guide.md",
-    "zed-settings.md",
-    "Zusammenfassung_der_Analyse-Ergebnisse.md"
-]
-
-def process_document(filepath: Path, db: DocDatabase, embedder: LocalEmbedder, analyzer: Analyzer):
-    """Process a single document"""
-
-    logger.info(f"Processing: {filepath.name}")
-
-    try:
-        # Read file
-        try:
-            content = filepath.read_text(encoding='utf-8')
-        except UnicodeDecodeError:
-            content = filepath.read_text(encoding='latin-1')
-
-        logger.info(f"  Length: {len(content)} characters")
-
-        # Check for duplicates
-        content_hash = db._compute_hash(content)
-        if db.document_exists(content_hash):
-            logger.info(f"  [SKIP] Already in database")
-            return True
-
-        # Generate embedding
-        logger.info(f"  Generating embedding...")
-        embedding = embedder.generate_embedding(content)
-
-        # Analyze with Claude
-        logger.info(f"  Analyzing with Claude...")
-        metadata = analyzer.analyze_text(content)
-
-        # Store in database
-        doc_id = db.add_document(content, metadata, embedding)
 
-        logger.info(f"  [OK] Stored with ID: {doc_id}")
-        logger.info(f"  Title: {metadata.title}")
-        logger.info(f"  Language: {metadata.language}")
-        logger.info(f"  Topics: {', '.join(metadata.topics[:3])}")
+def load_document(item: WorkItem, db: DocDatabase, jobs: JobQueue) -> Optional[str]:
+    """Read a work item's file, returning None if its content is already in the database"""
 
-        return True
+    logger.info(f"Loading: {item.path.name} ({item.status}, {item.attempts} failed attempt(s))")
 
-    except Exception as e:
-        logger.error(f"  [ERROR] Failed: {e}")
-        return False
+    if item.path.exists():
+        document = extract_document(item.path)
+    else:
+        # Archive member or NDJSON record (the item's path is its source id)
+        source = load_source(str(item.path))
+        if source is None:
+            raise FileNotFoundError(f"File not found: {item.path}")
+        document = source.read()
+    content, content_hash = document.text, document.content_hash
+    if not content.strip():
+        raise ValueError("File is empty")
+
+    logger.info(f"  Length: {len(content)} characters")
+
+    # Check for duplicates
+    if db.document_exists(content_hash, content):
+        logger.info(f"  [SKIP] Already in database")
+        jobs.mark_skipped(item.id, "Content already stored")
+        return None
+
+    # Saved results of a file that changed since are not reused
+    if not item.resumable(content_hash):
+        item.embedding = item.metadata = None
+    item.content_hash = content_hash
+
+    return content
+
+async def analyze_documents(contents: List[str], db_path: str) -> List[Union[DocumentMetadata, Exception]]:
+    """Analyze all documents concurrently (rate limits are handled by AsyncAnalyzer)"""
+    with UsageLedger(db_path) as ledger:
+        async with AsyncAnalyzer(ledger=ledger) as analyzer:
+            results = await analyzer.analyze_many(contents)
+        totals = ledger.run_totals()
+        logger.info(f"LLM usage (run {ledger.run_id}): {totals['requests']} request(s), ~${totals['cost_usd']:.4f}")
+    return results
+
+def store_document(item: WorkItem, content: str, db: DocDatabase, jobs: JobQueue) -> None:
+    """Store an analyzed document"""
+    doc_id = db.add_document(content, item.metadata, item.embedding, item.extraction_path or "llm")
+    jobs.mark_stored(item.id, doc_id)
+
+    logger.info(f"  [OK] {item.path.name} stored with ID: {doc_id}")
+    logger.info(f"  Title: {item.metadata.title}")
+    logger.info(f"  Language: {item.metadata.language}")
+    logger.info(f"  Topics: {', '.join(item.metadata.topics[:3])}")
+
+def print_jobs(jobs: JobQueue) -> None:
+    """List all jobs with their item counts"""
+    print(f"{'Job':>5}  {'Status':<9}{'Stored':>7}{'Skipped':>8}{'Open':>6}{'Failed':>7}  Source")
+    for job in jobs.list_jobs():
+        open_items = job["pending"] + job["embedded"] + job["analyzed"]
+        print(
+            f"{job['id']:>5}  {job['status']:<9}{job['stored']:>7}{job['skipped']:>8}"
+            f"{open_items:>6}{job['failed']:>7}  {job['source']}"
+        )
 
 def main():
     """Main entry point"""
 
+    parser = argparse.ArgumentParser(description="Resume unfinished ingestion jobs")
+    parser.add_argument("--job", type=int, help="Job id (default: all unfinished jobs)")
+    parser.add_argument("--list", action="store_true", help="List jobs and exit")
+    parser.add_argument("--db", default="archaeologist.db", help="Database path")
+    args = parser.parse_args()
+
+    jobs = JobQueue(args.db)
+    if args.list:
+        print_jobs(jobs)
+        sys.exit(0)
+
     print("=" * 70)
-    print("Processing Remaining Failed Documents")
+    print("Processing Remaining Documents")
     print("=" * 70)
     print()
 
-    # Initialize components
-    logger.info("Initializing database...")
-    db = DocDatabase()
-
-    logger.info("Loading embedding model...")
-    embedder = LocalEmbedder()
-
-    logger.info("Initializing Claude analyzer...")
-    analyzer = Analyzer()
+    job_ids = [args.job] if args.job is not None else [job["id"] for job in jobs.list_jobs(unfinished_only=True)]
+    items = [item for job_id in job_ids for item in jobs.open_items(job_id)]
+    # Each job is resumed with the normalization setting it was started with
+    normalize = {job_id: jobs.job_status(job_id)["normalize"] for job_id in job_ids}
 
-    print()
-    print(f"Found {len(FAILED_DOCUMENTS)} documents to process")
+    print(f"Found {len(items)} documents to process in {len(job_ids)} job(s)")
     print()
 
-    # Base path for resources2
-    resources2_path = Path("../resources2")
+    if not items:
+        for job_id in job_ids:
+            jobs.finish(job_id)
+        print("Nothing to do.")
+        sys.exit(0)
 
-    if not resources2_path.exists():
-        print(f"ERROR: Directory not found: {resources2_path.absolute()}")
-        sys.exit(1)
+    # Initialize components
+    logger.info("Initializing database...")
+    db = DocDatabase(args.db)
 
-    # Process each document
     success_count = 0
     skip_count = 0
     fail_count = 0
-
-    for i, filename in enumerate(FAILED_DOCUMENTS, 1):
-        print(f"\n[{i}/{len(FAILED_DOCUMENTS)}] {filename}")
+    resumed_count = 0
+    # Jobs with files that failed in this run stay open
+    failed_jobs = set()
+
+    # Load documents
+    pending = []
+    for i, item in enumerate(items, 1):
+        print(f"\n[{i}/{len(items)}] {item.path}")
         print("-" * 70)
 
-        filepath = resources2_path / filename
-
-        if not filepath.exists():
-            logger.error(f"File not found: {filepath}")
+        try:
+            content = load_document(item, db, jobs)
+        except Exception as e:
+            logger.error(f"  [ERROR] Failed: {e}")
+            jobs.mark_failed(item.id, str(e))
+            failed_jobs.add(item.job_id)
             fail_count += 1
             continue
 
-        result = process_document(filepath, db, embedder, analyzer)
-
-        if result:
-            success_count += 1
+        if content is None:
+            skip_count += 1
         else:
-            fail_count += 1
+            pending.append((item, content))
+            resumed_count += item.embedding is not None
+
+    if pending:
+        # Embed and analyze the text without images, boilerplate and whitespace runs
+        # (unless the job was started with --no-normalize)
+        normalizer = TextNormalizer()
+        contents = [
+            normalizer.process(content)[0] if normalize[item.job_id] else content
+            for item, content in pending
+        ]
+        logger.info(f"Normalization saved ~{normalizer.get_stats()['tokens_saved']} tokens")
+
+        # Generate the missing embeddings in one batch
+        missing = [index for index, (item, _) in enumerate(pending) if item.embedding is None]
+        if missing:
+            logger.info(f"Generating {len(missing)} embeddings...")
+            embedder = LocalEmbedder()
+            embeddings = embedder.generate_embeddings_batch([contents[index] for index in missing])
+            for index, embedding in zip(missing, embeddings):
+                item = pending[index][0]
+                item.embedding = embedding
+                jobs.mark_embedded(item.id, item.content_hash, embedding)
+
+        # Analyze the documents without saved metadata with Claude (concurrently)
+        missing = [index for index, (item, _) in enumerate(pending) if item.metadata is None]
+        if missing:
+            logger.info(f"Analyzing {len(missing)} documents with Claude...")
+            analyses = asyncio.run(analyze_documents([contents[index] for index in missing], args.db))
+            for index, metadata in zip(missing, analyses):
+                item = pending[index][0]
+                if isinstance(metadata, Exception):
+                    logger.error(f"  [ERROR] {item.path.name} failed: {metadata}")
+                    jobs.mark_failed(item.id, str(metadata))
+                    continue
+                item.metadata, item.extraction_path = metadata, "llm"
+                jobs.mark_analyzed(item.id, metadata, "llm")
 
-        # Small delay to avoid rate limiting
-        if i < len(FAILED_DOCUMENTS):
-            time.sleep(1)
+        # Store in database
+        for item, content in pending:
+            if item.metadata is None:
+                failed_jobs.add(item.job_id)
+                fail_count += 1
+                continue
+            try:
+                store_document(item, content, db, jobs)
+                success_count += 1
+            except Exception as e:
+                logger.error(f"  [ERROR] {item.path.name} failed: {e}")
+                jobs.mark_failed(item.id, str(e))
+                failed_jobs.add(item.job_id)
+                fail_count += 1
+
+    for job_id in job_ids:
+        if job_id not in failed_jobs and jobs.finish(job_id):
+            logger.info(f"Job {job_id} finished")
+
+    db.close()
+    jobs.close()
 
     # Summary
     print()
     print("=" * 70)
     print("SUMMARY")
     print("=" * 70)
-    print(f"Total:      {len(FAILED_DOCUMENTS)}")
+    print(f"Total:      {len(items)}")
     print(f"Successful: {success_count}")
+    print(f"Resumed:    {resumed_count} (saved embedding/metadata reused)")
     print(f"Skipped:    {skip_count}")
     print(f"Failed:     {fail_count}")
     print("=" * 70)
@@ -0,0 +1,204 @@
+"""
+Retry Failed Documents
+Re-drives the documents in the dead-letter queue: documents that failed
+with a transient API error or a rate limit are processed again by the
+command that failed them (batch_test.py or organize_documents.py) once
+their backoff has passed, until they succeed or run out of attempts
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from src.deadletter import (
+    ERROR_CLASSES,
+    RETRYABLE_CLASSES,
+    DeadLetter,
+    DeadLetterQueue,
+)
+from src.fake_anthropic import FAKE_DB_PATH, FakeAnthropicServer
+from src.sources import SourceDocument, load_source
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def find_source(letter: DeadLetter) -> Optional[Union[Path, SourceDocument]]:
+    """File of a dead letter, or its archive member/NDJSON record; None if it is gone"""
+    path = Path(letter.source)
+    if path.is_file():
+        return path
+    return load_source(letter.source)
+
+class Redriver:
+    """Processes dead letters again with the command and options that failed them"""
+
+    def __init__(
+        self,
+        dead_letters: DeadLetterQueue,
+        base_url: Optional[str] = None,
+        db_path: str = "archaeologist.db"
+    ):
+        self.dead_letters = dead_letters
+        self.base_url = base_url
+        self.db_path = db_path
+        # Created on first use per set of options (each loads the embedding model)
+        self._testers: Dict[str, object] = {}
+        self._organizers: Dict[str, object] = {}
+
+    def retry(self, letter: DeadLetter) -> bool:
+        """Process a dead letter again; True if it was stored (or is a duplicate by now)"""
+        source = find_source(letter)
+        if source is None:
+            self.dead_letters.record(letter.source, FileNotFoundError(f"File not found: {letter.source}"), letter.origin)
+            return False
+
+        # Letters recorded before options were stored use the defaults
+        options = letter.context.get("options", {})
+        if letter.origin == "organize":
+            output = letter.context.get("output", "organized_documents")
+            organizer = self._organizer(output, options)
+            result = organizer.process_file(source, copy_mode=letter.context.get("copy", True))
+        else:
+            result = self._batch_tester(options).process_document(source)
+
+        return result["success"] or self.dead_letters.get(letter.source).status != "open"
+
+    def _batch_tester(self, options: Dict):
+        key = json.dumps(options, sort_keys=True)
+        if key not in self._testers:
+            from batch_test import BatchTester
+            self._testers[key] = BatchTester(
+                base_url=self.base_url, dead_letters=self.dead_letters, db_path=self.db_path, **options
+            )
+        return self._testers[key]
+
+    def _organizer(self, output: str, options: Dict):
+        key = json.dumps([output, options], sort_keys=True)
+        if key not in self._organizers:
+            from organize_documents import DocumentOrganizer
+            self._organizers[key] = DocumentOrganizer(
+                output_base=Path(output), base_url=self.base_url, dead_letters=self.dead_letters,
+                db_path=self.db_path, **options
+            )
+        return self._organizers[key]
+
+    def close(self) -> None:
+        """Stop the extractor worker processes of the organizers"""
+        for organizer in self._organizers.values():
+            organizer.extractors.close()
+
+def print_letters(dead_letters: DeadLetterQueue) -> None:
+    """List the open dead letters with their error class and next retry"""
+    letters = dead_letters.open_letters()
+    print(f"{'Class':<15}{'Tries':>6}{'Retry in':>10}  {'Origin':<11}Source / error")
+    now = time.time()
+    for letter in letters:
+        retry_in = f"{max(0, letter.next_retry_at - now):.0f}s" if letter.next_retry_at is not None else "-"
+        print(f"{letter.error_class:<15}{letter.attempts:>6}{retry_in:>10}  {letter.origin:<11}{letter.source}")
+        print(f"{'':<33}{(letter.error or '')[:100]}")
+    stats = dead_letters.stats()
+    print()
+    print(f"{stats['open']} open ({stats['retrying']} retry scheduled), {stats['resolved']} resolved")
+
+def main():
+    """Main entry point"""
+
+    parser = argparse.ArgumentParser(description="Retry documents from the dead-letter queue")
+    parser.add_argument("--class", dest="classes", action="append", choices=ERROR_CLASSES,
+                        help="Error class to retry, repeatable (default: transient_api and rate_limit); "
+                             "other classes are retried once")
+    parser.add_argument("--once", action="store_true",
+                        help="Retry the documents that are due and exit instead of waiting for the rest")
+    parser.add_argument("--max-minutes", type=float,
+                        help="Stop waiting for further retries after this many minutes")
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help="Failed attempts after which a document is given up (default: 5)")
+    parser.add_argument("--list", action="store_true", help="List open dead letters and exit")
+    parser.add_argument("--fake", action="store_true",
+                        help=f"Use a local fake API (offline, no costs); retries the dead letters in {FAKE_DB_PATH}")
+    parser.add_argument("--db", help=f"Database path (default: archaeologist.db, {FAKE_DB_PATH} with --fake)")
+    args = parser.parse_args()
+    args.db = args.db or (FAKE_DB_PATH if args.fake else "archaeologist.db")
+
+    dead_letters = DeadLetterQueue(args.db, max_attempts=args.max_attempts)
+    if args.list:
+        print_letters(dead_letters)
+        sys.exit(0)
+
+    classes = args.classes or list(RETRYABLE_CLASSES)
+    # Classes without automatic retries get one attempt now
+    manual = [error_class for error_class in classes if error_class not in RETRYABLE_CLASSES]
+    if manual:
+        scheduled = dead_letters.schedule(dead_letters.open_letters(manual))
+        logger.info(f"Scheduled {scheduled} document(s) of class {', '.join(manual)} for one retry")
+
+    print("=" * 70)
+    print("Retrying Failed Documents")
+    print("=" * 70)
+    print()
+
+    fake_server = FakeAnthropicServer().start() if args.fake else None
+    redriver = Redriver(dead_letters, base_url=fake_server.url if fake_server else None, db_path=args.db)
+    deadline = time.time() + args.max_minutes * 60 if args.max_minutes is not None else None
+
+    retried = recovered = 0
+    while True:
+        for letter in dead_letters.open_letters(classes, due_only=True):
+            print(f"\n[{letter.error_class}, attempt {letter.attempts + 1}] {letter.source}")
+            print("-" * 70)
+            retried += 1
+            recovered += redriver.retry(letter)
+
+        if args.once:
+            break
+        upcoming = dead_letters.open_letters(classes, retrying_only=True)
+        if not upcoming:
+            break
+        wait = max(0.0, upcoming[0].next_retry_at - time.time())
+        if deadline is not None and time.time() + wait > deadline:
+            logger.info(f"Next retry is after --max-minutes; {len(upcoming)} document(s) left for a later run")
+            break
+        logger.info(f"{len(upcoming)} document(s) waiting; next retry in {wait:.0f}s")
+        time.sleep(wait)
+
+    redriver.close()
+    if fake_server is not None:
+        fake_server.stop()
+
+    remaining = dead_letters.open_letters(classes)
+    stats = dead_letters.stats()
+    dead_letters.close()
+
+    # Summary
+    print()
+    print("=" * 70)
+    print("SUMMARY")
+    print("=" * 70)
+    print(f"Retried:    {retried}")
+    print(f"Recovered:  {recovered}")
+    print(f"Still open: {len(remaining)} ({stats['retrying']} with a retry scheduled)")
+    for error_class in ERROR_CLASSES:
+        if stats[error_class]:
+            print(f"  {error_class:<14}{stats[error_class]}")
+    print("=" * 70)
+
+    if remaining:
+        print()
+        print("⚠ Some documents are still failing. Run with --list for details.")
+        sys.exit(1)
+    else:
+        print()
+        print("✓ All retried documents processed successfully!")
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,11 @@ from .models import DocumentMetadata
 from .database import DocDatabase
 from .embedder import LocalEmbedder
 from .llm import Analyzer
+from .async_llm import AsyncAnalyzer
+from .batch import BatchAnalyzer
+from .cache import MetadataCache
+from .routing import ModelRouter
+from .ledger import UsageLedger
 
 __version__ = "2.0.0"
-__all__ = ["DocumentMetadata", "DocDatabase", "LocalEmbedder", "Analyzer"]
+__all__ = ["DocumentMetadata", "DocDatabase", "LocalEmbedder", "Analyzer", "AsyncAnalyzer", "BatchAnalyzer", "MetadataCache", "ModelRouter", "UsageLedger"]
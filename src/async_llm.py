@@ -0,0 +1,337 @@
+"""
+Concurrent document analysis using the async Anthropic client.
+
+Used for bulk ingestion: many documents are analyzed in flight at once
+while an adaptive rate limiter keeps the request rate within the limits
+reported by the API.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Union
+
+import httpx
+from anthropic import APIConnectionError, APIStatusError, AsyncAnthropic, DefaultAsyncHttpxClient
+from dotenv import load_dotenv
+
+from .ledger import KIND_ANALYSIS, KIND_REPAIR, UsageLedger
+from .llm import (
+    DEFAULT_MODEL,
+    MetadataParseError,
+    build_repair_params,
+    build_request_params,
+    parse_metadata_response,
+    prepare_text,
+)
+from .models import DocumentMetadata
+
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Status codes worth retrying: rate limited and overloaded
+RETRYABLE_STATUS_CODES = {429, 529}
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Convert an RFC 3339 reset timestamp header into seconds from now."""
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    """Parse an integer header value, ignoring malformed input."""
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Paces requests using the rate-limit headers returned by the API.
+
+    While plenty of quota is left, requests are released immediately.
+    Once the remaining request or token quota drops below a reserve, the
+    remaining quota is spread evenly until the window resets. A
+    retry-after from a 429/529 pauses all requests until it has elapsed.
+    """
+
+    def __init__(self, reserve_fraction: float = 0.2):
+        """
+        Initialize the limiter.
+
+        Args:
+            reserve_fraction: Fraction of the quota below which requests are paced
+        """
+        self.reserve_fraction = reserve_fraction
+        self._interval = 0.0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._avg_per_request: dict = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until the next request may be sent."""
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._paused_until)
+            self._next_slot = start + self._interval
+        delay = start - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, headers: httpx.Headers, usage=None) -> None:
+        """
+        Adjust pacing from anthropic-ratelimit-* response headers.
+
+        Args:
+            headers: Response headers of a completed request
+            usage: Optional response.usage, used to learn tokens per request
+        """
+        if usage is not None:
+            self._observe("input-tokens", usage.input_tokens)
+            self._observe("output-tokens", usage.output_tokens)
+
+        intervals = [0.0]
+        for kind in ("requests", "input-tokens", "output-tokens"):
+            per_request = 1.0 if kind == "requests" else self._avg_per_request.get(kind)
+            limit = _parse_int(headers.get(f"anthropic-ratelimit-{kind}-limit"))
+            remaining = _parse_int(headers.get(f"anthropic-ratelimit-{kind}-remaining"))
+            reset_in = _parse_reset(headers.get(f"anthropic-ratelimit-{kind}-reset"))
+            if not per_request or not limit or remaining is None or reset_in is None:
+                continue
+            if remaining <= limit * self.reserve_fraction:
+                affordable_requests = max(remaining / per_request, 1.0)
+                intervals.append(reset_in / affordable_requests)
+
+        interval = max(intervals)
+        if interval != self._interval:
+            logger.debug(f"Rate limiter interval adjusted to {interval:.3f}s")
+        self._interval = interval
+
+    def _observe(self, kind: str, tokens: int) -> None:
+        """Update the moving average of tokens consumed per request."""
+        previous = self._avg_per_request.get(kind)
+        self._avg_per_request[kind] = tokens if previous is None else 0.8 * previous + 0.2 * tokens
+
+    def pause(self, seconds: float) -> None:
+        """
+        Pause all requests, e.g. after a retry-after response.
+
+        Args:
+            seconds: Pause duration
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning(f"Rate limited - pausing requests for {seconds:.1f}s")
+
+
+class AsyncAnalyzer:
+    """
+    Async counterpart of Analyzer for bulk ingestion.
+
+    Runs up to max_concurrency requests in parallel over a pooled
+    keep-alive HTTP connection pool, paced by AdaptiveRateLimiter.
+    Rate-limit (429) and overload (529) responses are retried after the
+    server's retry-after delay.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        api_key: Optional[str] = None,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        max_repair_rounds: int = 1,
+        base_url: Optional[str] = None,
+        ledger: Optional[UsageLedger] = None
+    ):
+        """
+        Initialize async Claude API client.
+
+        Args:
+            model: Claude model identifier
+            api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
+            max_concurrency: Maximum number of requests in flight
+            max_retries: Retries per document on 429/529 and connection errors
+            max_repair_rounds: Times an invalid tool input is sent back for correction
+            base_url: Optional API base URL (e.g. a FakeAnthropicServer)
+            ledger: Optional usage ledger every request is recorded in
+
+        Raises:
+            ValueError: If API key is not provided or found in environment
+        """
+        self.model = model
+        self.ledger = ledger
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.max_repair_rounds = max_repair_rounds
+        self.parse_stats = {"responses": 0, "valid_first_try": 0, "repaired": 0, "failed": 0}
+
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+
+        if not self.api_key:
+            raise ValueError(
+                "Anthropic API key not found. "
+                "Provide via parameter or set ANTHROPIC_API_KEY environment variable."
+            )
+
+        try:
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_concurrency,
+                    max_keepalive_connections=max_concurrency,
+                    keepalive_expiry=60.0
+                )
+            )
+            # Retries are handled here so they can respect the shared limiter
+            self.client = AsyncAnthropic(
+                api_key=self.api_key, base_url=base_url, http_client=http_client, max_retries=0
+            )
+            logger.info(f"Async Claude API client initialized with model: {model} (concurrency {max_concurrency})")
+        except Exception as e:
+            logger.error(f"Failed to initialize async Claude client: {e}")
+            raise RuntimeError(f"Could not initialize async Claude API client: {e}")
+
+        self.rate_limiter = AdaptiveRateLimiter()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def analyze_text(self, text: str) -> DocumentMetadata:
+        """
+        Analyze document text and extract structured metadata.
+
+        Args:
+            text: Document content to analyze
+
+        Returns:
+            DocumentMetadata object with extracted information
+
+        Raises:
+            ValueError: If text is empty
+            RuntimeError: If API call fails or response is invalid
+        """
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest() if text else None
+        text = prepare_text(text)
+        params = build_request_params(text, self.model)
+
+        async with self._semaphore:
+            for repair_round in range(self.max_repair_rounds + 1):
+                kind = KIND_ANALYSIS if repair_round == 0 else KIND_REPAIR
+                response = await self._send(params, content_hash, kind)
+                try:
+                    metadata = parse_metadata_response(response)
+                    break
+                except MetadataParseError as e:
+                    if repair_round == self.max_repair_rounds:
+                        self.parse_stats["responses"] += 1
+                        self.parse_stats["failed"] += 1
+                        raise
+                    params = build_repair_params(params, response, e)
+
+        self.parse_stats["responses"] += 1
+        self.parse_stats["valid_first_try" if repair_round == 0 else "repaired"] += 1
+        logger.info(f"Successfully extracted metadata: {metadata.title}")
+        return metadata
+
+    async def _send(self, params: dict, content_hash: Optional[str] = None, kind: str = KIND_ANALYSIS):
+        """
+        Send one request, retrying 429/529 and connection errors.
+
+        Args:
+            params: messages.create() parameters
+            content_hash: SHA256 hash of the analyzed document, for the ledger
+            kind: Request kind recorded in the ledger
+
+        Returns:
+            Parsed Message
+
+        Raises:
+            RuntimeError: If the request fails permanently or retries are exhausted
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                started = time.perf_counter()
+                raw = await self.client.messages.with_raw_response.create(**params)
+                response = raw.parse()
+                self.rate_limiter.update(raw.headers, response.usage)
+                if self.ledger is not None:
+                    self.ledger.record(
+                        params["model"], response.usage, time.perf_counter() - started, kind, content_hash
+                    )
+                return response
+            except APIStatusError as e:
+                if e.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    logger.error(f"Claude API call failed: {e}")
+                    raise RuntimeError(f"Document analysis failed: {e}") from e
+                self.rate_limiter.update(e.response.headers)
+                self.rate_limiter.pause(self._retry_delay(e.response.headers, attempt))
+            except APIConnectionError as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Claude API call failed: {e}")
+                    raise RuntimeError(f"Document analysis failed: {e}") from e
+                await asyncio.sleep(self._retry_delay(None, attempt))
+
+    async def analyze_many(self, texts: List[str]) -> List[Union[DocumentMetadata, Exception]]:
+        """
+        Analyze many documents concurrently.
+
+        Args:
+            texts: Document contents
+
+        Returns:
+            One entry per input, in order: DocumentMetadata or the exception raised
+        """
+        return await asyncio.gather(
+            *(self.analyze_text(text) for text in texts),
+            return_exceptions=True
+        )
+
+    @staticmethod
+    def _retry_delay(headers: Optional[httpx.Headers], attempt: int) -> float:
+        """Seconds to wait before a retry: retry-after if present, else exponential backoff."""
+        if headers is not None:
+            retry_after = headers.get("retry-after")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+    def get_model_info(self) -> dict:
+        """
+        Get information about the current model configuration.
+
+        Returns:
+            Dictionary with model name and other settings
+        """
+        return {
+            "model": self.model,
+            "provider": "Anthropic Claude",
+            "max_concurrency": self.max_concurrency
+        }
+
+    async def close(self) -> None:
+        """Close the pooled HTTP connections."""
+        await self.client.close()
+
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit - closes the connection pool."""
+        await self.close()
@@ -0,0 +1,335 @@
+"""
+Bulk metadata extraction via the Anthropic Message Batches API.
+
+Batches are processed asynchronously by the API (usually within hours)
+at a reduced price, which suits overnight re-analysis of large archives.
+Submitted batch ids and their document hashes are persisted in SQLite so
+polling and collection can happen in a later process.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from anthropic import Anthropic
+from dotenv import load_dotenv
+
+from .ledger import KIND_BATCH, UsageLedger
+from .llm import DEFAULT_MODEL, build_request_params, parse_metadata_response, prepare_text
+from .models import DocumentMetadata
+
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# API limit is 100,000 requests (and 256 MB) per batch
+MAX_REQUESTS_PER_BATCH = 10000
+
+
+class BatchAnalyzer:
+    """
+    Submits documents as message batches and collects their metadata.
+
+    Each request's custom_id is the document's SHA256 content hash, so
+    results map straight back to DocDatabase rows.
+
+    Schema (in the archaeologist database):
+        - llm_batches: One row per submitted batch and its status
+        - llm_batch_items: Content hash and source path of every request
+    """
+
+    def __init__(
+        self,
+        db_path: str = "archaeologist.db",
+        model: str = DEFAULT_MODEL,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        ledger: Optional[UsageLedger] = None
+    ):
+        """
+        Initialize Claude API client and batch bookkeeping tables.
+
+        Args:
+            db_path: Path to SQLite database file
+            model: Claude model identifier
+            api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
+            base_url: Optional API base URL (e.g. a FakeAnthropicServer)
+            ledger: Optional usage ledger collected results are recorded in
+
+        Raises:
+            ValueError: If API key is not provided or found in environment
+        """
+        self.model = model
+        self.ledger = ledger
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+
+        if not self.api_key:
+            raise ValueError(
+                "Anthropic API key not found. "
+                "Provide via parameter or set ANTHROPIC_API_KEY environment variable."
+            )
+
+        try:
+            self.client = Anthropic(api_key=self.api_key, base_url=base_url)
+        except Exception as e:
+            raise RuntimeError(f"Could not initialize Claude API client: {e}")
+
+        self.db_path = Path(db_path)
+        try:
+            self.conn = sqlite3.connect(self.db_path)
+            self.conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create batch bookkeeping tables if they don't exist."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS llm_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    request_count INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    ended_at TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS llm_batch_items (
+                    batch_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    source_path TEXT,
+                    status TEXT NOT NULL DEFAULT 'submitted',
+                    error TEXT,
+                    PRIMARY KEY (batch_id, content_hash)
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_batch_items_hash
+                ON llm_batch_items(content_hash)
+            """)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize batch tables: {e}")
+
+    def is_pending(self, content_hash: str) -> bool:
+        """
+        Check whether a document is already queued in an uncollected batch.
+
+        Args:
+            content_hash: SHA256 hash of document content
+
+        Returns:
+            True if a submitted request for this hash is still outstanding
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM llm_batch_items WHERE content_hash = ? AND status = 'submitted' LIMIT 1",
+            (content_hash,)
+        )
+        return cursor.fetchone() is not None
+
+    def submit(self, documents: List[Tuple[str, str, Optional[str]]]) -> List[str]:
+        """
+        Submit documents for batch analysis.
+
+        Args:
+            documents: Tuples of (content_hash, content, source_path)
+
+        Returns:
+            List of created batch ids (large inputs are split into several batches)
+
+        Raises:
+            RuntimeError: If the API rejects a batch
+        """
+        batch_ids = []
+        for start in range(0, len(documents), MAX_REQUESTS_PER_BATCH):
+            chunk = documents[start:start + MAX_REQUESTS_PER_BATCH]
+            requests = [
+                {
+                    "custom_id": content_hash,
+                    "params": build_request_params(prepare_text(content), self.model)
+                }
+                for content_hash, content, _ in chunk
+            ]
+
+            try:
+                batch = self.client.messages.batches.create(requests=requests)
+            except Exception as e:
+                logger.error(f"Batch submission failed: {e}")
+                raise RuntimeError(f"Batch submission failed: {e}") from e
+
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "INSERT INTO llm_batches (batch_id, model, status, request_count) VALUES (?, ?, ?, ?)",
+                (batch.id, self.model, batch.processing_status, len(chunk))
+            )
+            cursor.executemany(
+                "INSERT INTO llm_batch_items (batch_id, content_hash, source_path) VALUES (?, ?, ?)",
+                [(batch.id, content_hash, source_path) for content_hash, _, source_path in chunk]
+            )
+            self.conn.commit()
+
+            logger.info(f"Submitted batch {batch.id} with {len(chunk)} requests")
+            batch_ids.append(batch.id)
+
+        return batch_ids
+
+    def get_batches(self, status: Optional[str] = None) -> List[sqlite3.Row]:
+        """
+        List persisted batches.
+
+        Args:
+            status: Optional status filter ('in_progress', 'ended', 'collected', ...)
+
+        Returns:
+            Rows of the llm_batches table, oldest first
+        """
+        cursor = self.conn.cursor()
+        if status:
+            cursor.execute("SELECT * FROM llm_batches WHERE status = ? ORDER BY created_at", (status,))
+        else:
+            cursor.execute("SELECT * FROM llm_batches ORDER BY created_at")
+        return cursor.fetchall()
+
+    def refresh(self, batch_id: str) -> str:
+        """
+        Fetch the current processing status of a batch and persist it.
+
+        Args:
+            batch_id: Message batch id
+
+        Returns:
+            processing_status reported by the API
+        """
+        batch = self.client.messages.batches.retrieve(batch_id)
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE llm_batches SET status = ?, ended_at = ? WHERE batch_id = ? AND status != 'collected'",
+            (batch.processing_status, batch.ended_at.isoformat() if batch.ended_at else None, batch_id)
+        )
+        self.conn.commit()
+        return batch.processing_status
+
+    def wait(self, batch_id: str, poll_interval: float = 60.0, timeout: Optional[float] = None) -> None:
+        """
+        Poll until a batch has ended.
+
+        Args:
+            batch_id: Message batch id
+            poll_interval: Seconds between status checks
+            timeout: Optional maximum wait in seconds
+
+        Raises:
+            TimeoutError: If the batch has not ended within timeout
+        """
+        started = time.monotonic()
+        while self.refresh(batch_id) != "ended":
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch {batch_id} did not finish within {timeout}s")
+            logger.info(f"Batch {batch_id} still in progress, next check in {poll_interval:.0f}s")
+            time.sleep(poll_interval)
+
+    def collect(self, batch_id: str) -> Dict[str, Union[DocumentMetadata, Exception]]:
+        """
+        Download and parse the results of an ended batch.
+
+        Args:
+            batch_id: Message batch id
+
+        Returns:
+            Mapping of content hash to DocumentMetadata, or to the error for failed requests
+        """
+        results: Dict[str, Union[DocumentMetadata, Exception]] = {}
+        succeeded = []
+        cursor = self.conn.cursor()
+
+        for entry in self.client.messages.batches.results(batch_id):
+            content_hash = entry.custom_id
+            try:
+                if entry.result.type != "succeeded":
+                    raise RuntimeError(f"Batch request {entry.result.type}: {getattr(entry.result, 'error', '')}")
+                succeeded.append((content_hash, entry.result.message))
+                results[content_hash] = parse_metadata_response(entry.result.message)
+                cursor.execute(
+                    "UPDATE llm_batch_items SET status = 'succeeded' WHERE batch_id = ? AND content_hash = ?",
+                    (batch_id, content_hash)
+                )
+            except Exception as e:
+                results[content_hash] = e
+                cursor.execute(
+                    "UPDATE llm_batch_items SET status = 'errored', error = ? WHERE batch_id = ? AND content_hash = ?",
+                    (str(e), batch_id, content_hash)
+                )
+
+        self.conn.commit()
+
+        # Written after the commit above, the ledger uses its own connection
+        if self.ledger is not None:
+            for content_hash, message in succeeded:
+                self.ledger.record(message.model, message.usage, kind=KIND_BATCH,
+                                   content_hash=content_hash, batch=True)
+
+        logger.info(f"Collected {len(results)} results from batch {batch_id}")
+        return results
+
+    def get_items(self, batch_id: str) -> Dict[str, Optional[str]]:
+        """
+        Get the source paths of all requests in a batch.
+
+        Args:
+            batch_id: Message batch id
+
+        Returns:
+            Mapping of content hash to source path
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT content_hash, source_path FROM llm_batch_items WHERE batch_id = ?", (batch_id,))
+        return {row["content_hash"]: row["source_path"] for row in cursor.fetchall()}
+
+    def mark_item(self, batch_id: str, content_hash: str, status: str, error: Optional[str] = None) -> None:
+        """
+        Record the final state of a collected item (e.g. 'stored').
+
+        Args:
+            batch_id: Message batch id
+            content_hash: Content hash of the item
+            status: New status
+            error: Optional error message
+        """
+        self.conn.execute(
+            "UPDATE llm_batch_items SET status = ?, error = ? WHERE batch_id = ? AND content_hash = ?",
+            (status, error, batch_id, content_hash)
+        )
+        self.conn.commit()
+
+    def mark_collected(self, batch_id: str) -> None:
+        """
+        Mark a batch as fully collected so it is not processed again.
+
+        Args:
+            batch_id: Message batch id
+        """
+        self.conn.execute("UPDATE llm_batches SET status = 'collected' WHERE batch_id = ?", (batch_id,))
+        self.conn.commit()
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
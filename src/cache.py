@@ -0,0 +1,285 @@
+"""
+Caching helpers: an in-memory LRU cache and a persistent LLM metadata cache.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Iterable, Optional
+
+from .models import DocumentMetadata
+from .pricing import estimate_cost
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with optional time-to-live.
+
+    Tracks hits and misses so callers can expose hit rates.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Optional lifetime of an entry in seconds (None = no expiry)
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a cached value.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value, or None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries (hit/miss counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with size, capacity, hits, misses and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class MetadataCache:
+    """
+    Persistent cache of LLM analysis results.
+
+    Entries are keyed by (content hash, model id, prompt hash), so a
+    change of model or of the prompt in src/llm.py never returns stale
+    metadata. Token usage of the original call is stored with each entry
+    to report how much money cache hits saved.
+
+    Schema:
+        - llm_metadata_cache: One row per analyzed (content, model, prompt)
+    """
+
+    def __init__(self, db_path: str = "archaeologist.db"):
+        """
+        Initialize database connection.
+
+        Args:
+            db_path: Path to SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_usd = 0.0
+        # Keys written by this instance: their calls were paid in this run, so hits save nothing
+        self._written = set()
+
+        try:
+            # Shared by worker threads; access is serialized by self._lock
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the cache table if it doesn't exist."""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_metadata_cache (
+                    content_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    metadata_json TEXT NOT NULL,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (content_hash, model, prompt_hash)
+                )
+            """)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize metadata cache: {e}")
+
+    def get(
+        self,
+        content_hash: str,
+        model: str,
+        prompt_hash: str,
+        fallback_model: Optional[str] = None
+    ) -> Optional[DocumentMetadata]:
+        """
+        Look up cached metadata.
+
+        Args:
+            content_hash: SHA256 hash of the analyzed text
+            model: Claude model identifier
+            prompt_hash: Fingerprint of the prompt template
+            fallback_model: Model whose entry is used if model has none (e.g. the
+                default model a routed document was escalated to)
+
+        Returns:
+            Cached DocumentMetadata, or None on a miss
+        """
+        models = [model] if fallback_model in (None, model) else [model, fallback_model]
+        with self._lock:
+            row = self.conn.execute(
+                f"""SELECT metadata_json, input_tokens, output_tokens, model FROM llm_metadata_cache
+                    WHERE content_hash = ? AND model IN ({", ".join("?" for _ in models)}) AND prompt_hash = ?
+                    ORDER BY model = ? DESC LIMIT 1""",
+                (content_hash, *models, prompt_hash, model)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if (content_hash, row[3], prompt_hash) not in self._written:
+                self.saved_usd += estimate_cost(row[3], row[1], row[2])
+            return DocumentMetadata.model_validate_json(row[0])
+
+    def put(
+        self,
+        content_hash: str,
+        model: str,
+        prompt_hash: str,
+        metadata: DocumentMetadata,
+        input_tokens: int = 0,
+        output_tokens: int = 0
+    ) -> None:
+        """
+        Store analysis result.
+
+        Args:
+            content_hash: SHA256 hash of the analyzed text
+            model: Claude model identifier
+            prompt_hash: Fingerprint of the prompt template
+            metadata: Extracted metadata
+            input_tokens: Input tokens the analysis consumed
+            output_tokens: Output tokens the analysis consumed
+        """
+        with self._lock:
+            try:
+                self.conn.execute(
+                    """INSERT OR REPLACE INTO llm_metadata_cache
+                       (content_hash, model, prompt_hash, metadata_json, input_tokens, output_tokens)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (content_hash, model, prompt_hash, metadata.model_dump_json(), input_tokens, output_tokens)
+                )
+                self.conn.commit()
+                self._written.add((content_hash, model, prompt_hash))
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to write metadata cache: {e}")
+
+    def invalidate(self, keep_prompt_hashes: Optional[Iterable[str]] = None) -> int:
+        """
+        Remove cache entries.
+
+        Args:
+            keep_prompt_hashes: If given, only entries created with other
+                prompts are removed; otherwise the whole cache is cleared
+
+        Returns:
+            Number of removed entries
+        """
+        with self._lock:
+            if keep_prompt_hashes is None:
+                cursor = self.conn.execute("DELETE FROM llm_metadata_cache")
+            else:
+                keep = list(keep_prompt_hashes)
+                placeholders = ", ".join("?" for _ in keep)
+                cursor = self.conn.execute(
+                    f"DELETE FROM llm_metadata_cache WHERE prompt_hash NOT IN ({placeholders})",
+                    keep
+                )
+            self.conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics for this session.
+
+        Returns:
+            Dictionary with entries, hits, misses, hit rate and USD saved
+            (hits on entries written in this session, e.g. by packed
+            prefetching, count as hits but save nothing)
+        """
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_metadata_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_usd": round(self.saved_usd, 4)
+            }
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
@@ -5,6 +5,7 @@ SQLite database management for document storage and retrieval.
 import sqlite3
 import hashlib
 import json
+import unicodedata
 from pathlib import Path
 from typing import Optional, List, Tuple
 from datetime import datetime
@@ -12,6 +13,29 @@ from datetime import datetime
 from .models import DocumentMetadata
 
 
+# Rows backfilled per statement when canonical hashes are added to a database
+_BACKFILL_BATCH = 500
+
+
+def canonicalize(content: str) -> str:
+    """
+    Canonical form of a document for duplicate detection.
+
+    Removes a byte order mark, unifies line endings to LF, strips trailing
+    whitespace of lines and of the text, and applies Unicode NFC, so the same
+    document saved by different editors or systems compares equal.
+
+    Args:
+        content: Document text
+
+    Returns:
+        Canonical text
+    """
+    text = content.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n")).rstrip()
+    return unicodedata.normalize("NFC", text)
+
+
 class DocDatabase:
     """
     Manages SQLite database for document storage with embeddings and metadata.
@@ -19,16 +43,20 @@ class DocDatabase:
     Schema:
         - documents: Main table storing document content, hash, and metadata
         - embeddings: Stored as JSON array in the documents table
+        - metadata_history: Previous metadata of documents that were re-analyzed
     """
 
-    def __init__(self, db_path: str = "archaeologist.db"):
+    def __init__(self, db_path: str = "archaeologist.db", canonical_duplicates: bool = True):
         """
         Initialize database connection.
 
         Args:
             db_path: Path to SQLite database file
+            canonical_duplicates: Treat documents with the same canonical form
+                (see canonicalize()) as duplicates, not only identical content
         """
         self.db_path = Path(db_path)
+        self.canonical_duplicates = canonical_duplicates
         self.conn: Optional[sqlite3.Connection] = None
         self._connect()
         self.init_db()
@@ -49,10 +77,17 @@ class DocDatabase:
             documents:
                 - id: Primary key
                 - content_hash: SHA256 hash for duplicate detection
+                - canonical_hash: SHA256 hash of the canonical form (see canonicalize())
                 - content: Full document text
                 - metadata_json: JSON string of DocumentMetadata
                 - embedding_json: JSON array of embedding vector
                 - created_at: Timestamp of insertion
+                - extraction_path: How the metadata was produced ('llm', 'local' or 'dedup')
+                - updated_at: Timestamp of the last re-analysis (NULL if never updated)
+            metadata_history:
+                - doc_id: Document whose metadata was replaced
+                - metadata_json, extraction_path: The replaced version
+                - replaced_at: Timestamp of the replacement
         """
         if not self.conn:
             raise RuntimeError("Database connection not established")
@@ -66,20 +101,72 @@ class DocDatabase:
                     content TEXT NOT NULL,
                     metadata_json TEXT NOT NULL,
                     embedding_json TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    extraction_path TEXT NOT NULL DEFAULT 'llm',
+                    canonical_hash TEXT,
+                    updated_at TIMESTAMP
                 )
             """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS metadata_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id INTEGER NOT NULL,
+                    metadata_json TEXT NOT NULL,
+                    extraction_path TEXT NOT NULL,
+                    replaced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_metadata_history_doc
+                ON metadata_history(doc_id)
+            """)
+
+            self._migrate(cursor)
 
             # Create index on content_hash for fast duplicate lookups
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_content_hash
                 ON documents(content_hash)
             """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_canonical_hash
+                ON documents(canonical_hash)
+            """)
 
             self.conn.commit()
         except sqlite3.Error as e:
             raise RuntimeError(f"Failed to initialize database: {e}")
 
+    def _migrate(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Add columns introduced after a database was created.
+
+        Args:
+            cursor: Cursor of the open connection
+        """
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(documents)")}
+        if "extraction_path" not in columns:
+            # Existing rows were all analyzed by the LLM
+            cursor.execute(
+                "ALTER TABLE documents ADD COLUMN extraction_path TEXT NOT NULL DEFAULT 'llm'"
+            )
+        if "canonical_hash" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN canonical_hash TEXT")
+        if "updated_at" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN updated_at TIMESTAMP")
+
+        # Existing rows get their canonical hash computed from the stored content
+        while True:
+            rows = cursor.execute(
+                "SELECT id, content FROM documents WHERE canonical_hash IS NULL LIMIT ?", (_BACKFILL_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                "UPDATE documents SET canonical_hash = ? WHERE id = ?",
+                [(self._compute_canonical_hash(row[1]), row[0]) for row in rows]
+            )
+
     def _compute_hash(self, content: str) -> str:
         """
         Compute SHA256 hash of document content.
@@ -92,12 +179,26 @@ class DocDatabase:
         """
         return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
-    def document_exists(self, content_hash: str) -> bool:
+    def _compute_canonical_hash(self, content: str) -> str:
+        """
+        Compute SHA256 hash of the canonical form of document content.
+
+        Args:
+            content: Document text
+
+        Returns:
+            Hexadecimal hash string
+        """
+        return self._compute_hash(canonicalize(content))
+
+    def document_exists(self, content_hash: str, content: Optional[str] = None) -> bool:
         """
         Check if document already exists in database.
 
         Args:
             content_hash: SHA256 hash of document content
+            content: Document text; if given and canonical_duplicates is enabled,
+                a document with the same canonical form also counts
 
         Returns:
             True if document exists, False otherwise
@@ -107,10 +208,16 @@ class DocDatabase:
 
         try:
             cursor = self.conn.cursor()
-            cursor.execute(
-                "SELECT 1 FROM documents WHERE content_hash = ? LIMIT 1",
-                (content_hash,)
-            )
+            if content is not None and self.canonical_duplicates:
+                cursor.execute(
+                    "SELECT 1 FROM documents WHERE content_hash = ? OR canonical_hash = ? LIMIT 1",
+                    (content_hash, self._compute_canonical_hash(content))
+                )
+            else:
+                cursor.execute(
+                    "SELECT 1 FROM documents WHERE content_hash = ? LIMIT 1",
+                    (content_hash,)
+                )
             return cursor.fetchone() is not None
         except sqlite3.Error as e:
             raise RuntimeError(f"Failed to check document existence: {e}")
@@ -119,7 +226,8 @@ class DocDatabase:
         self,
         content: str,
         metadata: DocumentMetadata,
-        embedding: Optional[List[float]] = None
+        embedding: Optional[List[float]] = None,
+        extraction_path: str = "llm"
     ) -> int:
         """
         Add new document to database.
@@ -128,6 +236,7 @@ class DocDatabase:
             content: Full document text
             metadata: Extracted metadata (Pydantic model)
             embedding: Optional embedding vector
+            extraction_path: How the metadata was produced ('llm', 'local' or 'dedup')
 
         Returns:
             Document ID of inserted record
@@ -142,7 +251,7 @@ class DocDatabase:
         content_hash = self._compute_hash(content)
 
         # Check for duplicates
-        if self.document_exists(content_hash):
+        if self.document_exists(content_hash, content):
             raise ValueError(f"Document with hash {content_hash[:16]}... already exists")
 
         try:
@@ -155,9 +264,10 @@ class DocDatabase:
             embedding_json = json.dumps(embedding) if embedding else None
 
             cursor.execute("""
-                INSERT INTO documents (content_hash, content, metadata_json, embedding_json)
-                VALUES (?, ?, ?, ?)
-            """, (content_hash, content, metadata_json, embedding_json))
+                INSERT INTO documents (content_hash, content, metadata_json, embedding_json, extraction_path, canonical_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (content_hash, content, metadata_json, embedding_json, extraction_path,
+                  self._compute_canonical_hash(content)))
 
             self.conn.commit()
             return cursor.lastrowid
@@ -165,6 +275,274 @@ class DocDatabase:
             self.conn.rollback()
             raise RuntimeError(f"Failed to add document: {e}")
 
+    def add_documents(
+        self,
+        documents: List[Tuple[str, DocumentMetadata, Optional[List[float]], str]]
+    ) -> List[Optional[int]]:
+        """
+        Add many documents in a single transaction.
+
+        Args:
+            documents: Tuples of (content, metadata, embedding, extraction_path)
+
+        Returns:
+            Document ID per input, in order; None for documents that already exist
+            (or whose canonical form does, if canonical_duplicates is enabled)
+
+        Raises:
+            RuntimeError: On database errors (nothing of the batch is stored)
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        ids: List[Optional[int]] = []
+        try:
+            cursor = self.conn.cursor()
+            for content, metadata, embedding, extraction_path in documents:
+                canonical_hash = self._compute_canonical_hash(content)
+                if self.canonical_duplicates and cursor.execute(
+                    "SELECT 1 FROM documents WHERE canonical_hash = ? LIMIT 1", (canonical_hash,)
+                ).fetchone():
+                    ids.append(None)
+                    continue
+                cursor.execute("""
+                    INSERT OR IGNORE INTO documents (content_hash, content, metadata_json, embedding_json, extraction_path, canonical_hash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (
+                    self._compute_hash(content),
+                    content,
+                    metadata.model_dump_json(),
+                    json.dumps(embedding) if embedding else None,
+                    extraction_path,
+                    canonical_hash
+                ))
+                ids.append(cursor.lastrowid if cursor.rowcount == 1 else None)
+
+            self.conn.commit()
+            return ids
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise RuntimeError(f"Failed to add documents: {e}")
+
+    def _upsert(
+        self,
+        cursor: sqlite3.Cursor,
+        content: str,
+        metadata: DocumentMetadata,
+        embedding: Optional[List[float]],
+        extraction_path: str
+    ) -> Tuple[int, bool]:
+        """Insert a document or replace the metadata of the stored one (no commit)."""
+        content_hash = self._compute_hash(content)
+        canonical_hash = self._compute_canonical_hash(content)
+
+        row = cursor.execute(
+            "SELECT id, metadata_json, extraction_path FROM documents WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if row is None and self.canonical_duplicates:
+            row = cursor.execute(
+                "SELECT id, metadata_json, extraction_path FROM documents WHERE canonical_hash = ? LIMIT 1",
+                (canonical_hash,)
+            ).fetchone()
+
+        if row is None:
+            cursor.execute("""
+                INSERT INTO documents (content_hash, content, metadata_json, embedding_json, extraction_path, canonical_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (content_hash, content, metadata.model_dump_json(),
+                  json.dumps(embedding) if embedding else None, extraction_path, canonical_hash))
+            return cursor.lastrowid, True
+
+        doc_id = row[0]
+        cursor.execute(
+            "INSERT INTO metadata_history (doc_id, metadata_json, extraction_path) VALUES (?, ?, ?)",
+            (doc_id, row[1], row[2])
+        )
+        # The stored content stays; a missing embedding keeps the stored one
+        cursor.execute("""
+            UPDATE documents
+            SET metadata_json = ?, embedding_json = COALESCE(?, embedding_json),
+                extraction_path = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (metadata.model_dump_json(), json.dumps(embedding) if embedding else None, extraction_path, doc_id))
+        return doc_id, False
+
+    def upsert_document(
+        self,
+        content: str,
+        metadata: DocumentMetadata,
+        embedding: Optional[List[float]] = None,
+        extraction_path: str = "llm"
+    ) -> Tuple[int, bool]:
+        """
+        Add a document, or update metadata and embedding of the stored one in place.
+
+        An existing document is matched by content hash (or canonical hash, if
+        canonical_duplicates is enabled); its previous metadata is kept in
+        metadata_history.
+
+        Args:
+            content: Full document text
+            metadata: Extracted metadata (Pydantic model)
+            embedding: Optional embedding vector (None keeps the stored one)
+            extraction_path: How the metadata was produced ('llm', 'local' or 'dedup')
+
+        Returns:
+            Tuple of (document ID, True if the document was inserted)
+
+        Raises:
+            RuntimeError: On database errors
+        """
+        return self.upsert_documents([(content, metadata, embedding, extraction_path)])[0]
+
+    def upsert_documents(
+        self,
+        documents: List[Tuple[str, DocumentMetadata, Optional[List[float]], str]]
+    ) -> List[Tuple[int, bool]]:
+        """
+        Add or update many documents in a single transaction (see upsert_document()).
+
+        Args:
+            documents: Tuples of (content, metadata, embedding, extraction_path)
+
+        Returns:
+            (document ID, inserted) per input, in order
+
+        Raises:
+            RuntimeError: On database errors (nothing of the batch is stored)
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            cursor = self.conn.cursor()
+            results = [self._upsert(cursor, *document) for document in documents]
+            self.conn.commit()
+            return results
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise RuntimeError(f"Failed to upsert documents: {e}")
+
+    def replace_document(
+        self,
+        doc_id: int,
+        content: str,
+        metadata: DocumentMetadata,
+        embedding: Optional[List[float]] = None,
+        extraction_path: str = "llm"
+    ) -> bool:
+        """
+        Replace content, metadata and embedding of a stored document, keeping its ID.
+
+        Used for a new revision of an edited file; the previous metadata is kept
+        in metadata_history.
+
+        Args:
+            doc_id: Document ID of the previous revision
+            content: Full text of the new revision
+            metadata: Extracted metadata (Pydantic model)
+            embedding: Optional embedding vector
+            extraction_path: How the metadata was produced ('llm', 'local' or 'dedup')
+
+        Returns:
+            False if no document has this ID
+
+        Raises:
+            ValueError: If another document already has this content
+            RuntimeError: On database errors
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            cursor = self.conn.cursor()
+            row = cursor.execute(
+                "SELECT metadata_json, extraction_path FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            cursor.execute(
+                "INSERT INTO metadata_history (doc_id, metadata_json, extraction_path) VALUES (?, ?, ?)",
+                (doc_id, row[0], row[1])
+            )
+            cursor.execute("""
+                UPDATE documents
+                SET content_hash = ?, content = ?, canonical_hash = ?, metadata_json = ?,
+                    embedding_json = ?, extraction_path = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (self._compute_hash(content), content, self._compute_canonical_hash(content),
+                  metadata.model_dump_json(), json.dumps(embedding) if embedding else None,
+                  extraction_path, doc_id))
+            self.conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            self.conn.rollback()
+            raise ValueError(f"Document with hash {self._compute_hash(content)[:16]}... already exists")
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            raise RuntimeError(f"Failed to replace document: {e}")
+
+    def get_metadata_history(self, doc_id: int) -> List[Tuple[str, DocumentMetadata, str]]:
+        """
+        Retrieve the previous metadata versions of a document.
+
+        Args:
+            doc_id: Document ID
+
+        Returns:
+            List of tuples (replaced_at, metadata, extraction_path), oldest first
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT replaced_at, metadata_json, extraction_path FROM metadata_history "
+                "WHERE doc_id = ? ORDER BY id",
+                (doc_id,)
+            )
+            return [
+                (row[0], DocumentMetadata.model_validate_json(row[1]), row[2])
+                for row in cursor.fetchall()
+            ]
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to retrieve metadata history: {e}")
+
+    def get_content_hashes(self) -> set:
+        """
+        Get the content hashes of all stored documents.
+
+        Returns:
+            Set of SHA256 hashes
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT content_hash FROM documents")
+            return {row[0] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to read content hashes: {e}")
+
+    def get_canonical_hashes(self) -> set:
+        """
+        Get the canonical hashes of all stored documents.
+
+        Returns:
+            Set of SHA256 hashes of the canonical forms
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT canonical_hash FROM documents WHERE canonical_hash IS NOT NULL")
+            return {row[0] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to read canonical hashes: {e}")
+
     def get_document(self, doc_id: int) -> Optional[Tuple[str, DocumentMetadata, Optional[List[float]]]]:
         """
         Retrieve document by ID.
@@ -222,6 +600,23 @@ class DocDatabase:
         except sqlite3.Error as e:
             raise RuntimeError(f"Failed to retrieve documents: {e}")
 
+    def count_by_extraction_path(self) -> dict:
+        """
+        Count documents per extraction path.
+
+        Returns:
+            Dictionary extraction_path -> number of documents
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT extraction_path, COUNT(*) FROM documents GROUP BY extraction_path")
+            return {row[0]: row[1] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to count documents: {e}")
+
     def close(self) -> None:
         """Close database connection."""
         if self.conn:
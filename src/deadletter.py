@@ -0,0 +1,401 @@
+"""
+Dead-letter queue of documents whose processing failed.
+
+Every failure is recorded with an error class derived from the exception
+(and the exceptions it was raised from):
+
+    transient_api   connection errors, timeouts, 5xx and overloaded responses
+    rate_limit      429 responses
+    parse_failure   Claude's reply did not validate as DocumentMetadata
+    bad_encoding    binary files, text that cannot be decoded
+    oversized       files above the size limit, prompts above the context window
+    other           anything else (missing files, extraction errors, bugs)
+
+Transient API errors and rate limits are retryable: each failure schedules
+the next attempt after an exponential backoff with jitter (at least the
+retry-after the API sent), and retry_failed.py re-drives the documents that
+are due until they succeed or run out of attempts. The other classes fail
+again the same way and are only retried on request.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+from anthropic import APIConnectionError, APIStatusError
+from pydantic import ValidationError
+
+from .llm import MetadataParseError
+from .reader import FileTooLargeError, UnsupportedFileError
+
+
+# Error classes
+ERROR_TRANSIENT = "transient_api"
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_PARSE = "parse_failure"
+ERROR_ENCODING = "bad_encoding"
+ERROR_OVERSIZED = "oversized"
+ERROR_OTHER = "other"
+ERROR_CLASSES = (ERROR_TRANSIENT, ERROR_RATE_LIMIT, ERROR_PARSE, ERROR_ENCODING, ERROR_OVERSIZED, ERROR_OTHER)
+
+# Classes retried automatically; the others fail again without a change to the input
+RETRYABLE_CLASSES = (ERROR_TRANSIENT, ERROR_RATE_LIMIT)
+
+# First retry delay in seconds per class (doubled with every further failure)
+BASE_DELAYS = {ERROR_TRANSIENT: 30.0, ERROR_RATE_LIMIT: 60.0}
+MAX_DELAY = 3600.0
+
+# Dead letter states
+LETTER_OPEN = "open"
+LETTER_RESOLVED = "resolved"
+
+# HTTP statuses of temporary API problems (529: overloaded)
+_TRANSIENT_STATUSES = (408, 409, 500, 502, 503, 504, 529)
+
+
+def _source_key(source) -> str:
+    """Source id of an archive member/NDJSON record, else the absolute file path."""
+    source_id = getattr(source, "source_id", None)
+    return source_id if source_id is not None else str(Path(source).resolve())
+
+
+def _error_chain(error: BaseException) -> Iterable[BaseException]:
+    """The exception and the ones it was raised from (__cause__, else __context__)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Determine the error class of a failure.
+
+    The exception chain is walked from the outermost exception, so a
+    RuntimeError raised from a rate limit error (as Analyzer raises it) is
+    classified as a rate limit.
+
+    Args:
+        error: Exception a document failed with
+
+    Returns:
+        One of ERROR_CLASSES
+    """
+    for cause in _error_chain(error):
+        if isinstance(cause, APIStatusError):
+            if cause.status_code == 429:
+                return ERROR_RATE_LIMIT
+            if cause.status_code in _TRANSIENT_STATUSES or cause.status_code >= 500:
+                return ERROR_TRANSIENT
+            if cause.status_code == 413 or "too long" in str(cause.message).lower():
+                return ERROR_OVERSIZED
+            return ERROR_OTHER
+        if isinstance(cause, (APIConnectionError, httpx.TransportError, ConnectionError, TimeoutError)):
+            return ERROR_TRANSIENT
+        if isinstance(cause, (MetadataParseError, ValidationError, json.JSONDecodeError)):
+            return ERROR_PARSE
+        if isinstance(cause, (FileTooLargeError, MemoryError)):
+            return ERROR_OVERSIZED
+        if isinstance(cause, (UnsupportedFileError, UnicodeError)):
+            return ERROR_ENCODING
+    return ERROR_OTHER
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from a retry-after header of an API error in the chain, if any."""
+    for cause in _error_chain(error):
+        if isinstance(cause, APIStatusError):
+            try:
+                return float(cause.response.headers.get("retry-after", ""))
+            except ValueError:
+                return None
+    return None
+
+
+def retry_delay(error_class: str, attempts: int) -> float:
+    """
+    Seconds to wait before the next attempt: exponential backoff with jitter.
+
+    The delay doubles with every failed attempt up to MAX_DELAY; a random half
+    of it is jittered so documents that failed together are not retried in
+    the same instant.
+
+    Args:
+        error_class: Error class of the last failure
+        attempts: Failed attempts so far (at least 1)
+
+    Returns:
+        Delay in seconds
+    """
+    delay = min(MAX_DELAY, BASE_DELAYS.get(error_class, BASE_DELAYS[ERROR_TRANSIENT]) * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class DeadLetter:
+    """A failed document"""
+
+    def __init__(self, row: sqlite3.Row):
+        """
+        Initialize from a dead_letters row.
+
+        Args:
+            row: Row of the dead_letters table
+        """
+        self.id = row["id"]
+        self.source = row["source"]
+        self.origin = row["origin"]
+        self.context = json.loads(row["context_json"]) if row["context_json"] else {}
+        self.error_class = row["error_class"]
+        self.error = row["error"]
+        self.attempts = row["attempts"]
+        self.next_retry_at = row["next_retry_at"]
+        self.status = row["status"]
+        self.doc_id = row["doc_id"]
+        self.first_failed_at = row["first_failed_at"]
+        self.last_failed_at = row["last_failed_at"]
+
+    @property
+    def retryable(self) -> bool:
+        """Whether the error class is retried automatically."""
+        return self.error_class in RETRYABLE_CLASSES
+
+
+class DeadLetterQueue:
+    """
+    Persistent record of failed documents with their error class and retry schedule.
+
+    Schema:
+        - dead_letters: One row per failed source (file path or archive source
+          id), with the command that processed it, the error class and message,
+          the number of failed attempts and the time of the next retry
+    """
+
+    def __init__(self, db_path: str = "archaeologist.db", max_attempts: int = 5):
+        """
+        Initialize database connection.
+
+        Args:
+            db_path: Path to SQLite database file
+            max_attempts: Failed attempts after which a document is no longer retried
+
+        Raises:
+            ValueError: If max_attempts is not positive
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be positive")
+
+        self.db_path = Path(db_path)
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the dead letter table if it doesn't exist."""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL UNIQUE,
+                    origin TEXT NOT NULL,
+                    context_json TEXT,
+                    error_class TEXT NOT NULL,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_retry_at REAL,
+                    status TEXT NOT NULL DEFAULT 'open',
+                    doc_id INTEGER,
+                    first_failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_dead_letters_retry ON dead_letters(status, error_class, next_retry_at)"
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize dead letter queue: {e}")
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Run one write statement and commit."""
+        with self._lock:
+            try:
+                cursor = self.conn.execute(sql, params)
+                self.conn.commit()
+                return cursor
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to update dead letter queue: {e}")
+
+    def record(self, source, error: BaseException, origin: str, context: Optional[Dict] = None) -> DeadLetter:
+        """
+        Record a failed attempt and schedule the next one if the error is retryable.
+
+        Args:
+            source: File path or SourceDocument that failed
+            error: Exception it failed with
+            origin: Command that processed it ('batch_test', 'organize'), used to re-drive it
+            context: Options the command needs to process it again (JSON serializable)
+
+        Returns:
+            The updated DeadLetter
+        """
+        key = _source_key(source)
+        error_class = classify_error(error)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT attempts, status FROM dead_letters WHERE source = ?", (key,)
+            ).fetchone()
+        # A document that failed again after it was resolved starts over
+        attempts = row["attempts"] + 1 if row is not None and row["status"] == LETTER_OPEN else 1
+
+        next_retry_at = None
+        if error_class in RETRYABLE_CLASSES and attempts < self.max_attempts:
+            # The API's retry-after is a lower bound; the backoff still grows with every failure
+            delay = max(_retry_after(error) or 0.0, retry_delay(error_class, attempts))
+            next_retry_at = time.time() + delay
+
+        self._execute(
+            """INSERT INTO dead_letters (source, origin, context_json, error_class, error, attempts, next_retry_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (source) DO UPDATE SET
+                   origin = excluded.origin, context_json = excluded.context_json,
+                   error_class = excluded.error_class, error = excluded.error,
+                   attempts = excluded.attempts, next_retry_at = excluded.next_retry_at,
+                   status = 'open', doc_id = NULL, last_failed_at = CURRENT_TIMESTAMP""",
+            (key, origin, json.dumps(context) if context else None, error_class, str(error), attempts, next_retry_at)
+        )
+        return self.get(source)
+
+    def resolve(self, source, doc_id: Optional[int] = None) -> bool:
+        """
+        Mark a document as processed (stored, or found to be a duplicate).
+
+        Args:
+            source: File path or SourceDocument
+            doc_id: documents.id of the stored document
+
+        Returns:
+            True if the document had an open dead letter
+        """
+        cursor = self._execute(
+            "UPDATE dead_letters SET status = ?, doc_id = ?, next_retry_at = NULL WHERE source = ? AND status = ?",
+            (LETTER_RESOLVED, doc_id, _source_key(source), LETTER_OPEN)
+        )
+        return cursor.rowcount > 0
+
+    def get(self, source) -> Optional[DeadLetter]:
+        """
+        Get the dead letter of a document.
+
+        Args:
+            source: File path or SourceDocument
+
+        Returns:
+            DeadLetter or None if the document never failed
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM dead_letters WHERE source = ?", (_source_key(source),)
+            ).fetchone()
+        return DeadLetter(row) if row is not None else None
+
+    def open_letters(
+        self,
+        classes: Iterable[str] = ERROR_CLASSES,
+        due_only: bool = False,
+        retrying_only: bool = False
+    ) -> List[DeadLetter]:
+        """
+        Get the open dead letters, soonest retry first.
+
+        Args:
+            classes: Error classes to include
+            due_only: Only letters whose next retry time has passed
+            retrying_only: Only letters with a scheduled retry (not out of attempts)
+
+        Returns:
+            List of DeadLetter
+        """
+        classes = list(classes)
+        sql = f"SELECT * FROM dead_letters WHERE status = ? AND error_class IN ({', '.join('?' * len(classes))})"
+        params: list = [LETTER_OPEN, *classes]
+        if retrying_only or due_only:
+            sql += " AND next_retry_at IS NOT NULL"
+        if due_only:
+            sql, params = sql + " AND next_retry_at <= ?", params + [time.time()]
+        with self._lock:
+            rows = self.conn.execute(sql + " ORDER BY next_retry_at, id", params).fetchall()
+        return [DeadLetter(row) for row in rows]
+
+    def schedule(self, letters: Iterable[DeadLetter], when: Optional[float] = None) -> int:
+        """
+        Schedule dead letters for a retry (e.g. non-retryable ones on request).
+
+        Args:
+            letters: Dead letters to retry
+            when: Unix time of the retry (default: now)
+
+        Returns:
+            Number of letters scheduled
+        """
+        when = time.time() if when is None else when
+        ids = [(when, letter.id) for letter in letters]
+        with self._lock:
+            try:
+                self.conn.executemany("UPDATE dead_letters SET next_retry_at = ? WHERE id = ?", ids)
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to update dead letter queue: {e}")
+        return len(ids)
+
+    def stats(self) -> dict:
+        """
+        Count open dead letters per error class.
+
+        Returns:
+            Dictionary with 'open', 'retrying' (retry scheduled), 'resolved' and
+            one count of open letters per error class
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                """SELECT error_class, COUNT(*) AS n, COUNT(next_retry_at) AS retrying
+                   FROM dead_letters WHERE status = ? GROUP BY error_class""",
+                (LETTER_OPEN,)
+            ).fetchall()
+            resolved = self.conn.execute(
+                "SELECT COUNT(*) FROM dead_letters WHERE status = ?", (LETTER_RESOLVED,)
+            ).fetchone()[0]
+
+        stats = {error_class: 0 for error_class in ERROR_CLASSES}
+        stats.update({row["error_class"]: row["n"] for row in rows})
+        stats["open"] = sum(row["n"] for row in rows)
+        stats["retrying"] = sum(row["retrying"] for row in rows)
+        stats["resolved"] = resolved
+        return stats
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
@@ -0,0 +1,422 @@
+"""
+Near-duplicate detection for documents.
+
+Exact SHA256 dedup misses edited revisions and translated twins. This
+module finds them at ingest so their metadata can be reused:
+
+- MinHash signatures over word shingles, indexed with LSH banding
+  (edited revisions, copies with small changes)
+- cosine similarity of the stored embeddings (rewordings; translations
+  only as far as the embedding model is multilingual)
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .local_extractor import detect_language, extract_title
+from .models import DocumentMetadata
+
+
+logger = logging.getLogger(__name__)
+
+# Prime below 2**32 for the universal hash family of the MinHash permutations;
+# a * x + b then stays below 2**64, so numpy uint64 arithmetic cannot overflow
+_PRIME = (1 << 32) - 5
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """
+    Word shingles (overlapping word n-grams) of a text.
+
+    Args:
+        text: Input text
+        size: Words per shingle
+
+    Returns:
+        Set of shingle strings (single words for very short texts)
+    """
+    words = [word.lower() for word in _WORD_RE.findall(text)]
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def patch_metadata(metadata: DocumentMetadata, text: str) -> DocumentMetadata:
+    """
+    Adapt metadata of a near-duplicate to the new document.
+
+    Keeps topics, keywords and summary; takes the title from the new
+    document's heading and re-detects the language.
+
+    Args:
+        metadata: Metadata of the matched document
+        text: Text of the new document
+
+    Returns:
+        Patched copy of the metadata
+    """
+    patch = {}
+    title = extract_title(text)
+    if title != "Untitled":
+        patch["title"] = title
+    language, confidence = detect_language(text, default=metadata.language)
+    if confidence >= 0.5:
+        patch["language"] = language
+    return metadata.model_copy(update=patch)
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH and embedding index over the stored documents"""
+
+    def __init__(
+        self,
+        db_path: str = "archaeologist.db",
+        num_perm: int = 128,
+        bands: int = 16,
+        jaccard_threshold: float = 0.8,
+        embedding_threshold: float = 0.95,
+        shingle_size: int = 3
+    ):
+        """
+        Initialize index and load signatures and embeddings.
+
+        Args:
+            db_path: Path to SQLite database file
+            num_perm: MinHash signature length
+            bands: LSH bands (num_perm must be divisible by it); more bands
+                find pairs of lower similarity
+            jaccard_threshold: Estimated Jaccard similarity for a near-duplicate
+            embedding_threshold: Cosine similarity for a near-duplicate
+            shingle_size: Words per shingle
+
+        Raises:
+            ValueError: If num_perm is not divisible by bands
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+        self.db_path = Path(db_path)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.jaccard_threshold = jaccard_threshold
+        self.embedding_threshold = embedding_threshold
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self._embedding_ids: List[int] = []
+        self._embeddings: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+        self.conn: Optional[sqlite3.Connection] = None
+        self._connect()
+        self.init_db()
+        self._load()
+
+    def _connect(self) -> None:
+        """Establish database connection."""
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+
+    def init_db(self) -> None:
+        """
+        Create the signature table if it doesn't exist.
+
+        Tables:
+            document_signatures:
+                - doc_id: documents.id
+                - signature: MinHash signature (uint64 array; empty for texts without words)
+                - duplicate_of: Document whose metadata was reused, if any
+                - similarity: Similarity to that document
+                - method: 'minhash' or 'embedding'
+        """
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS document_signatures (
+                    doc_id INTEGER PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    duplicate_of INTEGER,
+                    similarity REAL,
+                    method TEXT
+                )
+            """)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize near-duplicate index: {e}")
+
+    def _load(self) -> None:
+        """Load stored signatures and document embeddings into memory."""
+        try:
+            for doc_id, blob in self.conn.execute("SELECT doc_id, signature FROM document_signatures"):
+                signature = np.frombuffer(blob, dtype=np.uint64)
+                # Texts without words have no signature (older rows: all values _PRIME)
+                if signature.size and not (signature == _PRIME).all():
+                    self._index(doc_id, signature)
+
+            ids, vectors = [], []
+            for doc_id, embedding_json in self.conn.execute(
+                "SELECT id, embedding_json FROM documents WHERE embedding_json IS NOT NULL"
+            ):
+                ids.append(doc_id)
+                vectors.append(json.loads(embedding_json))
+        except sqlite3.OperationalError:
+            # documents table not created yet (fresh database)
+            return
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to load near-duplicate index: {e}")
+
+        if vectors:
+            self._embedding_ids = ids
+            self._embeddings = self._normalize(np.asarray(vectors, dtype=np.float32))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        Compute the MinHash signature of a text.
+
+        Args:
+            text: Document text
+
+        Returns:
+            uint64 array of length num_perm, or None if the text has no words
+            (e.g. only symbols or emoji), which MinHash cannot compare
+        """
+        items = shingles(text, self.shingle_size)
+        if not items:
+            return None
+
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") % _PRIME
+             for s in items],
+            dtype=np.uint64
+        )
+        # (a * x + b) mod p for every shingle and permutation
+        values = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % _PRIME
+        return values.min(axis=0)
+
+    def _index(self, doc_id: int, signature: np.ndarray) -> None:
+        self._signatures[doc_id] = signature
+        for band in range(self.bands):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            self._buckets[(band, key)].append(doc_id)
+
+    def _unindex(self, doc_id: int) -> None:
+        signature = self._signatures.pop(doc_id)
+        for band in range(self.bands):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            self._buckets[(band, key)].remove(doc_id)
+
+    def _candidates(self, signature: np.ndarray) -> set:
+        candidates = set()
+        for band in range(self.bands):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            candidates.update(self._buckets.get((band, key), ()))
+        return candidates
+
+    def find(
+        self,
+        text: str,
+        embedding: Optional[List[float]] = None,
+        signature: Optional[np.ndarray] = None
+    ) -> Optional[Tuple[int, str, float]]:
+        """
+        Find the most similar stored document above the thresholds.
+
+        Texts without words are only compared by embedding.
+
+        Args:
+            text: Text of the new document
+            embedding: Its embedding (enables the embedding check)
+            signature: Precomputed MinHash signature
+
+        Returns:
+            Tuple of (doc_id, method, similarity), or None
+        """
+        if signature is None:
+            signature = self.signature(text)
+
+        with self._lock:
+            best = None
+            for doc_id in self._candidates(signature) if signature is not None else ():
+                similarity = float(np.mean(self._signatures[doc_id] == signature))
+                if similarity >= self.jaccard_threshold and (best is None or similarity > best[2]):
+                    best = (doc_id, "minhash", similarity)
+            if best is not None:
+                return best
+
+            if embedding is not None and self._embeddings is not None:
+                query = self._normalize(np.asarray(embedding, dtype=np.float32))
+                scores = self._embeddings @ query
+                index = int(np.argmax(scores))
+                if scores[index] >= self.embedding_threshold:
+                    return self._embedding_ids[index], "embedding", float(scores[index])
+
+        return None
+
+    def add(
+        self,
+        doc_id: int,
+        text: str,
+        embedding: Optional[List[float]] = None,
+        duplicate: Optional[Tuple[int, str, float]] = None,
+        signature: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        Add a stored document to the index, replacing its entry if it is indexed already.
+
+        Args:
+            doc_id: documents.id of the row
+            text: Document text
+            embedding: Its embedding
+            duplicate: Match returned by find(), if its metadata was reused
+            signature: Precomputed MinHash signature
+        """
+        if signature is None:
+            signature = self.signature(text)
+        duplicate_of, method, similarity = duplicate if duplicate else (None, None, None)
+
+        try:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO document_signatures (doc_id, signature, duplicate_of, similarity, method)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (doc_id, signature.tobytes() if signature is not None else b"", duplicate_of, similarity, method)
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to store document signature: {e}")
+
+        with self._lock:
+            if doc_id in self._signatures:
+                self._unindex(doc_id)
+            if signature is not None:
+                self._index(doc_id, signature)
+            if embedding is not None:
+                vector = self._normalize(np.asarray(embedding, dtype=np.float32))[None, :]
+                if doc_id in self._embedding_ids:
+                    # Re-analyzed document: its row is updated in place
+                    self._embeddings[self._embedding_ids.index(doc_id)] = vector[0]
+                else:
+                    self._embeddings = vector if self._embeddings is None else np.vstack([self._embeddings, vector])
+                    self._embedding_ids.append(doc_id)
+
+    def backfill(self, normalize: Optional[Callable[[str], str]] = None) -> int:
+        """
+        Compute signatures for stored documents that have none yet.
+
+        Args:
+            normalize: Optional text normalization applied before hashing
+                (the same one used for new documents, see src/normalize.py)
+
+        Returns:
+            Number of documents added to the index
+        """
+        try:
+            rows = self.conn.execute("""
+                SELECT id, content FROM documents
+                WHERE id NOT IN (SELECT doc_id FROM document_signatures)
+            """).fetchall()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to read documents for backfill: {e}")
+
+        for doc_id, content in rows:
+            # Embeddings of stored documents were already loaded by _load()
+            self.add(doc_id, normalize(content) if normalize else content)
+        return len(rows)
+
+    def clusters(self) -> List[List[Tuple[int, str, float]]]:
+        """
+        Group stored documents into clusters of near-duplicates.
+
+        Pairs come from LSH buckets (verified against the Jaccard
+        threshold) and from embedding similarity above its threshold.
+
+        Returns:
+            Clusters with at least two documents, largest first; each entry
+            is (doc_id, method, similarity) of the edge that joined it
+            (the first document has method "root")
+        """
+        parent: Dict[int, int] = {}
+
+        def find_root(x: int) -> int:
+            while parent.setdefault(x, x) != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        edges: Dict[int, Tuple[str, float]] = {}
+
+        def union(x: int, y: int, method: str, similarity: float) -> None:
+            rx, ry = find_root(x), find_root(y)
+            if rx != ry:
+                parent[max(rx, ry)] = min(rx, ry)
+                edges.setdefault(max(x, y), (method, similarity))
+
+        with self._lock:
+            for members in self._buckets.values():
+                for i, x in enumerate(members):
+                    for y in members[i + 1:]:
+                        if find_root(x) == find_root(y):
+                            continue
+                        similarity = float(np.mean(self._signatures[x] == self._signatures[y]))
+                        if similarity >= self.jaccard_threshold:
+                            union(x, y, "minhash", similarity)
+
+            if self._embeddings is not None:
+                # Row blocks keep the similarity matrix small for large corpora
+                for start in range(0, len(self._embedding_ids), 512):
+                    block = self._embeddings[start:start + 512] @ self._embeddings.T
+                    for i, j in zip(*np.nonzero(block >= self.embedding_threshold)):
+                        x, y = self._embedding_ids[start + i], self._embedding_ids[j]
+                        if x < y:
+                            union(x, y, "embedding", float(block[i, j]))
+
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for doc_id in parent:
+            groups[find_root(doc_id)].append(doc_id)
+
+        result = []
+        for root, members in groups.items():
+            if len(members) < 2:
+                continue
+            result.append([
+                (doc_id, *edges[doc_id]) if doc_id in edges else (doc_id, "root", 1.0)
+                for doc_id in sorted(members)
+            ])
+        return sorted(result, key=len, reverse=True)
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
@@ -0,0 +1,539 @@
+"""
+Text extraction from PDF, DOCX, HTML and CSV files.
+
+extract_document() sniffs a file's MIME type from its first bytes (and
+extension) and routes it to the registered Extractor; everything else is
+read as text by src/reader.py. Extraction runs in an ExtractorPool of worker
+processes, so CPU-heavy parsing does not hold the GIL of the ingesting
+process, and each extractor has its own timeout and memory cap: a worker
+that exceeds the timeout is killed and replaced, and its address space is
+limited to the memory it had at the start of the task plus the cap, so one
+pathological PDF fails on its own instead of stalling or exhausting the run.
+
+PDF extraction needs the optional pypdf package; the other formats use the
+standard library only. Extractor functions receive a file path or, for
+documents that are not files on disk (archive members, see src/sources.py),
+the document's bytes. Further formats are added with register_extractor()
+(the function must be defined at module level so worker processes can
+import it).
+"""
+
+import csv
+import hashlib
+import io
+import logging
+import mimetypes
+import multiprocessing
+import os
+import queue
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from .reader import (
+    DEFAULT_MAX_BYTES, FileTooLargeError, TextFile, UnsupportedFileError, decode_document, read_document
+)
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: extraction then runs without a memory cap
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+MIME_PDF = "application/pdf"
+MIME_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MIME_HTML = "text/html"
+MIME_CSV = "text/csv"
+MIME_TEXT = "text/plain"
+
+# Glob patterns of the formats handled by the default extractors
+EXTRACTABLE_PATTERNS = ("*.pdf", "*.docx", "*.html", "*.htm", "*.csv")
+
+_SNIFF_BYTES = 1024
+# Plain-text extensions mimetypes may not know; their content is never sniffed as HTML
+_TEXT_SUFFIXES = (".txt", ".md", ".markdown", ".rst", ".log")
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class ExtractionError(RuntimeError):
+    """Text could not be extracted from a file (failure, timeout or memory limit)."""
+
+
+class Extractor:
+    """A text extractor for one or more MIME types"""
+
+    def __init__(
+        self,
+        name: str,
+        mime_types: Iterable[str],
+        function: Callable[[Union[Path, bytes]], str],
+        timeout_s: float = 30.0,
+        max_memory_mb: int = 512
+    ):
+        """
+        Initialize extractor.
+
+        Args:
+            name: Short name used in logs and results (e.g. 'pdf')
+            mime_types: MIME types the extractor handles
+            function: Module-level function returning the text of a file (path or bytes)
+            timeout_s: Seconds an extraction may take before its worker is killed
+            max_memory_mb: Memory an extraction may allocate on top of the worker's own
+        """
+        self.name = name
+        self.mime_types = tuple(mime_types)
+        self.function = function
+        self.timeout_s = timeout_s
+        self.max_memory_mb = max_memory_mb
+
+
+def _binary(source: Union[Path, bytes]):
+    """File path or in-memory stream of a document."""
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _text(source: Union[Path, bytes]) -> str:
+    """Decoded text of a document (see src/reader.py)."""
+    if isinstance(source, bytes):
+        return decode_document(source, Path("<memory>")).text
+    return read_document(source).text
+
+
+def extract_pdf(source: Union[Path, bytes]) -> str:
+    """Extract the text of all pages of a PDF (needs pypdf)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError("PDF extraction needs the pypdf package (pip install pypdf)")
+
+    reader = PdfReader(_binary(source))
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ExtractionError("PDF is encrypted")
+    pages = ((page.extract_text() or "").strip() for page in reader.pages)
+    return "\n\n".join(page for page in pages if page)
+
+
+def extract_docx(source: Union[Path, bytes]) -> str:
+    """Extract the paragraphs (including table cells) of a DOCX file."""
+    with zipfile.ZipFile(_binary(source)) as archive:
+        root = ET.fromstring(archive.read("word/document.xml"))
+
+    paragraphs = []
+    for paragraph in root.iter(f"{_WORD_NS}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{_WORD_NS}t":
+                parts.append(node.text or "")
+            elif node.tag == f"{_WORD_NS}tab":
+                parts.append("\t")
+            elif node.tag in (f"{_WORD_NS}br", f"{_WORD_NS}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs).strip()
+
+
+class _HTMLText(HTMLParser):
+    """Collects the visible text of an HTML document"""
+
+    _SKIP = {"script", "style", "noscript", "template"}
+    _BLOCKS = {
+        "p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+        "section", "article", "header", "footer", "blockquote", "pre", "table", "title"
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in self._BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self._BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self.parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+def extract_html(source: Union[Path, bytes]) -> str:
+    """Extract the visible text of an HTML file (title and body, no scripts or styles)."""
+    parser = _HTMLText()
+    # The reader honors a declared <meta charset>
+    parser.feed(_text(source))
+    parser.close()
+    return parser.text()
+
+
+def extract_csv(source: Union[Path, bytes]) -> str:
+    """Render a CSV file as one 'a | b | c' line per row."""
+    text = _text(source)
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(io.StringIO(text), dialect)
+    return "\n".join(" | ".join(cell.strip() for cell in row) for row in rows if any(cell.strip() for cell in row))
+
+
+# MIME type -> extractor
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register_extractor(extractor: Extractor) -> None:
+    """
+    Register an extractor for its MIME types (replacing earlier ones).
+
+    Args:
+        extractor: Extractor to register
+    """
+    for mime_type in extractor.mime_types:
+        EXTRACTORS[mime_type] = extractor
+
+
+register_extractor(Extractor("pdf", [MIME_PDF], extract_pdf, timeout_s=60.0, max_memory_mb=1024))
+register_extractor(Extractor("docx", [MIME_DOCX], extract_docx, timeout_s=30.0, max_memory_mb=512))
+register_extractor(Extractor("html", [MIME_HTML], extract_html, timeout_s=15.0, max_memory_mb=256))
+register_extractor(Extractor("csv", [MIME_CSV], extract_csv, timeout_s=15.0, max_memory_mb=256))
+
+
+def sniff_mime(path: Path) -> str:
+    """
+    Determine a file's MIME type from its first bytes, falling back to its extension.
+
+    Args:
+        path: File path
+
+    Returns:
+        MIME type ('text/plain' if nothing more specific is recognized)
+
+    Raises:
+        OSError: If the file cannot be opened
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        head = f.read(_SNIFF_BYTES)
+    return _sniff(head, path.name, path)
+
+
+def sniff_bytes(data: bytes, name: str) -> str:
+    """
+    Determine the MIME type of an in-memory document (see sniff_mime()).
+
+    Args:
+        data: Document bytes
+        name: File name (for the extension)
+
+    Returns:
+        MIME type ('text/plain' if nothing more specific is recognized)
+    """
+    return _sniff(data[:_SNIFF_BYTES], name, io.BytesIO(data))
+
+
+def _sniff(head: bytes, name: str, source) -> str:
+    """MIME type from the first bytes and the name; source is opened to look inside ZIP files."""
+    if head.startswith(b"%PDF-"):
+        return MIME_PDF
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(source) as archive:
+                if "word/document.xml" in archive.namelist():
+                    return MIME_DOCX
+        except zipfile.BadZipFile:
+            pass
+        return "application/zip"
+
+    # A known text extension wins, e.g. Markdown with an HTML code sample stays Markdown
+    guessed, _ = mimetypes.guess_type(name)
+    if guessed == MIME_HTML:
+        return MIME_HTML
+    if guessed in (MIME_CSV, "text/tab-separated-values"):
+        return MIME_CSV
+    if name.lower().endswith(_TEXT_SUFFIXES) or (guessed or "").startswith("text/"):
+        return MIME_TEXT
+
+    start = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if start.startswith((b"<!doctype html", b"<html")):
+        return MIME_HTML
+    # XHTML after an XML declaration
+    if start.startswith(b"<?xml") and b"<html" in start[:256]:
+        return MIME_HTML
+    return MIME_TEXT
+
+
+def _limit_memory(max_memory_mb: int) -> None:
+    """Cap the address space of this process at its current size plus max_memory_mb."""
+    if resource is None:
+        return
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        current = 0
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current + max_memory_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _worker_main(conn) -> None:
+    """Worker process loop: run (function, source, max_memory_mb) tasks until None is received."""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        function, source, max_memory_mb = task
+        _limit_memory(max_memory_mb)
+        try:
+            conn.send((True, function(source)))
+        except MemoryError:
+            conn.send((False, f"Extraction exceeded the memory limit ({max_memory_mb} MB)"))
+        except ExtractionError as e:
+            conn.send((False, str(e)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    """A worker process and the parent's end of its pipe"""
+
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ExtractorPool:
+    """
+    Worker processes running extractors with per-extractor timeouts and memory caps.
+
+    Safe to use from several threads (e.g. the read workers of
+    IngestPipeline); each call occupies one worker. Workers are started on
+    first use.
+    """
+
+    def __init__(self, workers: int = 2, extractors: Optional[Dict[str, Extractor]] = None):
+        """
+        Initialize pool.
+
+        Args:
+            workers: Number of worker processes
+            extractors: MIME type -> extractor (default: the registered EXTRACTORS)
+        """
+        self.extractors = extractors if extractors is not None else EXTRACTORS
+        methods = multiprocessing.get_all_start_methods()
+        # forkserver: workers are forked from a clean single-threaded server, not from the
+        # (threaded) ingesting process; spawn elsewhere (Windows)
+        self._context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if "forkserver" in methods:
+            self._context.set_forkserver_preload([__name__])
+        self._idle: queue.Queue = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(None)
+        self._workers = workers
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.stats = {"extracted": 0, "failed": 0, "timeouts": 0, "restarts": 0}
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def extract(self, source: Union[Path, bytes], mime_type: str) -> str:
+        """
+        Extract the text of a file in a worker process.
+
+        Args:
+            source: File path or the document's bytes
+            mime_type: Sniffed MIME type (see sniff_mime())
+
+        Returns:
+            Extracted text
+
+        Raises:
+            ValueError: If no extractor handles the MIME type
+            ExtractionError: If extraction fails, times out or exceeds the memory cap
+        """
+        if self._closed:
+            raise RuntimeError("Extractor pool is closed")
+        extractor = self.extractors.get(mime_type)
+        if extractor is None:
+            raise ValueError(f"No extractor for {mime_type}")
+
+        worker = self._idle.get()
+        try:
+            if worker is None or not worker.process.is_alive():
+                if worker is not None:
+                    self._count("restarts")
+                worker = _Worker(self._context)
+            worker.conn.send((extractor.function, source, extractor.max_memory_mb))
+            if not worker.conn.poll(extractor.timeout_s):
+                worker.kill()
+                worker = None
+                self._count("timeouts")
+                raise ExtractionError(f"{extractor.name} extraction timed out after {extractor.timeout_s:g}s")
+            try:
+                ok, value = worker.conn.recv()
+            except EOFError:
+                # Killed, typically by the memory cap hitting native code
+                worker.kill()
+                worker = None
+                raise ExtractionError(f"{extractor.name} extraction worker died")
+        except ExtractionError:
+            self._count("failed")
+            raise
+        finally:
+            self._idle.put(worker)
+
+        if not ok:
+            self._count("failed")
+            raise ExtractionError(f"{extractor.name} extraction failed: {value}")
+        self._count("extracted")
+        return value
+
+    def close(self) -> None:
+        """Stop all worker processes."""
+        self._closed = True
+        for _ in range(self._workers):
+            worker = self._idle.get()
+            if worker is not None:
+                worker.stop()
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - stops the workers."""
+        self.close()
+
+
+def extract_document(
+    path: Path,
+    pool: Optional[ExtractorPool] = None,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+) -> TextFile:
+    """
+    Read a document of any supported format as text.
+
+    Files with an extractor are converted to text (in the pool if given,
+    otherwise in this process without timeout); all others are read by
+    read_document(), which rejects binary files.
+
+    Args:
+        path: File path
+        pool: Optional extractor pool
+        max_bytes: Largest accepted file size (None for no limit)
+
+    Returns:
+        TextFile with the extracted text, its hash and the MIME type
+
+    Raises:
+        OSError: If the file cannot be opened
+        UnsupportedFileError: If the file is binary without extractor or too large
+        ExtractionError: If extraction fails
+    """
+    path = Path(path)
+    mime_type = sniff_mime(path)
+    extractors = pool.extractors if pool is not None else EXTRACTORS
+    extractor = extractors.get(mime_type)
+    if extractor is None:
+        return read_document(path, max_bytes)
+
+    return _extract(extractor, mime_type, path, path, path.stat().st_size, pool, max_bytes)
+
+
+def extract_bytes(
+    data: bytes,
+    path: Path,
+    pool: Optional[ExtractorPool] = None,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+) -> TextFile:
+    """
+    Convert an in-memory document (e.g. an archive member) to text, like extract_document().
+
+    Args:
+        data: Document bytes
+        path: Name or source identifier (its name decides by extension where the bytes don't)
+        pool: Optional extractor pool
+        max_bytes: Largest accepted size (None for no limit)
+
+    Returns:
+        TextFile with the extracted text, its hash and the MIME type
+
+    Raises:
+        UnsupportedFileError: If the data is binary without extractor or too large
+        ExtractionError: If extraction fails
+    """
+    path = Path(path)
+    mime_type = sniff_bytes(data, path.name)
+    extractors = pool.extractors if pool is not None else EXTRACTORS
+    extractor = extractors.get(mime_type)
+    if extractor is None:
+        return decode_document(data, path, max_bytes)
+    return _extract(extractor, mime_type, data, path, len(data), pool, max_bytes)
+
+
+def _extract(
+    extractor: Extractor,
+    mime_type: str,
+    source: Union[Path, bytes],
+    path: Path,
+    size: int,
+    pool: Optional[ExtractorPool],
+    max_bytes: Optional[int]
+) -> TextFile:
+    """Run an extractor (in the pool if given) and hash its text."""
+    if max_bytes is not None and size > max_bytes:
+        raise FileTooLargeError(f"File too large ({size} bytes, limit {max_bytes})")
+
+    try:
+        text = pool.extract(source, mime_type) if pool is not None else extractor.function(source)
+    except (ExtractionError, UnsupportedFileError):
+        raise
+    except Exception as e:
+        raise ExtractionError(f"{extractor.name} extraction failed: {type(e).__name__}: {e}")
+
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return TextFile(path, text, content_hash, "utf-8", size, mime_type)
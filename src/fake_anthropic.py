@@ -0,0 +1,511 @@
+"""
+Local stand-in for the Anthropic API, for offline tests and benchmarks.
+
+Implements the Messages endpoint used by Analyzer/AsyncAnalyzer and the
+Message Batches endpoints used by BatchAnalyzer, and answers every
+request with deterministic, schema-valid DocumentMetadata derived from
+the document text. Latency, 429/529 errors and rate limits can be
+simulated with a seeded random generator, so load tests are reproducible.
+Point a client at it with base_url=server.url (or ANTHROPIC_BASE_URL)
+and any API key.
+
+Run standalone:
+    python -m src.fake_anthropic --port 8765 --latency 0.8 --jitter 0.3 --error-rate-429 0.05
+"""
+
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from .tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+_DOCUMENT_RE = re.compile(r"<document>\s*(.*?)\s*</document>", re.DOTALL)
+_PACKED_DOCUMENT_RE = re.compile(r'<document id="([^"]*)">\s*(.*?)\s*</document>', re.DOTALL)
+_WORD_RE = re.compile(r"[^\W\d_]{4,}", re.UNICODE)
+_GERMAN_HINTS = {"und", "der", "die", "das", "ist", "nicht", "mit", "für", "eine", "werden"}
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal")
+
+# Database used by --fake runs unless --db is given, so fake documents, cache
+# entries and ledger rows never mix with those of real runs
+FAKE_DB_PATH = "archaeologist_fake.db"
+
+# The API only caches prompt prefixes of at least this many tokens
+MIN_CACHEABLE_TOKENS = 1024
+
+
+def _error_body(error_type: str, message: str) -> dict:
+    """Error response body in the API's format."""
+    return {"type": "error", "error": {"type": error_type, "message": message}}
+
+
+def _timestamp(dt: datetime) -> str:
+    """Format a datetime the way the API does (RFC 3339, UTC)."""
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def fake_metadata(text: str) -> dict:
+    """
+    Derive deterministic DocumentMetadata fields from document text.
+
+    Args:
+        text: Document text (or a full prompt containing <document> tags)
+
+    Returns:
+        Dictionary that validates as DocumentMetadata
+    """
+    match = _DOCUMENT_RE.search(text)
+    if match:
+        text = match.group(1)
+
+    lines = [line.strip().lstrip("#").strip() for line in text.splitlines() if line.strip()]
+    title = lines[0][:120] if lines else "Untitled"
+
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    language = "de" if sum(w in _GERMAN_HINTS for w in text.lower().split()) >= 2 else "en"
+    keywords = [w for w, _ in Counter(words).most_common(8)]
+
+    summary = " ".join(lines[1:3])[:300] if len(lines) > 1 else title
+
+    return {
+        "title": title,
+        "language": language,
+        "topics": keywords[:3],
+        "summary": summary,
+        "keywords": keywords
+    }
+
+
+def _system_text(params: dict) -> str:
+    """Concatenated text of the system prompt (string or blocks)."""
+    system = params.get("system") or ""
+    if isinstance(system, str):
+        return system
+    return "".join(block.get("text", "") for block in system)
+
+
+def _cached_prefix(params: dict) -> Optional[str]:
+    """Text of the request prefix up to the last cache_control breakpoint."""
+    system = params.get("system")
+    if isinstance(system, list):
+        marked = [i for i, block in enumerate(system) if block.get("cache_control")]
+        if marked:
+            tools = json.dumps(params.get("tools", []), sort_keys=True)
+            return tools + "".join(block.get("text", "") for block in system[:marked[-1] + 1])
+    return None
+
+
+def fake_message(params: dict, cache_state: Optional[str] = None) -> dict:
+    """
+    Build a Messages API response body for a request.
+
+    Args:
+        params: messages.create() request body
+        cache_state: "write" or "read" if the server simulates a prompt
+            cache hit/miss for the request's cached prefix, else None
+
+    Returns:
+        JSON-serializable Message object
+    """
+    prompt = "".join(
+        message["content"] if isinstance(message["content"], str)
+        else "".join(
+            block.get("text", "") or (block.get("content", "") if isinstance(block.get("content"), str) else "")
+            for block in message["content"]
+        )
+        for message in params.get("messages", [])
+    )
+    tool_choice = params.get("tool_choice") or {}
+    packed = _PACKED_DOCUMENT_RE.findall(prompt)
+    if packed:
+        # Packed request: one entry per <document id="..."> block
+        metadata = {"documents": [{"doc_id": doc_id, **fake_metadata(text)} for doc_id, text in packed]}
+    else:
+        metadata = fake_metadata(prompt)
+    text = json.dumps(metadata, ensure_ascii=False)
+
+    if tool_choice.get("type") == "tool":
+        content = [{
+            "type": "tool_use",
+            "id": f"toolu_fake_{uuid.uuid4().hex[:24]}",
+            "name": tool_choice["name"],
+            "input": metadata
+        }]
+        stop_reason = "tool_use"
+    else:
+        content = [{"type": "text", "text": text}]
+        stop_reason = "end_turn"
+
+    # Input tokens: prompt + system (+ tool definitions), split off the cached prefix
+    input_tokens = estimate_tokens(prompt) + estimate_tokens(_system_text(params))
+    input_tokens += estimate_tokens(json.dumps(params.get("tools", [])))
+    usage = {"input_tokens": input_tokens, "output_tokens": max(1, estimate_tokens(text))}
+    if cache_state:
+        prefix_tokens = min(input_tokens, estimate_tokens(_cached_prefix(params) or ""))
+        usage["input_tokens"] -= prefix_tokens
+        usage["cache_creation_input_tokens"] = prefix_tokens if cache_state == "write" else 0
+        usage["cache_read_input_tokens"] = prefix_tokens if cache_state == "read" else 0
+
+    return {
+        "id": f"msg_fake_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "fake"),
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": usage
+    }
+
+
+class _FakeBatch:
+    """In-memory state of a submitted message batch."""
+
+    def __init__(self, requests: list, processing_time: float):
+        self.id = f"msgbatch_fake_{uuid.uuid4().hex[:24]}"
+        self.requests = requests
+        self.created_at = datetime.now(timezone.utc)
+        self.ready_at = time.monotonic() + processing_time
+        self.ended_at: Optional[datetime] = None
+
+    def to_dict(self, base_url: str) -> dict:
+        """Serialize as a MessageBatch object."""
+        ended = time.monotonic() >= self.ready_at
+        if ended and self.ended_at is None:
+            self.ended_at = datetime.now(timezone.utc)
+        count = len(self.requests)
+        return {
+            "id": self.id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": _timestamp(self.created_at),
+            "expires_at": _timestamp(self.created_at + timedelta(hours=24)),
+            "ended_at": _timestamp(self.ended_at) if self.ended_at else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{self.id}/results" if ended else None
+        }
+
+
+class FakeAnthropicServer:
+    """
+    Threaded local HTTP server mimicking the Anthropic API.
+
+    Usable as a context manager:
+        with FakeAnthropicServer(latency=0.5, jitter=0.2, error_rate_429=0.05) as server:
+            client = Anthropic(base_url=server.url, api_key="fake")
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        batch_processing_time: float = 0.5,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        latency_distribution: str = "lognormal",
+        seconds_per_output_token: float = 0.0,
+        error_rate_429: float = 0.0,
+        error_rate_529: float = 0.0,
+        retry_after: float = 1.0,
+        requests_per_minute: int = 4000,
+        input_tokens_per_minute: int = 400000,
+        output_tokens_per_minute: int = 80000,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the server (not started yet).
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 = pick a free port)
+            batch_processing_time: Seconds until a submitted batch reports "ended"
+            latency: Mean time to first byte of a Messages response, in seconds
+            jitter: Spread of the latency (standard deviation, or half-width for "uniform")
+            latency_distribution: One of "constant", "uniform", "normal", "lognormal"
+            seconds_per_output_token: Additional generation time per output token
+            error_rate_429: Probability of an injected rate_limit_error
+            error_rate_529: Probability of an injected overloaded_error
+            retry_after: retry-after header (seconds) sent with injected errors
+            requests_per_minute: Simulated request limit (token bucket, enforced with real 429s)
+            input_tokens_per_minute: Simulated input token limit
+            output_tokens_per_minute: Simulated output token limit
+            seed: Seed for latency and error sampling (None = nondeterministic)
+
+        Raises:
+            ValueError: If the latency distribution or an error rate is invalid
+        """
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution '{latency_distribution}', "
+                f"expected one of {', '.join(LATENCY_DISTRIBUTIONS)}"
+            )
+        if not 0.0 <= error_rate_429 + error_rate_529 <= 1.0:
+            raise ValueError("Error rates must be between 0 and 1 in total")
+
+        self.batch_processing_time = batch_processing_time
+        self.latency = latency
+        self.jitter = jitter
+        self.latency_distribution = latency_distribution
+        self.seconds_per_output_token = seconds_per_output_token
+        self.error_rate_429 = error_rate_429
+        self.error_rate_529 = error_rate_529
+        self.retry_after = retry_after
+        self.limits = {
+            "requests": requests_per_minute,
+            "input-tokens": input_tokens_per_minute,
+            "output-tokens": output_tokens_per_minute
+        }
+
+        self.batches: Dict[str, _FakeBatch] = {}
+        self.stats = {"requests": 0, "succeeded": 0, "injected_429": 0, "injected_529": 0, "rate_limited": 0}
+        self._random = random.Random(seed)
+        # Token buckets like the real API: full capacity, refilled continuously
+        self._buckets = {name: float(limit) for name, limit in self.limits.items()}
+        self._refilled_at = time.monotonic()
+        self._cached_prefixes = set()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass to the Anthropic client."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeAnthropicServer":
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Anthropic API listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        """Shut the server down."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        """Context manager entry - starts the server."""
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - stops the server."""
+        self.stop()
+
+    def sample_latency(self, output_tokens: int = 0) -> float:
+        """
+        Draw a response latency from the configured distribution.
+
+        Args:
+            output_tokens: Output tokens of the response (adds generation time)
+
+        Returns:
+            Latency in seconds (never negative)
+        """
+        with self._lock:
+            if self.latency <= 0 or self.latency_distribution == "constant" or self.jitter <= 0:
+                base = self.latency
+            elif self.latency_distribution == "uniform":
+                base = self._random.uniform(self.latency - self.jitter, self.latency + self.jitter)
+            elif self.latency_distribution == "normal":
+                base = self._random.gauss(self.latency, self.jitter)
+            else:
+                # Lognormal with the requested mean and standard deviation (long right tail)
+                sigma2 = math.log(1 + (self.jitter / self.latency) ** 2)
+                base = self._random.lognormvariate(math.log(self.latency) - sigma2 / 2, math.sqrt(sigma2))
+        return max(0.0, base) + output_tokens * self.seconds_per_output_token
+
+    def _admit(self, params: dict):
+        """
+        Decide the outcome of a Messages request and book its usage.
+
+        Returns:
+            Tuple of (HTTP status, response body, rate limit headers)
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            for name, limit in self.limits.items():
+                self._buckets[name] = min(limit, self._buckets[name] + (now - self._refilled_at) * limit / 60)
+            self._refilled_at = now
+
+            roll = self._random.random()
+            injected = None
+            if roll < self.error_rate_429:
+                injected = 429
+            elif roll < self.error_rate_429 + self.error_rate_529:
+                injected = 529
+
+            # Real rate limiting: a request needs a full token in every bucket
+            over_limit = any(bucket < 1 for bucket in self._buckets.values())
+            if not injected and not over_limit:
+                prefix = _cached_prefix(params)
+                cache_state = None
+                if prefix is not None and estimate_tokens(prefix) >= MIN_CACHEABLE_TOKENS:
+                    key = (params.get("model"), hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+                    cache_state = "read" if key in self._cached_prefixes else "write"
+                    self._cached_prefixes.add(key)
+                body = fake_message(params, cache_state)
+                usage = body["usage"]
+                self._buckets["requests"] -= 1
+                self._buckets["input-tokens"] -= usage["input_tokens"] + usage.get("cache_creation_input_tokens", 0)
+                self._buckets["output-tokens"] -= usage["output_tokens"]
+                self.stats["succeeded"] += 1
+
+            headers = {}
+            wait_for_token = 0.0
+            for name, limit in self.limits.items():
+                bucket = self._buckets[name]
+                wait_for_token = max(wait_for_token, (1 - bucket) * 60 / limit)
+                full_at = datetime.now(timezone.utc) + timedelta(seconds=(limit - bucket) * 60 / limit)
+                headers[f"anthropic-ratelimit-{name}-limit"] = str(limit)
+                headers[f"anthropic-ratelimit-{name}-remaining"] = str(max(0, int(bucket)))
+                headers[f"anthropic-ratelimit-{name}-reset"] = _timestamp(full_at)
+
+            if injected == 429 or (over_limit and not injected):
+                self.stats["injected_429" if injected else "rate_limited"] += 1
+                retry_after = self.retry_after if injected else wait_for_token
+                headers["retry-after"] = str(max(1, math.ceil(retry_after)))
+                return 429, _error_body("rate_limit_error", "Number of requests has exceeded your rate limit"), headers
+            if injected == 529:
+                self.stats["injected_529"] += 1
+                headers["retry-after"] = str(max(1, math.ceil(self.retry_after)))
+                return 529, _error_body("overloaded_error", "Overloaded"), headers
+            return 200, body, headers
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self._send(status, payload, "application/json", headers)
+
+            def _send(self, status: int, payload: bytes, content_type: str, headers: Optional[dict] = None):
+                self.send_response(status)
+                self.send_header("content-type", content_type)
+                self.send_header("content-length", str(len(payload)))
+                self.send_header("request-id", f"req_fake_{uuid.uuid4().hex[:24]}")
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _not_found(self):
+                self._send_json(404, _error_body("not_found_error", f"No route for {self.path}"))
+
+            def _read_json(self) -> dict:
+                length = int(self.headers.get("content-length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                if path == "/v1/messages":
+                    status, body, headers = server._admit(self._read_json())
+                    output_tokens = body["usage"]["output_tokens"] if status == 200 else 0
+                    time.sleep(server.sample_latency(output_tokens))
+                    self._send_json(status, body, headers)
+                elif path == "/v1/messages/batches":
+                    body = self._read_json()
+                    batch = _FakeBatch(body.get("requests", []), server.batch_processing_time)
+                    with server._lock:
+                        server.batches[batch.id] = batch
+                    self._send_json(200, batch.to_dict(server.url))
+                else:
+                    self._not_found()
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                match = re.fullmatch(r"/v1/messages/batches/([\w-]+)(/results)?", path)
+                batch = server.batches.get(match.group(1)) if match else None
+                if batch is None:
+                    self._not_found()
+                elif match.group(2):
+                    lines = [
+                        json.dumps({
+                            "custom_id": request["custom_id"],
+                            "result": {"type": "succeeded", "message": fake_message(request["params"])}
+                        }, ensure_ascii=False)
+                        for request in batch.requests
+                    ]
+                    self._send(200, "\n".join(lines).encode("utf-8"), "application/binary")
+                else:
+                    self._send_json(200, batch.to_dict(server.url))
+
+        return Handler
+
+
+def main():
+    """Run the fake API in the foreground"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local fake Anthropic API for offline testing")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind")
+    parser.add_argument("--batch-time", type=float, default=0.5,
+                        help="Seconds until a submitted batch has ended")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency spread in seconds")
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                        help="Latency distribution")
+    parser.add_argument("--per-token", type=float, default=0.0,
+                        help="Additional seconds per output token")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="Share of injected 429 errors")
+    parser.add_argument("--error-rate-529", type=float, default=0.0, help="Share of injected 529 errors")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after for injected errors")
+    parser.add_argument("--rpm", type=int, default=4000, help="Simulated requests per minute limit")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latency and errors")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeAnthropicServer(
+        args.host, args.port, args.batch_time,
+        latency=args.latency,
+        jitter=args.jitter,
+        latency_distribution=args.distribution,
+        seconds_per_output_token=args.per_token,
+        error_rate_429=args.error_rate_429,
+        error_rate_529=args.error_rate_529,
+        retry_after=args.retry_after,
+        requests_per_minute=args.rpm,
+        seed=args.seed
+    )
+    print(f"Fake Anthropic API on {server.url} (set ANTHROPIC_BASE_URL to use it)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(f"Requests: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""
+Persistent work queue for resumable ingestion runs.
+
+A job is one ingestion run over a source (e.g. a directory and its file
+patterns); every file of the job is a work item whose state is kept in the
+archaeologist database:
+
+    pending -> embedded -> analyzed -> stored
+                                    \\-> skipped (content already stored)
+    any state -> failed (attempts, last_error)
+
+The embedding is saved when an item reaches 'embedded' and the metadata when
+it reaches 'analyzed', so an interrupted run that is started again resumes
+each file at the step where it stopped instead of embedding or analyzing it
+again.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .models import DocumentMetadata
+
+
+# Job states
+JOB_RUNNING = "running"
+JOB_FINISHED = "finished"
+
+# Work item states, in processing order
+ITEM_PENDING = "pending"
+ITEM_EMBEDDED = "embedded"
+ITEM_ANALYZED = "analyzed"
+ITEM_STORED = "stored"
+ITEM_SKIPPED = "skipped"
+ITEM_FAILED = "failed"
+ITEM_STATES = (ITEM_PENDING, ITEM_EMBEDDED, ITEM_ANALYZED, ITEM_STORED, ITEM_SKIPPED, ITEM_FAILED)
+
+# States in which an item still needs work
+OPEN_STATES = (ITEM_PENDING, ITEM_EMBEDDED, ITEM_ANALYZED, ITEM_FAILED)
+
+
+def _path_key(path: Path) -> str:
+    """Absolute path (or archive/NDJSON source id), so a job can be resumed from another working directory."""
+    source_id = getattr(path, "source_id", None)
+    return source_id if source_id is not None else str(Path(path).resolve())
+
+
+class WorkItem:
+    """Saved state of one file of a job"""
+
+    def __init__(self, row: sqlite3.Row):
+        """
+        Initialize from a work_items row.
+
+        Args:
+            row: Row of the work_items table
+        """
+        self.id = row["id"]
+        self.job_id = row["job_id"]
+        self.path = Path(row["path"])
+        self.status = row["status"]
+        self.content_hash = row["content_hash"]
+        self.attempts = row["attempts"]
+        self.last_error = row["last_error"]
+        self.doc_id = row["doc_id"]
+        self.extraction_path = row["extraction_path"]
+        self.embedding = json.loads(row["embedding_json"]) if row["embedding_json"] else None
+        self.metadata = (
+            DocumentMetadata.model_validate_json(row["metadata_json"]) if row["metadata_json"] else None
+        )
+
+    def resumable(self, content_hash: str) -> bool:
+        """
+        Whether saved intermediate results belong to the given content.
+
+        Args:
+            content_hash: SHA256 hash of the file as read now
+
+        Returns:
+            False if the file changed since the results were saved
+        """
+        return self.content_hash == content_hash
+
+
+class JobQueue:
+    """
+    Persistent jobs and work items of ingestion runs.
+
+    Schema:
+        - ingest_jobs: One row per run over a source
+        - work_items: One row per file of a job, with its state and saved
+          embedding/metadata
+    """
+
+    def __init__(self, db_path: str = "archaeologist.db", max_attempts: int = 3):
+        """
+        Initialize database connection.
+
+        Args:
+            db_path: Path to SQLite database file
+            max_attempts: Failed attempts after which an item is no longer retried
+
+        Raises:
+            ValueError: If max_attempts is not positive
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be positive")
+
+        self.db_path = Path(db_path)
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        try:
+            # Shared by pipeline worker threads; access is serialized by self._lock
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the job tables if they don't exist."""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    normalize INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            """)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(ingest_jobs)")}
+            if "normalize" not in columns:
+                # Jobs started before the option was stored ran with normalization on
+                self.conn.execute("ALTER TABLE ingest_jobs ADD COLUMN normalize INTEGER NOT NULL DEFAULT 1")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER NOT NULL REFERENCES ingest_jobs(id),
+                    path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    content_hash TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    embedding_json TEXT,
+                    metadata_json TEXT,
+                    extraction_path TEXT,
+                    doc_id INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (job_id, path)
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_source ON ingest_jobs(source, status)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items(job_id, status)")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize job queue: {e}")
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Run one write statement and commit."""
+        with self._lock:
+            try:
+                cursor = self.conn.execute(sql, params)
+                self.conn.commit()
+                return cursor
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to update job queue: {e}")
+
+    def start_job(self, source: str, resume: bool = True, normalize: bool = True) -> int:
+        """
+        Get the unfinished job of a source, or start a new one.
+
+        Args:
+            source: Description of what is ingested (e.g. directory and patterns)
+            resume: Continue an unfinished job of the same source if there is one
+            normalize: Whether the job's text is normalized before embedding and
+                analysis (only a job with the same setting is continued)
+
+        Returns:
+            Job id
+        """
+        if resume:
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT id FROM ingest_jobs WHERE source = ? AND status = ? AND normalize = ? "
+                    "ORDER BY id DESC LIMIT 1",
+                    (source, JOB_RUNNING, int(normalize))
+                ).fetchone()
+            if row is not None:
+                return row["id"]
+        return self._execute(
+            "INSERT INTO ingest_jobs (source, normalize) VALUES (?, ?)", (source, int(normalize))
+        ).lastrowid
+
+    def add_items(self, job_id: int, paths: Iterable[Path]) -> int:
+        """
+        Register files of a job; files already registered are left as they are.
+
+        Args:
+            job_id: Job id
+            paths: Files of the job
+
+        Returns:
+            Number of newly registered files
+        """
+        with self._lock:
+            try:
+                before = self.conn.total_changes
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO work_items (job_id, path) VALUES (?, ?)",
+                    ((job_id, _path_key(path)) for path in paths)
+                )
+                self.conn.commit()
+                return self.conn.total_changes - before
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to register work items: {e}")
+
+    def get_item(self, job_id: int, path: Path) -> WorkItem:
+        """
+        Get the work item of a file, registering it if needed.
+
+        Args:
+            job_id: Job id
+            path: File of the job
+
+        Returns:
+            Work item with its saved state
+        """
+        key = _path_key(path)
+        self._execute("INSERT OR IGNORE INTO work_items (job_id, path) VALUES (?, ?)", (job_id, key))
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM work_items WHERE job_id = ? AND path = ?", (job_id, key)
+            ).fetchone()
+        return WorkItem(row)
+
+    def open_items(self, job_id: int) -> List[WorkItem]:
+        """
+        Get the items of a job that still need work.
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            Pending, embedded, analyzed and retryable failed items, by id
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                f"""SELECT * FROM work_items
+                    WHERE job_id = ? AND status IN ({', '.join('?' * len(OPEN_STATES))})
+                      AND NOT (status = ? AND attempts >= ?)
+                    ORDER BY id""",
+                (job_id, *OPEN_STATES, ITEM_FAILED, self.max_attempts)
+            ).fetchall()
+        return [WorkItem(row) for row in rows]
+
+    def retryable(self, item: WorkItem) -> bool:
+        """Whether an item still needs work and has attempts left."""
+        if item.status == ITEM_FAILED:
+            return item.attempts < self.max_attempts
+        return item.status in OPEN_STATES
+
+    def mark_embedded(self, item_id: int, content_hash: str, embedding: List[float]) -> None:
+        """
+        Save the embedding of an item; later results of other content are discarded.
+
+        Args:
+            item_id: Work item id
+            content_hash: SHA256 hash of the embedded file content
+            embedding: Embedding vector
+        """
+        self._execute(
+            """UPDATE work_items
+               SET status = ?, content_hash = ?, embedding_json = ?, metadata_json = NULL,
+                   extraction_path = NULL, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (ITEM_EMBEDDED, content_hash, json.dumps(embedding), item_id)
+        )
+
+    def mark_analyzed(self, item_id: int, metadata: DocumentMetadata, extraction_path: str) -> None:
+        """
+        Save the metadata of an item.
+
+        Args:
+            item_id: Work item id
+            metadata: Extracted metadata
+            extraction_path: How the metadata was produced ('llm', 'local' or 'dedup')
+        """
+        self._execute(
+            """UPDATE work_items
+               SET status = ?, metadata_json = ?, extraction_path = ?, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (ITEM_ANALYZED, metadata.model_dump_json(), extraction_path, item_id)
+        )
+
+    def mark_stored(self, item_id: int, doc_id: Optional[int]) -> None:
+        """
+        Record that an item is stored; its intermediate results are dropped.
+
+        Args:
+            item_id: Work item id
+            doc_id: documents.id of the stored document
+        """
+        self._execute(
+            """UPDATE work_items
+               SET status = ?, doc_id = ?, embedding_json = NULL, metadata_json = NULL,
+                   last_error = NULL, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (ITEM_STORED, doc_id, item_id)
+        )
+
+    def mark_skipped(self, item_id: int, reason: str) -> None:
+        """
+        Record that an item needs no work (e.g. its content is already stored).
+
+        Args:
+            item_id: Work item id
+            reason: Why the item was skipped
+        """
+        self._execute(
+            """UPDATE work_items
+               SET status = ?, last_error = ?, embedding_json = NULL, metadata_json = NULL,
+                   updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (ITEM_SKIPPED, reason, item_id)
+        )
+
+    def mark_failed(self, item_id: int, error: str) -> None:
+        """
+        Record a failed attempt; saved intermediate results are kept for the retry.
+
+        Args:
+            item_id: Work item id
+            error: Error message
+        """
+        self._execute(
+            """UPDATE work_items
+               SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (ITEM_FAILED, error, item_id)
+        )
+
+    def finish(self, job_id: int) -> bool:
+        """
+        Close a job if none of its items needs more work.
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            True if the job was closed
+        """
+        if self.open_items(job_id):
+            return False
+        self._execute(
+            "UPDATE ingest_jobs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (JOB_FINISHED, job_id)
+        )
+        return True
+
+    def job_status(self, job_id: int) -> dict:
+        """
+        Count the items of a job per state.
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            Dictionary with the job's source, status and normalize option and one
+            count per item state
+        """
+        with self._lock:
+            job = self.conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                raise ValueError(f"Unknown job id {job_id}")
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS n FROM work_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+
+        status = {"id": job_id, "source": job["source"], "status": job["status"],
+                  "normalize": bool(job["normalize"]), "created_at": job["created_at"], "finished_at": job["finished_at"]}
+        status.update({state: 0 for state in ITEM_STATES})
+        status.update({row["status"]: row["n"] for row in rows})
+        return status
+
+    def list_jobs(self, unfinished_only: bool = False) -> List[dict]:
+        """
+        Get the status of all jobs, newest first.
+
+        Args:
+            unfinished_only: Only jobs that are still running
+
+        Returns:
+            List of job_status() dictionaries
+        """
+        sql = "SELECT id FROM ingest_jobs"
+        params: tuple = ()
+        if unfinished_only:
+            sql, params = sql + " WHERE status = ?", (JOB_RUNNING,)
+        with self._lock:
+            ids = [row["id"] for row in self.conn.execute(sql + " ORDER BY id DESC", params).fetchall()]
+        return [self.job_status(job_id) for job_id in ids]
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
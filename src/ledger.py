@@ -0,0 +1,254 @@
+"""
+Token and cost ledger for Claude API requests.
+
+Every Messages API request made by the analyzers is written to the
+llm_usage_ledger table: input/output/prompt-cache tokens, latency, model,
+estimated cost, the run it belongs to and (where there is one) the content
+hash of the analyzed document. Reports aggregate the ledger per run, per
+day or per model without calling the API.
+"""
+
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from .pricing import estimate_cost
+
+
+# Request kinds
+KIND_ANALYSIS = "analysis"
+KIND_REPAIR = "repair"
+KIND_CHUNK = "chunk"
+KIND_PACK = "pack"
+KIND_BATCH = "batch"
+
+# Report groupings -> SQL expression of the group key
+REPORT_GROUPS = {
+    "run": "run_id",
+    "day": "date(created_at)",
+    "model": "model",
+}
+
+
+def new_run_id() -> str:
+    """
+    Create an id for one program run, e.g. '20250114-093012-3fa2'.
+
+    Returns:
+        Run id, sortable by start time
+    """
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}"
+
+
+class UsageLedger:
+    """
+    Persistent per-request record of token usage and estimated cost.
+
+    Schema:
+        - llm_usage_ledger: One row per API request (or per collected batch result)
+    """
+
+    def __init__(self, db_path: str = "archaeologist.db", run_id: Optional[str] = None):
+        """
+        Initialize database connection.
+
+        Args:
+            db_path: Path to SQLite database file
+            run_id: Id the recorded requests are filed under (default: a new run id)
+        """
+        self.db_path = Path(db_path)
+        self.run_id = run_id or new_run_id()
+        self._lock = threading.Lock()
+
+        try:
+            # Shared by worker threads; access is serialized by self._lock
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the ledger table if it doesn't exist."""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_usage_ledger (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    content_hash TEXT,
+                    kind TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    cache_creation_input_tokens INTEGER DEFAULT 0,
+                    cache_read_input_tokens INTEGER DEFAULT 0,
+                    latency_s REAL DEFAULT 0,
+                    cost_usd REAL DEFAULT 0
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_run ON llm_usage_ledger(run_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_created ON llm_usage_ledger(created_at)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_content ON llm_usage_ledger(content_hash)")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize usage ledger: {e}")
+
+    def record(
+        self,
+        model: str,
+        usage,
+        latency: float = 0.0,
+        kind: str = KIND_ANALYSIS,
+        content_hash: Optional[str] = None,
+        batch: bool = False
+    ) -> float:
+        """
+        Write one request to the ledger.
+
+        Args:
+            model: Model the request was sent to
+            usage: response.usage of the request
+            latency: Wall-clock duration in seconds
+            kind: Request kind (analysis, repair, chunk, pack, batch)
+            content_hash: SHA256 hash of the analyzed document, if the request
+                belongs to exactly one document
+            batch: Price with the Message Batches discount
+
+        Returns:
+            Estimated cost of the request in USD
+        """
+        cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cost = estimate_cost(
+            model, usage.input_tokens, usage.output_tokens, cache_creation, cache_read, batch=batch
+        )
+
+        with self._lock:
+            try:
+                self.conn.execute(
+                    """INSERT INTO llm_usage_ledger
+                       (run_id, content_hash, kind, model, input_tokens, output_tokens,
+                        cache_creation_input_tokens, cache_read_input_tokens, latency_s, cost_usd)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (self.run_id, content_hash, kind, model, usage.input_tokens, usage.output_tokens,
+                     cache_creation, cache_read, latency, cost)
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to write usage ledger: {e}")
+        return cost
+
+    def report(self, group_by: str = "run", since: Optional[str] = None) -> List[dict]:
+        """
+        Aggregate the ledger.
+
+        Args:
+            group_by: 'run', 'day' or 'model'
+            since: Optional ISO date (YYYY-MM-DD); earlier requests are ignored
+
+        Returns:
+            One dictionary per group, newest first, with request and document
+            counts, token totals, latency and cost
+
+        Raises:
+            ValueError: If group_by is unknown
+        """
+        if group_by not in REPORT_GROUPS:
+            raise ValueError(f"Unknown grouping '{group_by}' (use one of: {', '.join(REPORT_GROUPS)})")
+        key = REPORT_GROUPS[group_by]
+
+        where, params = "", []
+        if since:
+            where, params = "WHERE date(created_at) >= date(?)", [since]
+
+        with self._lock:
+            rows = self.conn.execute(
+                f"""SELECT {key} AS grp,
+                           COUNT(*) AS requests,
+                           COUNT(DISTINCT content_hash) AS documents,
+                           SUM(input_tokens) AS input_tokens,
+                           SUM(output_tokens) AS output_tokens,
+                           SUM(cache_creation_input_tokens) AS cache_creation_input_tokens,
+                           SUM(cache_read_input_tokens) AS cache_read_input_tokens,
+                           SUM(latency_s) AS latency_s,
+                           SUM(cost_usd) AS cost_usd,
+                           MIN(created_at) AS first_request,
+                           MAX(created_at) AS last_request
+                    FROM llm_usage_ledger {where}
+                    GROUP BY grp
+                    ORDER BY last_request DESC""",
+                params
+            ).fetchall()
+
+        report = []
+        for row in rows:
+            entry = dict(row)
+            entry[group_by] = entry.pop("grp")
+            entry["avg_latency_s"] = round(entry["latency_s"] / entry["requests"], 3)
+            entry["latency_s"] = round(entry["latency_s"], 3)
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+            report.append(entry)
+        return report
+
+    def document_usage(self, content_hash: str) -> dict:
+        """
+        Sum all requests recorded for one document.
+
+        Args:
+            content_hash: SHA256 hash of the document
+
+        Returns:
+            Dictionary with requests, token totals and cost
+        """
+        with self._lock:
+            row = self.conn.execute(
+                """SELECT COUNT(*) AS requests,
+                          COALESCE(SUM(input_tokens), 0) AS input_tokens,
+                          COALESCE(SUM(output_tokens), 0) AS output_tokens,
+                          COALESCE(SUM(cost_usd), 0) AS cost_usd
+                   FROM llm_usage_ledger WHERE content_hash = ?""",
+                (content_hash,)
+            ).fetchone()
+        return dict(row)
+
+    def run_totals(self) -> dict:
+        """
+        Get the totals of the current run.
+
+        Returns:
+            Report entry of this ledger's run_id (zeros if nothing was recorded)
+        """
+        # Only this run's rows (indexed), as schedulers call this before every document
+        with self._lock:
+            row = self.conn.execute(
+                """SELECT COUNT(*) AS requests,
+                          COUNT(DISTINCT content_hash) AS documents,
+                          COALESCE(SUM(input_tokens), 0) AS input_tokens,
+                          COALESCE(SUM(output_tokens), 0) AS output_tokens,
+                          COALESCE(SUM(cache_creation_input_tokens), 0) AS cache_creation_input_tokens,
+                          COALESCE(SUM(cache_read_input_tokens), 0) AS cache_read_input_tokens,
+                          COALESCE(SUM(latency_s), 0.0) AS latency_s,
+                          COALESCE(SUM(cost_usd), 0.0) AS cost_usd
+                   FROM llm_usage_ledger WHERE run_id = ?""",
+                (self.run_id,)
+            ).fetchone()
+        return {"run": self.run_id, **dict(row)}
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
@@ -2,13 +2,27 @@
 LLM-based document analysis using Anthropic Claude.
 """
 
+import hashlib
+import json
 import logging
+import math
 import os
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 from anthropic import Anthropic
 from dotenv import load_dotenv
+from pydantic import ValidationError
 
-from .models import DocumentMetadata
+from .ledger import KIND_ANALYSIS, KIND_CHUNK, KIND_PACK, KIND_REPAIR, UsageLedger
+from .models import DocumentMetadata, KeyedDocumentMetadata, PackedMetadata
+from .pricing import estimate_cost
+from .routing import ROUTE_DEFAULT, ROUTE_SMALL, ModelRouter
+from .tokens import estimate_tokens, split_into_chunks, truncate_to_tokens
+
+if TYPE_CHECKING:
+    from .cache import MetadataCache
 
 
 logger = logging.getLogger(__name__)
@@ -16,6 +30,446 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+# Default token budget per document (estimated locally, see src/tokens.py).
+# Longer documents are summarized chunk by chunk, or truncated.
+MAX_DOCUMENT_TOKENS = 25000
+CHUNK_TOKENS = 8000
+
+# Packing mode: short documents are analyzed several at a time
+PACK_TOKENS = 4000
+PACK_DOCUMENT_TOKENS = 500
+PACK_MAX_DOCUMENTS = 16
+
+# Output limit of a chunk summary, and typical output of a metadata tool call
+# (used for cost estimates before a document is analyzed)
+CHUNK_SUMMARY_TOKENS = 600
+EXPECTED_OUTPUT_TOKENS = 400
+
+SYSTEM_PROMPT = """Du bist ein präziser Dokumenten-Archivar.
+Deine Aufgabe ist es, Metadaten aus Dokumenten zu extrahieren und über das vorgegebene Werkzeug zurückzugeben.
+
+Extrahiere folgende Informationen:
+- title: Der Haupttitel oder das Hauptthema des Dokuments
+- language: ISO 639-1 Sprachcode (z.B. 'en', 'de', 'fr')
+- topics: Liste der Hauptthemen/Kategorien
+- summary: Eine prägnante Zusammenfassung des Inhalts (2-3 Sätze)
+- keywords: Liste wichtiger Schlüsselbegriffe und Konzepte
+
+Sei präzise und objektiv. Verwende nur Informationen, die im Dokument vorhanden sind."""
+
+USER_PROMPT_TEMPLATE = """Analysiere das folgende Dokument und extrahiere die Metadaten:
+
+<document>
+{text}
+</document>
+
+Rufe das Werkzeug record_document_metadata mit den Metadaten auf."""
+
+# Optional few-shot block, sent after the system prompt. Together they exceed
+# the 1024-token minimum for prompt caching, so enabling it makes the static
+# prefix cacheable (below that size the API silently skips cache_control).
+FEW_SHOT_EXAMPLES = """Beispiele für die erwartete Werkzeug-Eingabe:
+
+<beispiel>
+<document>
+# Onboarding-Checkliste für neue Entwicklerinnen und Entwickler
+
+Willkommen im Team! Diese Checkliste hilft dir in der ersten Woche.
+
+## Tag 1
+- Laptop abholen und mit dem Firmen-VPN verbinden
+- Zugang zu GitLab, Jira und Confluence beantragen (Ticket an die IT)
+- Lokale Entwicklungsumgebung nach der Anleitung im Wiki einrichten
+
+## Tag 2-3
+- Architekturüberblick mit dem Tech Lead (ca. 60 Minuten)
+- Ersten "Good first issue" aus dem Backlog übernehmen
+- Code-Review-Richtlinien lesen: zwei Approvals, CI muss grün sein
+
+## Ende der Woche
+- Feedbackgespräch mit der Teamleitung
+- Offene Fragen im Kanal #dev-onboarding sammeln
+</document>
+<metadaten>
+{"title": "Onboarding-Checkliste für neue Entwicklerinnen und Entwickler", "language": "de", "topics": ["Onboarding", "Softwareentwicklung", "Teamprozesse"], "summary": "Checkliste für die erste Arbeitswoche neuer Entwickler. Sie umfasst Zugänge und Einrichtung der Entwicklungsumgebung, einen Architekturüberblick, das erste Ticket sowie ein Feedbackgespräch am Ende der Woche.", "keywords": ["VPN", "GitLab", "Jira", "Confluence", "Code-Review", "Good first issue", "Entwicklungsumgebung"]}
+</metadaten>
+</beispiel>
+
+<beispiel>
+<document>
+Configuring Liveness and Readiness Probes
+
+Kubernetes uses liveness probes to decide when to restart a container and
+readiness probes to decide when a pod may receive traffic. A failing
+liveness probe triggers a restart; a failing readiness probe only removes
+the pod from service endpoints.
+
+Recommended defaults for our HTTP services:
+- livenessProbe: GET /healthz, initialDelaySeconds 10, periodSeconds 10
+- readinessProbe: GET /ready, periodSeconds 5, failureThreshold 3
+
+Do not point the liveness probe at endpoints that check downstream
+dependencies such as the database. A database outage would otherwise
+restart every replica at once and turn a partial outage into a full one.
+</document>
+<metadaten>
+{"title": "Configuring Liveness and Readiness Probes", "language": "en", "topics": ["Kubernetes", "Health Checks", "Reliability"], "summary": "Explains the difference between Kubernetes liveness and readiness probes and gives recommended probe settings for HTTP services. It warns against liveness probes that depend on downstream systems, since that can cause cascading restarts.", "keywords": ["livenessProbe", "readinessProbe", "/healthz", "initialDelaySeconds", "periodSeconds", "failureThreshold", "pod restart"]}
+</metadaten>
+</beispiel>
+
+<beispiel>
+<document>
+Einkaufsliste:
+- Milch
+- Brot
+- Äpfel
+</document>
+<metadaten>
+{"title": "Einkaufsliste", "language": "de", "topics": ["Einkauf"], "summary": "Eine kurze Einkaufsliste mit drei Lebensmitteln.", "keywords": ["Milch", "Brot", "Äpfel"]}
+</metadaten>
+</beispiel>
+
+<beispiel>
+<document>
+Meeting notes - Q3 planning (marketing)
+
+Attendees: Sarah, Tom, Priya
+- Budget for the autumn campaign approved (EUR 40k)
+- Tom drafts the newsletter series by 15 August
+- Priya evaluates two agencies for the video production
+- Next sync: Monday 10:00
+</document>
+<metadaten>
+{"title": "Meeting notes - Q3 planning (marketing)", "language": "en", "topics": ["Marketing", "Planning", "Meeting notes"], "summary": "Notes from the marketing team's Q3 planning meeting. The autumn campaign budget was approved and tasks for the newsletter series and the agency evaluation for video production were assigned.", "keywords": ["Q3 planning", "autumn campaign", "budget", "newsletter", "video production", "agency"]}
+</metadaten>
+</beispiel>
+
+Halte dich an dieses Format. Die Beispiele dienen nur der Orientierung; übernimm keine Inhalte daraus."""
+
+
+# Map step for documents above the token budget: one short summary per chunk
+CHUNK_SUMMARY_PROMPT = """Du fasst einen Abschnitt eines längeren Dokuments für einen Dokumenten-Archivar zusammen.
+Nenne Überschriften, behandelte Themen und wichtige Fachbegriffe des Abschnitts.
+Antworte in der Sprache des Dokuments mit höchstens 200 Wörtern und ohne Einleitung."""
+
+CHUNK_USER_TEMPLATE = """Abschnitt {index} von {total}:
+
+<section>
+{text}
+</section>"""
+
+# Reduce step: metadata extraction over the chunk summaries
+MERGE_PROMPT_TEMPLATE = """Das folgende Dokument war zu lang für eine vollständige Analyse.
+Es liegt als Anfang des Originaltextes (<opening>) und als Folge von Abschnittszusammenfassungen (<section_summary>) vor.
+
+<document>
+{text}
+</document>
+
+Extrahiere die Metadaten für das gesamte Dokument und rufe das Werkzeug record_document_metadata auf."""
+
+# Packing mode: several short documents per request, each tagged with its id
+PACKED_PROMPT_TEMPLATE = """Analysiere jedes der folgenden {count} Dokumente einzeln und extrahiere die Metadaten pro Dokument.
+Die Dokumente sind voneinander unabhängig; übertrage keine Inhalte von einem Dokument auf ein anderes.
+
+{documents}
+
+Rufe das Werkzeug record_documents_metadata mit genau einem Eintrag pro Dokument auf.
+Übernimm die doc_id jedes Dokuments unverändert aus dem id-Attribut."""
+
+PACKED_DOCUMENT_TEMPLATE = """<document id="{doc_id}">
+{text}
+</document>"""
+
+METADATA_TOOL_NAME = "record_document_metadata"
+PACKED_TOOL_NAME = "record_documents_metadata"
+
+
+def _metadata_input_schema() -> dict:
+    """JSON schema of DocumentMetadata, used as the tool's input schema."""
+    schema = DocumentMetadata.model_json_schema()
+    schema.pop("example", None)
+    return schema
+
+
+def _packed_input_schema() -> dict:
+    """JSON schema of PackedMetadata with the entry schema inlined."""
+    schema = PackedMetadata.model_json_schema()
+    entry = schema.pop("$defs")["KeyedDocumentMetadata"]
+    entry.pop("example", None)
+    schema["properties"]["documents"]["items"] = entry
+    return schema
+
+
+# Forced tool call: the reply is always a tool_use block whose input follows
+# the DocumentMetadata schema, so no free-text JSON has to be scraped.
+METADATA_TOOL = {
+    "name": METADATA_TOOL_NAME,
+    "description": "Speichert die aus dem Dokument extrahierten Metadaten.",
+    "input_schema": _metadata_input_schema()
+}
+
+PACKED_TOOL = {
+    "name": PACKED_TOOL_NAME,
+    "description": "Speichert die Metadaten mehrerer Dokumente, je ein Eintrag pro doc_id.",
+    "input_schema": _packed_input_schema()
+}
+
+
+class MetadataParseError(RuntimeError):
+    """Claude's reply did not contain valid DocumentMetadata."""
+
+    def __init__(self, message: str, tool_use_id: Optional[str] = None):
+        super().__init__(message)
+        self.tool_use_id = tool_use_id
+
+
+def get_prompt_hash(few_shot: bool = False) -> str:
+    """
+    Fingerprint everything that shapes the request besides the document.
+
+    Part of the metadata cache key: editing the prompt invalidates old entries.
+
+    Args:
+        few_shot: Whether the few-shot block is sent
+
+    Returns:
+        Short hex digest
+    """
+    parts = [
+        SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, CHUNK_SUMMARY_PROMPT, CHUNK_USER_TEMPLATE,
+        MERGE_PROMPT_TEMPLATE, PACKED_PROMPT_TEMPLATE, PACKED_DOCUMENT_TEMPLATE,
+        json.dumps(METADATA_TOOL, sort_keys=True), json.dumps(PACKED_TOOL, sort_keys=True)
+    ]
+    if few_shot:
+        parts.append(FEW_SHOT_EXAMPLES)
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def current_prompt_hashes() -> set:
+    """Prompt hashes that are valid for the prompt currently in this module."""
+    return {get_prompt_hash(False), get_prompt_hash(True)}
+
+
+def prepare_text(text: str, max_tokens: int = MAX_DOCUMENT_TOKENS) -> str:
+    """
+    Validate document text and truncate it to the token budget.
+
+    Args:
+        text: Document content to analyze
+        max_tokens: Token budget for the document (estimated locally)
+
+    Returns:
+        Text ready to be embedded in the user prompt
+
+    Raises:
+        ValueError: If text is empty
+    """
+    if not text or not text.strip():
+        raise ValueError("Cannot analyze empty text")
+
+    document_tokens = estimate_tokens(text)
+    if document_tokens > max_tokens:
+        logger.warning(f"Text truncated from ~{document_tokens} to {max_tokens} tokens")
+        text = truncate_to_tokens(text, max_tokens) + "\n\n[... text truncated ...]"
+
+    return text
+
+
+def _system_blocks(few_shot: bool) -> list:
+    """Static system prompt blocks; the last one is marked for prompt caching."""
+    system_blocks = [{"type": "text", "text": SYSTEM_PROMPT}]
+    if few_shot:
+        system_blocks.append({"type": "text", "text": FEW_SHOT_EXAMPLES})
+    system_blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return system_blocks
+
+
+def build_request_params(
+    text: str,
+    model: str = DEFAULT_MODEL,
+    few_shot: bool = False,
+    template: str = USER_PROMPT_TEMPLATE
+) -> dict:
+    """
+    Build the keyword arguments for a Messages API analysis request.
+
+    Shared by the synchronous, async and batch analyzers so that all
+    of them send exactly the same prompt. The static system blocks come
+    first and the last one carries cache_control, so repeated calls read
+    the instructions from the prompt cache instead of reprocessing them.
+
+    Args:
+        text: Prepared document text (see prepare_text)
+        model: Claude model identifier
+        few_shot: Append the few-shot examples to the cached system prefix
+        template: User prompt template with a {text} placeholder
+
+    Returns:
+        Dictionary of messages.create() parameters
+    """
+    return {
+        "model": model,
+        "max_tokens": 2000,
+        "system": _system_blocks(few_shot),
+        "tools": [METADATA_TOOL],
+        "tool_choice": {"type": "tool", "name": METADATA_TOOL_NAME},
+        "messages": [
+            {
+                "role": "user",
+                "content": template.format(text=text)
+            }
+        ]
+    }
+
+
+def build_packed_request_params(
+    documents: Dict[str, str],
+    model: str = DEFAULT_MODEL,
+    few_shot: bool = False
+) -> dict:
+    """
+    Build a Messages API request that analyzes several documents at once.
+
+    Documents are labelled d1, d2, ... in dictionary order rather than with
+    their doc_ids (usually file paths, which may contain quotes, '&' or '<');
+    parse_packed_response() maps the labels back.
+
+    Args:
+        documents: Dictionary doc_id -> prepared document text
+        model: Claude model identifier
+        few_shot: Append the few-shot examples to the cached system prefix
+
+    Returns:
+        Dictionary of messages.create() parameters
+    """
+    packed = "\n\n".join(
+        PACKED_DOCUMENT_TEMPLATE.format(doc_id=_packed_id(index), text=text)
+        for index, text in enumerate(documents.values(), 1)
+    )
+
+    return {
+        "model": model,
+        # Room for one full metadata entry per document
+        "max_tokens": min(8192, 500 + 400 * len(documents)),
+        "system": _system_blocks(few_shot),
+        "tools": [PACKED_TOOL],
+        "tool_choice": {"type": "tool", "name": PACKED_TOOL_NAME},
+        "messages": [
+            {
+                "role": "user",
+                "content": PACKED_PROMPT_TEMPLATE.format(count=len(documents), documents=packed)
+            }
+        ]
+    }
+
+
+def _packed_id(index: int) -> str:
+    """Label of the index-th (1-based) document of a packed request."""
+    return f"d{index}"
+
+
+def parse_packed_response(response, doc_ids) -> Dict[str, DocumentMetadata]:
+    """
+    Extract per-document metadata from a packed response.
+
+    Entries are validated one by one, so a single malformed entry does
+    not discard the others. Unknown or duplicate ids are ignored.
+
+    Args:
+        response: Messages API response (anthropic Message)
+        doc_ids: Ids of the documents sent in the request, in the order
+            passed to build_packed_request_params()
+
+    Returns:
+        Dictionary doc_id -> DocumentMetadata for every valid entry
+        (documents without a valid entry are missing)
+    """
+    expected = {_packed_id(index): doc_id for index, doc_id in enumerate(doc_ids, 1)}
+    results: Dict[str, DocumentMetadata] = {}
+
+    for block in response.content:
+        if block.type != "tool_use" or block.name != PACKED_TOOL_NAME:
+            continue
+        entries = block.input.get("documents") if isinstance(block.input, dict) else None
+        if not isinstance(entries, list):
+            logger.warning("Packed tool input contained no document list")
+            break
+        for entry in entries:
+            try:
+                keyed = KeyedDocumentMetadata.model_validate(entry)
+            except ValidationError as e:
+                logger.warning(f"Packed entry failed validation: {e}")
+                continue
+            doc_id = expected.get(keyed.doc_id)
+            if doc_id is not None and doc_id not in results:
+                results[doc_id] = DocumentMetadata(**keyed.model_dump(exclude={"doc_id"}))
+        break
+
+    return results
+
+
+def parse_metadata_response(response) -> DocumentMetadata:
+    """
+    Extract DocumentMetadata from the forced tool call of a response.
+
+    Args:
+        response: Messages API response (anthropic Message)
+
+    Returns:
+        Validated DocumentMetadata
+
+    Raises:
+        MetadataParseError: If the tool call is missing or its input is invalid
+    """
+    for block in response.content:
+        if block.type == "tool_use" and block.name == METADATA_TOOL_NAME:
+            try:
+                return DocumentMetadata.model_validate(block.input)
+            except ValidationError as e:
+                logger.warning(f"Tool input failed validation: {e}")
+                raise MetadataParseError(
+                    f"Claude response could not be parsed as valid metadata: {e}",
+                    tool_use_id=block.id
+                ) from e
+
+    raise MetadataParseError("Claude response contained no metadata tool call")
+
+
+def build_repair_params(params: dict, response, error: MetadataParseError) -> dict:
+    """
+    Build a follow-up request that returns a validation error to the model.
+
+    The failed tool call is answered with an is_error tool_result, so the
+    model can correct its input in the same conversation.
+
+    Args:
+        params: Parameters of the failed request
+        response: The response whose tool input was invalid
+        error: The parse error raised for it
+
+    Returns:
+        Dictionary of messages.create() parameters for the repair round
+    """
+    feedback = (
+        f"Die Eingabe war ungültig: {error.__cause__ or error}\n"
+        f"Rufe {METADATA_TOOL_NAME} erneut mit korrigierter Eingabe auf."
+    )
+    if error.tool_use_id:
+        reply = [{"type": "tool_result", "tool_use_id": error.tool_use_id, "is_error": True, "content": feedback}]
+    else:
+        reply = feedback
+
+    return {
+        **params,
+        "messages": params["messages"] + [
+            {"role": "assistant", "content": [block.model_dump(exclude_none=True) for block in response.content]},
+            {"role": "user", "content": reply}
+        ]
+    }
+
 
 class Analyzer:
     """
@@ -27,8 +481,18 @@ class Analyzer:
 
     def __init__(
         self,
-        model: str = "claude-sonnet-4-20250514",
-        api_key: Optional[str] = None
+        model: str = DEFAULT_MODEL,
+        api_key: Optional[str] = None,
+        cache: Optional["MetadataCache"] = None,
+        few_shot: bool = False,
+        max_repair_rounds: int = 1,
+        max_document_tokens: int = MAX_DOCUMENT_TOKENS,
+        chunk_tokens: int = CHUNK_TOKENS,
+        map_reduce: bool = True,
+        map_workers: int = 4,
+        router: Optional[ModelRouter] = None,
+        base_url: Optional[str] = None,
+        ledger: Optional[UsageLedger] = None
     ):
         """
         Initialize Claude API client.
@@ -36,11 +500,48 @@ class Analyzer:
         Args:
             model: Claude model identifier (default: claude-sonnet-4-20250514)
             api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
+            cache: Optional persistent metadata cache checked before each API call
+            few_shot: Send the few-shot examples as part of the cached system prefix
+            max_repair_rounds: Times an invalid tool input is sent back for correction
+            max_document_tokens: Token budget up to which a document is sent whole
+            chunk_tokens: Chunk size for map-reduce analysis of longer documents
+            map_reduce: Summarize long documents chunk by chunk (else truncate them)
+            map_workers: Parallel chunk-summary requests per document
+            router: Optional routing policy sending small documents to a cheaper model
+            base_url: Optional API base URL (e.g. a FakeAnthropicServer)
+            ledger: Optional usage ledger every request is recorded in
 
         Raises:
             ValueError: If API key is not provided or found in environment
         """
         self.model = model
+        self.cache = cache
+        self.ledger = ledger
+        self.few_shot = few_shot
+        self.prompt_hash = get_prompt_hash(few_shot)
+        self.max_repair_rounds = max_repair_rounds
+        self.max_document_tokens = max_document_tokens
+        self.chunk_tokens = chunk_tokens
+        self.map_reduce = map_reduce
+        self.map_workers = map_workers
+        self.router = router
+        self._stats_lock = threading.Lock()
+
+        # Structured output outcomes, to measure parse-failure rates
+        self.parse_stats = {"responses": 0, "valid_first_try": 0, "repaired": 0, "failed": 0}
+
+        # Packing mode: packed requests, documents answered in them, documents retried alone
+        self.pack_stats = {"packs": 0, "packed_documents": 0, "answered": 0, "retried": 0}
+
+        # Accumulated response.usage (incl. prompt cache tokens) and latency
+        self.usage_totals = {
+            "requests": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "latency_s": 0.0
+        }
 
         # Get API key from parameter or environment
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
@@ -52,12 +553,17 @@ class Analyzer:
             )
 
         try:
-            self.client = Anthropic(api_key=self.api_key)
+            self.client = Anthropic(api_key=self.api_key, base_url=base_url)
             logger.info(f"Claude API client initialized with model: {model}")
         except Exception as e:
             logger.error(f"Failed to initialize Claude client: {e}")
             raise RuntimeError(f"Could not initialize Claude API client: {e}")
 
+        if self.cache is not None:
+            removed = self.cache.invalidate(keep_prompt_hashes=current_prompt_hashes())
+            if removed:
+                logger.info(f"Prompt changed - removed {removed} stale metadata cache entries")
+
     def analyze_text(self, text: str) -> DocumentMetadata:
         """
         Analyze document text and extract structured metadata.
@@ -75,83 +581,460 @@ class Analyzer:
         if not text or not text.strip():
             raise ValueError("Cannot analyze empty text")
 
-        # Truncate very long texts (Claude has context limits)
-        max_chars = 100000  # ~25k tokens safety margin
-        if len(text) > max_chars:
-            logger.warning(f"Text truncated from {len(text)} to {max_chars} characters")
-            text = text[:max_chars] + "\n\n[... text truncated ...]"
+        document_tokens = estimate_tokens(text)
+        long_document = document_tokens > self.max_document_tokens
 
-        system_prompt = """Du bist ein präziser Dokumenten-Archivar.
-Deine Aufgabe ist es, Metadaten aus Dokumenten zu extrahieren und im strukturierten JSON-Format zurückzugeben.
+        # Long documents are analyzed differently depending on the budget settings
+        document_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        content_hash = document_hash
+        if long_document:
+            mode = "map_reduce" if self.map_reduce else "truncate"
+            cache_input = f"{text}\x00{mode}:{self.max_document_tokens}:{self.chunk_tokens}"
+            content_hash = hashlib.sha256(cache_input.encode("utf-8")).hexdigest()
 
-Extrahiere folgende Informationen:
-- title: Der Haupttitel oder das Hauptthema des Dokuments
-- language: ISO 639-1 Sprachcode (z.B. 'en', 'de', 'fr')
-- topics: Liste der Hauptthemen/Kategorien
-- summary: Eine prägnante Zusammenfassung des Inhalts (2-3 Sätze)
-- keywords: Liste wichtiger Schlüsselbegriffe und Konzepte
+        route, model = self._select_model(text, long_document)
 
-Sei präzise und objektiv. Verwende nur Informationen, die im Dokument vorhanden sind."""
+        # Cached under the model that produced the metadata; a routed document
+        # escalated in an earlier run is found under the default model
+        if self.cache is not None:
+            cached = self.cache.get(content_hash, model, self.prompt_hash, fallback_model=self.model)
+            if cached is not None:
+                logger.info(f"Metadata cache hit: {cached.title}")
+                return cached
 
-        user_prompt = f"""Analysiere das folgende Dokument und extrahiere die Metadaten:
+        try:
+            input_tokens = output_tokens = 0
+            if not long_document:
+                params = build_request_params(text, model, self.few_shot)
+            elif self.map_reduce:
+                logger.info(f"Document has ~{document_tokens} tokens - using map-reduce analysis")
+                merged, input_tokens, output_tokens = self._summarize_chunks(text, route, document_hash)
+                params = build_request_params(merged, model, self.few_shot, MERGE_PROMPT_TEMPLATE)
+            else:
+                params = build_request_params(
+                    prepare_text(text, self.max_document_tokens), model, self.few_shot
+                )
 
-<document>
-{text}
-</document>
+            escalated = False
+            try:
+                metadata, extract_input, extract_output = self._extract(params, route, document_hash)
+            except MetadataParseError:
+                if route != ROUTE_SMALL or not self.router.escalate:
+                    raise
+                logger.warning(f"{model} output failed validation - escalating to {self.model}")
+                escalated = True
+                model = self.model
+                metadata, extract_input, extract_output = self._extract(
+                    build_request_params(text, self.model, self.few_shot), ROUTE_DEFAULT, document_hash
+                )
+            logger.info(f"Successfully extracted metadata: {metadata.title}")
 
-Gib die Metadaten im korrekten JSON-Format zurück."""
+            if self.router is not None:
+                self.router.record_document(route, escalated)
 
-        try:
-            logger.info("Sending analysis request to Claude API...")
+            if self.cache is not None:
+                self.cache.put(
+                    content_hash, model, self.prompt_hash, metadata,
+                    input_tokens + extract_input, output_tokens + extract_output
+                )
+
+            return metadata
+
+        except Exception as e:
+            logger.error(f"Claude API call failed: {e}")
+            raise RuntimeError(f"Document analysis failed: {e}") from e
+
+    def analyze_packed(
+        self,
+        documents: Dict[str, str],
+        max_pack_tokens: int = PACK_TOKENS,
+        max_document_tokens: int = PACK_DOCUMENT_TOKENS,
+        max_documents: int = PACK_MAX_DOCUMENTS
+    ) -> Dict[str, Union[DocumentMetadata, Exception]]:
+        """
+        Analyze many short documents with few requests.
+
+        Documents up to max_document_tokens are grouped into packs of up to
+        max_pack_tokens and analyzed in a single request each; the reply
+        carries one metadata entry per document id. Documents missing from
+        the reply (or with an invalid entry), and documents too long to
+        pack, are analyzed on their own with analyze_text().
+
+        Args:
+            documents: Dictionary of stable document id -> text
+            max_pack_tokens: Token budget of the documents in one request
+            max_document_tokens: Largest document (estimated tokens) that is packed
+            max_documents: Most documents per request
+
+        Returns:
+            Dictionary doc_id -> DocumentMetadata, or the exception raised
+            for that document
+        """
+        results: Dict[str, Union[DocumentMetadata, Exception]] = {}
+        single: List[str] = []
+        packs: Dict[str, List[List[str]]] = {}
+        pack_tokens: Dict[str, int] = {}
+
+        for doc_id, text in documents.items():
+            if not text or not text.strip():
+                results[doc_id] = ValueError("Cannot analyze empty text")
+                continue
+
+            document_tokens = estimate_tokens(text)
+            if document_tokens > max_document_tokens:
+                single.append(doc_id)
+                continue
+
+            route, model = self._select_model(text, False)
+            if self.cache is not None:
+                content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                cached = self.cache.get(content_hash, model, self.prompt_hash, fallback_model=self.model)
+                if cached is not None:
+                    results[doc_id] = cached
+                    continue
 
-            # Use Claude's structured output with response_model
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ]
+            # Greedy packing in input order, one pack list per routed model
+            model_packs = packs.setdefault(model, [])
+            if (not model_packs or len(model_packs[-1]) >= max_documents
+                    or pack_tokens[model] + document_tokens > max_pack_tokens):
+                model_packs.append([])
+                pack_tokens[model] = 0
+            model_packs[-1].append(doc_id)
+            pack_tokens[model] += document_tokens
+
+        for model, model_packs in packs.items():
+            for pack in model_packs:
+                if len(pack) == 1:
+                    single.append(pack[0])
+                    continue
+                answered = self._analyze_pack({doc_id: documents[doc_id] for doc_id in pack}, model)
+                results.update(answered)
+                single.extend(doc_id for doc_id in pack if doc_id not in answered)
+                with self._stats_lock:
+                    self.pack_stats["retried"] += len(pack) - len(answered)
+
+        for doc_id in single:
+            try:
+                results[doc_id] = self.analyze_text(documents[doc_id])
+            except Exception as e:
+                results[doc_id] = e
+
+        return {doc_id: results[doc_id] for doc_id in documents}
+
+    def estimate_usage(self, text: Optional[str] = None, document_tokens: Optional[int] = None) -> dict:
+        """
+        Estimate what analyze_text() will spend on a document, without calling the API.
+
+        Uses the local token estimate and this analyzer's routing and
+        long-document settings. Cache hits and repair rounds are not
+        anticipated, so the estimate errs on the expensive side.
+
+        Args:
+            text: Document content
+            document_tokens: Token count to price instead of the text's (e.g. from the
+                file size, before the file is read); without text the default model is assumed
+
+        Returns:
+            Dictionary with model, requests, input_tokens, output_tokens and cost_usd
+        """
+        if document_tokens is None:
+            document_tokens = estimate_tokens(text or "")
+        long_document = document_tokens > self.max_document_tokens
+        model = self.model if text is None else self._select_model(text, long_document)[1]
+
+        # System prompt, tool schema and user template around the document
+        overhead = estimate_tokens(json.dumps(build_request_params("", model, self.few_shot), ensure_ascii=False))
+        requests, output_tokens = 1, EXPECTED_OUTPUT_TOKENS
+
+        if not long_document:
+            input_tokens = document_tokens + overhead
+        elif self.map_reduce:
+            chunks = math.ceil(document_tokens / self.chunk_tokens)
+            summaries = chunks * CHUNK_SUMMARY_TOKENS
+            chunk_overhead = estimate_tokens(CHUNK_SUMMARY_PROMPT + CHUNK_USER_TEMPLATE)
+            requests += chunks
+            input_tokens = (
+                document_tokens + chunks * chunk_overhead
+                + overhead + min(1000, self.chunk_tokens) + summaries
+            )
+            output_tokens += summaries
+        else:
+            input_tokens = self.max_document_tokens + overhead
+
+        return {
+            "model": model,
+            "requests": requests,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": estimate_cost(model, input_tokens, output_tokens)
+        }
+
+    def _analyze_pack(self, pack: Dict[str, str], model: str) -> Dict[str, DocumentMetadata]:
+        """
+        Send one packed request and store its valid entries in the cache.
+
+        Args:
+            pack: Dictionary doc_id -> text
+            model: Model the pack is routed to
+
+        Returns:
+            Dictionary doc_id -> DocumentMetadata for the answered documents
+        """
+        route = None
+        if self.router is not None:
+            route = ROUTE_SMALL if model == self.router.small_model else ROUTE_DEFAULT
+
+        logger.info(f"Sending packed analysis request ({len(pack)} documents, {model})...")
+        try:
+            response = self._call(
+                build_packed_request_params(pack, model, self.few_shot), route, kind=KIND_PACK
             )
+        except Exception as e:
+            logger.error(f"Packed request failed, analyzing documents one by one: {e}")
+            return {}
+
+        answered = parse_packed_response(response, pack.keys())
+        logger.info(f"Packed reply covered {len(answered)} of {len(pack)} documents")
+
+        with self._stats_lock:
+            self.pack_stats["packs"] += 1
+            self.pack_stats["packed_documents"] += len(pack)
+            self.pack_stats["answered"] += len(answered)
 
-            # Extract text response
-            response_text = response.content[0].text
+        if self.router is not None:
+            for _ in answered:
+                self.router.record_document(route)
+
+        if self.cache is not None and answered:
+            # Token usage of the request is attributed evenly to its documents
+            input_share = response.usage.input_tokens // len(pack)
+            output_share = response.usage.output_tokens // len(pack)
+            for doc_id, metadata in answered.items():
+                content_hash = hashlib.sha256(pack[doc_id].encode("utf-8")).hexdigest()
+                self.cache.put(content_hash, model, self.prompt_hash, metadata, input_share, output_share)
+
+        return answered
+
+    def _select_model(self, text: str, long_document: bool) -> Tuple[Optional[str], str]:
+        """
+        Pick the route and model for a document.
 
+        Args:
+            text: Document content
+            long_document: True if the document exceeds the token budget
+
+        Returns:
+            Tuple of (route or None without a router, model id)
+        """
+        if self.router is None:
+            return None, self.model
+        route = ROUTE_DEFAULT if long_document else self.router.route(text)
+        return route, self.router.small_model if route == ROUTE_SMALL else self.model
+
+    def _call(
+        self,
+        params: dict,
+        route: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        kind: str = KIND_ANALYSIS
+    ):
+        """
+        Send one Messages API request and record its usage.
+
+        Args:
+            params: messages.create() parameters
+            route: Routing decision the request belongs to (None without a router)
+            content_hash: SHA256 hash of the document the request belongs to, for the ledger
+            kind: Request kind recorded in the ledger
+
+        Returns:
+            Message response
+        """
+        started = time.perf_counter()
+        response = self.client.messages.create(**params)
+        latency = time.perf_counter() - started
+        self._record_usage(response.usage, latency)
+        if route is not None:
+            self.router.record_request(route, params["model"], response.usage, latency)
+        if self.ledger is not None:
+            self.ledger.record(params["model"], response.usage, latency, kind, content_hash)
+        return response
+
+    def _extract(
+        self,
+        params: dict,
+        route: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Tuple[DocumentMetadata, int, int]:
+        """
+        Run the metadata tool call, with bounded repair rounds.
+
+        Args:
+            params: Request parameters from build_request_params
+            route: Routing decision the requests belong to
+            content_hash: SHA256 hash of the analyzed document
+
+        Returns:
+            Tuple of (metadata, input tokens, output tokens) over all rounds
+
+        Raises:
+            MetadataParseError: If the output is still invalid after repair
+        """
+        input_tokens = output_tokens = 0
+
+        for repair_round in range(self.max_repair_rounds + 1):
+            logger.info("Sending analysis request to Claude API...")
+            kind = KIND_ANALYSIS if repair_round == 0 else KIND_REPAIR
+            response = self._call(params, route, content_hash, kind)
+            input_tokens += response.usage.input_tokens
+            output_tokens += response.usage.output_tokens
             logger.info("Received response from Claude API")
-            logger.debug(f"Raw response: {response_text}")
 
-            # Parse response as DocumentMetadata
             try:
-                # Try to extract JSON from markdown code blocks if present
-                import re
-                json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-                if json_match:
-                    json_text = json_match.group(1)
-                else:
-                    # Try to find JSON object directly
-                    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                    if json_match:
-                        json_text = json_match.group(0)
-                    else:
-                        json_text = response_text
-
-                metadata = DocumentMetadata.model_validate_json(json_text)
-                logger.info(f"Successfully extracted metadata: {metadata.title}")
-                return metadata
-
-            except Exception as parse_error:
-                logger.error(f"Failed to parse Claude response as DocumentMetadata: {parse_error}")
-                logger.error(f"Response was: {response_text}")
-                raise RuntimeError(
-                    f"Claude response could not be parsed as valid metadata: {parse_error}"
-                )
+                metadata = parse_metadata_response(response)
+                break
+            except MetadataParseError as e:
+                if repair_round == self.max_repair_rounds:
+                    self._record_parse_outcome("failed")
+                    raise
+                logger.warning("Returning validation error to Claude for a repair round")
+                params = build_repair_params(params, response, e)
 
-        except Exception as e:
-            logger.error(f"Claude API call failed: {e}")
-            raise RuntimeError(f"Document analysis failed: {e}")
+        self._record_parse_outcome("valid_first_try" if repair_round == 0 else "repaired")
+        return metadata, input_tokens, output_tokens
+
+    def _summarize_chunks(
+        self,
+        text: str,
+        route: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Tuple[str, int, int]:
+        """
+        Map step: summarize the chunks of a long document in parallel.
+
+        Args:
+            text: Full document text
+            route: Routing decision the requests belong to
+            content_hash: SHA256 hash of the document
+
+        Returns:
+            Tuple of (merge input text, input tokens, output tokens)
+        """
+        chunks = split_into_chunks(text, self.chunk_tokens)
+        logger.info(f"Summarizing {len(chunks)} chunks ({self.map_workers} in parallel)...")
+
+        def summarize(indexed_chunk):
+            index, chunk = indexed_chunk
+            response = self._call({
+                "model": self.model,
+                "max_tokens": CHUNK_SUMMARY_TOKENS,
+                "system": CHUNK_SUMMARY_PROMPT,
+                "messages": [{
+                    "role": "user",
+                    "content": CHUNK_USER_TEMPLATE.format(index=index, total=len(chunks), text=chunk)
+                }]
+            }, route, content_hash, KIND_CHUNK)
+            summary = "".join(block.text for block in response.content if block.type == "text")
+            return summary.strip(), response.usage.input_tokens, response.usage.output_tokens
+
+        with ThreadPoolExecutor(max_workers=self.map_workers) as executor:
+            results = list(executor.map(summarize, enumerate(chunks, 1)))
+
+        # The opening keeps the original title and introduction verbatim
+        opening = truncate_to_tokens(chunks[0], min(1000, self.chunk_tokens))
+        parts = [f"<opening>\n{opening}\n</opening>"]
+        parts += [
+            f'<section_summary index="{index}">\n{summary}\n</section_summary>'
+            for index, (summary, _, _) in enumerate(results, 1)
+        ]
+
+        return (
+            "\n\n".join(parts),
+            sum(r[1] for r in results),
+            sum(r[2] for r in results)
+        )
+
+    def _record_parse_outcome(self, outcome: str) -> None:
+        """Count a structured-output outcome ('valid_first_try', 'repaired', 'failed')."""
+        with self._stats_lock:
+            self.parse_stats["responses"] += 1
+            self.parse_stats[outcome] += 1
+
+    def _record_usage(self, usage, latency: float) -> None:
+        """
+        Add a response's token usage to the running totals.
+
+        Args:
+            usage: response.usage of a Messages API call
+            latency: Wall-clock duration of the call in seconds
+        """
+        cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+
+        with self._stats_lock:
+            totals = self.usage_totals
+            totals["requests"] += 1
+            totals["input_tokens"] += usage.input_tokens
+            totals["output_tokens"] += usage.output_tokens
+            totals["cache_creation_input_tokens"] += cache_creation
+            totals["cache_read_input_tokens"] += cache_read
+            totals["latency_s"] += latency
+
+        logger.info(
+            f"Usage: {usage.input_tokens} in, {usage.output_tokens} out, "
+            f"cache write {cache_creation}, cache read {cache_read}, {latency:.2f}s"
+        )
+
+    def get_usage_stats(self) -> dict:
+        """
+        Get accumulated token usage, prompt cache effectiveness and latency.
+
+        Returns:
+            Dictionary with token totals, cache hit ratio and average latency
+        """
+        totals = dict(self.usage_totals)
+        prompt_tokens = (
+            totals["input_tokens"]
+            + totals["cache_creation_input_tokens"]
+            + totals["cache_read_input_tokens"]
+        )
+        totals["prompt_cache_read_ratio"] = (
+            round(totals["cache_read_input_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0
+        )
+        totals["avg_latency_s"] = (
+            round(totals["latency_s"] / totals["requests"], 3) if totals["requests"] else 0.0
+        )
+        return totals
+
+    def get_pack_stats(self) -> dict:
+        """
+        Get packing-mode statistics.
+
+        Returns:
+            Dictionary with pack counts, answered and retried documents and
+            the average number of documents per packed request
+        """
+        stats = dict(self.pack_stats)
+        stats["documents_per_request"] = (
+            round(stats["packed_documents"] / stats["packs"], 2) if stats["packs"] else 0.0
+        )
+        return stats
+
+    def get_parse_stats(self) -> dict:
+        """
+        Get structured-output outcomes and failure rates.
+
+        Returns:
+            Dictionary with counts, the first-pass failure rate (before repair)
+            and the final failure rate (after repair)
+        """
+        stats = dict(self.parse_stats)
+        responses = stats["responses"]
+        stats["first_pass_failure_rate"] = (
+            round((stats["repaired"] + stats["failed"]) / responses, 4) if responses else 0.0
+        )
+        stats["failure_rate"] = round(stats["failed"] / responses, 4) if responses else 0.0
+        return stats
 
     def get_model_info(self) -> dict:
         """
@@ -162,5 +1045,18 @@ Gib die Metadaten im korrekten JSON-Format zurück."""
         """
         return {
             "model": self.model,
-            "provider": "Anthropic Claude"
+            "provider": "Anthropic Claude",
+            "few_shot": self.few_shot,
+            "max_document_tokens": self.max_document_tokens,
+            "map_reduce": self.map_reduce,
+            "small_model": self.router.small_model if self.router else None
         }
+
+    def get_route_stats(self) -> dict:
+        """
+        Get per-route latency, token and cost statistics.
+
+        Returns:
+            Dictionary route -> statistics (empty without a router)
+        """
+        return self.router.get_stats() if self.router else {}
@@ -0,0 +1,437 @@
+"""
+Local metadata extraction without an LLM call.
+
+Used as a fast path for trivial or low-value documents (short lists,
+files consisting mostly of symbols), where a paid API call adds latency
+without adding information:
+
+- language: character trigram profiles (compact n-gram model)
+- keywords/topics: TF-IDF, with document frequencies from the corpus
+- title: first heading, else first line
+- summary: lead sentences, else the first list entries
+"""
+
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from .models import DocumentMetadata
+from .tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# Short reference texts per language; their trigram profiles form the model
+_LANGUAGE_SAMPLES = {
+    "de": (
+        "Die Dokumentation beschreibt, wie das System eingerichtet wird und welche Schritte "
+        "für den Betrieb notwendig sind. Wir haben die Ergebnisse der letzten Woche zusammengefasst "
+        "und werden die offenen Fragen in der nächsten Besprechung klären. Bitte prüfen Sie, ob "
+        "die Angaben vollständig sind, bevor der Bericht an die Abteilung weitergeleitet wird. "
+        "Außerdem sollten wir über die Kosten und den Zeitplan für das kommende Jahr sprechen. "
+        "Gestern habe ich mit meinen Kollegen eine kleine Liste geschrieben: Welche Daten fehlen noch, "
+        "wer kümmert sich um die Tests und warum ist die Anwendung manchmal so langsam? Nach dem "
+        "Mittagessen gehen wir gemeinsam durch die Stadt und kaufen Brot, Käse und frisches Gemüse. "
+        "Dieser Text enthält einige Beispiele aus verschiedenen Bereichen: Nachrichten über Wissenschaft "
+        "und Technik, Notizen zu Geschichte und Kultur, Briefe zwischen Freunden und eine kurze Geschichte "
+        "über eine Familie, die in ein neues Land gezogen ist. Jede Seite zeigt den Titel, den Autor, das "
+        "Datum und einige wichtige Wörter. Die Buchstaben, Symbole und Sonderzeichen im Text werden gezählt, "
+        "und die Ergebnisse werden in eine Tabelle geschrieben, damit man sie mit anderen Dokumenten "
+        "derselben Art vergleichen kann."
+    ),
+    "en": (
+        "The documentation describes how the system is set up and which steps are required "
+        "for operation. We have summarized the results of the last week and will answer the "
+        "open questions in the next meeting. Please check whether the information is complete "
+        "before the report is forwarded to the department. We should also talk about the costs "
+        "and the schedule for the coming year, which will be shared with everyone. "
+        "Yesterday I wrote a short list with my colleagues: which data is still missing, who is "
+        "taking care of the tests and why the application is sometimes so slow? After lunch we are "
+        "going through the city together, buying bread, cheese and fresh vegetables for the weekend. "
+        "This text contains a number of examples from different areas: news about science and technology, "
+        "notes on history and culture, letters between friends, and a short story about a family that "
+        "moved to a new country. Each page shows the title, the author, the date and a few important "
+        "words. The characters, symbols and special signs in the text are counted, and the results are "
+        "written into a table so that they can be compared with other documents of the same kind."
+    ),
+    "fr": (
+        "La documentation décrit comment le système est installé et quelles étapes sont "
+        "nécessaires pour son fonctionnement. Nous avons résumé les résultats de la semaine "
+        "dernière et nous répondrons aux questions ouvertes lors de la prochaine réunion. "
+        "Veuillez vérifier que les informations sont complètes avant que le rapport ne soit "
+        "transmis au service. Nous devrions aussi parler des coûts et du calendrier de l'année. "
+        "Hier, j'ai écrit une petite liste avec mes collègues : quelles données manquent encore, qui "
+        "s'occupe des tests et pourquoi l'application est parfois si lente ? Après le déjeuner, nous "
+        "traversons la ville ensemble et achetons du pain, du fromage et des légumes frais. "
+        "Ce texte contient plusieurs exemples de domaines différents : des nouvelles sur la science et la "
+        "technique, des notes sur l'histoire et la culture, des lettres entre amis et une courte histoire "
+        "sur une famille qui s'est installée dans un nouveau pays. Chaque page montre le titre, l'auteur, "
+        "la date et quelques mots importants. Les lettres, les symboles et les caractères spéciaux du texte "
+        "sont comptés, et les résultats sont écrits dans un tableau afin de pouvoir les comparer avec "
+        "d'autres documents du même genre."
+    ),
+    "es": (
+        "La documentación describe cómo se configura el sistema y qué pasos son necesarios "
+        "para su funcionamiento. Hemos resumido los resultados de la semana pasada y "
+        "responderemos las preguntas abiertas en la próxima reunión. Por favor, compruebe que "
+        "la información esté completa antes de que el informe se envíe al departamento. "
+        "También deberíamos hablar de los costes y del calendario para el próximo año. "
+        "Ayer escribí una pequeña lista con mis compañeros: qué datos faltan todavía, quién se "
+        "encarga de las pruebas y por qué la aplicación a veces es tan lenta. Después de comer "
+        "caminamos juntos por la ciudad y compramos pan, queso y verduras frescas. "
+        "Este texto contiene varios ejemplos de distintos ámbitos: noticias sobre ciencia y tecnología, "
+        "notas sobre historia y cultura, cartas entre amigos y una breve historia sobre una familia que se "
+        "mudó a un nuevo país. Cada página muestra el título, el autor, la fecha y algunas palabras "
+        "importantes. Las letras, los símbolos y los caracteres especiales del texto se cuentan, y los "
+        "resultados se escriben en una tabla para poder compararlos con otros documentos del mismo tipo."
+    ),
+    "it": (
+        "La documentazione descrive come viene configurato il sistema e quali passaggi sono "
+        "necessari per il funzionamento. Abbiamo riassunto i risultati della settimana scorsa e "
+        "risponderemo alle domande aperte nella prossima riunione. Si prega di verificare che le "
+        "informazioni siano complete prima che il rapporto venga inoltrato al reparto. Dovremmo "
+        "anche parlare dei costi e del calendario per il prossimo anno. "
+        "Ieri ho scritto una piccola lista con i miei colleghi: quali dati mancano ancora, chi si "
+        "occupa dei test e perché l'applicazione a volte è così lenta? Dopo pranzo camminiamo "
+        "insieme per la città e compriamo pane, formaggio e verdure fresche. "
+        "Questo testo contiene alcuni esempi di ambiti diversi: notizie sulla scienza e sulla tecnologia, "
+        "appunti sulla storia e sulla cultura, lettere tra amici e un breve racconto su una famiglia che si "
+        "è trasferita in un nuovo paese. Ogni pagina mostra il titolo, l'autore, la data e alcune parole "
+        "importanti. Le lettere, i simboli e i caratteri speciali del testo vengono contati e i risultati "
+        "vengono scritti in una tabella, così da poterli confrontare con altri documenti dello stesso tipo."
+    ),
+    "nl": (
+        "De documentatie beschrijft hoe het systeem wordt ingericht en welke stappen nodig zijn "
+        "voor de werking. We hebben de resultaten van de afgelopen week samengevat en zullen de "
+        "openstaande vragen in de volgende vergadering beantwoorden. Controleer of de gegevens "
+        "volledig zijn voordat het rapport naar de afdeling wordt doorgestuurd. We moeten ook "
+        "praten over de kosten en de planning voor het komende jaar. "
+        "Gisteren heb ik met mijn collega's een korte lijst geschreven: welke gegevens ontbreken nog, "
+        "wie zorgt voor de tests en waarom is de toepassing soms zo traag? Na de lunch lopen we samen "
+        "door de stad en kopen we brood, kaas en verse groenten. "
+        "Deze tekst bevat enkele voorbeelden uit verschillende gebieden: nieuws over wetenschap en techniek, "
+        "aantekeningen over geschiedenis en cultuur, brieven tussen vrienden en een kort verhaal over een "
+        "gezin dat naar een nieuw land is verhuisd. Elke pagina toont de titel, de auteur, de datum en "
+        "enkele belangrijke woorden. De letters, symbolen en speciale tekens in de tekst worden geteld, en "
+        "de resultaten worden in een tabel geschreven, zodat ze met andere documenten van dezelfde soort "
+        "kunnen worden vergeleken."
+    ),
+}
+
+_STOPWORDS = {
+    "de": "aber alle als also am an auch auf aus bei bin bis bitte da damit dann das dass dem den der des die dies diese dieser doch dort du durch ein eine einem einen einer eines er es für hat hatte haben hier ich ihr im in ist ja jede kann kein man mehr mit nach nicht noch nur ob oder sich sie sind so über um und uns unter vom von vor war wenn werden wie wir wird wo zu zum zur",
+    "en": "a about after all also an and any are as at be been but by can could do does for from had has have he her his how i if in into is it its just may more most no not of on one or our out over she so some such than that the their them then there these they this to up was we were what when which while who will with would you your",
+    "fr": "au aux avec ce ces dans de des du elle en est et il ils je la le les leur lui mais me même mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous",
+    "es": "al como con de del el ella en es esta este la las le lo los más mi no nos o para pero por que se si sin su sus también te tu un una y ya",
+    "it": "a al alla anche che ci come con da del della di e gli ha ho il in la le lo ma mi ne non per più se si sono su un una",
+    "nl": "aan al bij dat de den der deze die dit door een en er had heb het hij hoe in is je maar met niet nog of om ook op over te tot uit van voor was wat we wel zij zijn",
+}
+STOPWORDS = {word for words in _STOPWORDS.values() for word in words.split()}
+
+_WORD_RE = re.compile(r"[^\W\d_][\w'-]*", re.UNICODE)
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$", re.MULTILINE)
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+•→]|\d+[.)])\s+(.*\S)")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-ZÄÖÜ0-9])")
+
+
+def _trigrams(text: str) -> Counter:
+    """Character trigram counts of the letters-only, lowercased text."""
+    counts = Counter()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            counts[padded[i:i + 3]] += 1
+    return counts
+
+
+_PROFILES = {language: _trigrams(sample) for language, sample in _LANGUAGE_SAMPLES.items()}
+_PROFILE_TOTALS = {language: sum(profile.values()) for language, profile in _PROFILES.items()}
+_STOPWORD_SETS = {language: set(words.split()) for language, words in _STOPWORDS.items()}
+
+# Additive smoothing for unseen trigrams, and the assumed trigram vocabulary size
+_SMOOTHING = 0.5
+_VOCABULARY = 5000
+# Log-likelihood bonus per stopword of a language (strong evidence in short texts)
+_STOPWORD_WEIGHT = 2.0
+# Below this confidence the runner-up is nearly as likely, and the default is returned
+MIN_LANGUAGE_CONFIDENCE = 0.5
+
+
+def detect_language(
+    text: str,
+    default: str = "en",
+    min_confidence: float = MIN_LANGUAGE_CONFIDENCE
+) -> Tuple[str, float]:
+    """
+    Detect the language of a text from character trigrams.
+
+    Naive Bayes over the trigram profiles, plus a bonus per stopword.
+
+    Args:
+        text: Input text
+        default: Language returned when the text has too little evidence
+        min_confidence: Confidence below which the default is returned
+            (e.g. a few words between symbols)
+
+    Returns:
+        Tuple of (ISO 639-1 code, confidence between 0 and 1)
+    """
+    sample = text[:5000]
+    grams = _trigrams(sample)
+    if sum(grams.values()) < 10:
+        return default, 0.0
+
+    words = [word.lower() for word in _WORD_RE.findall(sample)]
+    scores = {}
+    for language, profile in _PROFILES.items():
+        denominator = _PROFILE_TOTALS[language] + _SMOOTHING * _VOCABULARY
+        scores[language] = sum(
+            count * math.log((profile.get(gram, 0) + _SMOOTHING) / denominator)
+            for gram, count in grams.items()
+        ) + _STOPWORD_WEIGHT * sum(word in _STOPWORD_SETS[language] for word in words)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best, best_score = ranked[0]
+    # Confidence from the log-likelihood margin to the runner-up
+    confidence = round(1 - math.exp(-(best_score - ranked[1][1]) / 4), 3)
+    if confidence < min_confidence:
+        return default, confidence
+    return best, confidence
+
+
+def extract_title(text: str, max_length: int = 120) -> str:
+    """
+    Take the first Markdown heading, else the first non-empty line.
+
+    Args:
+        text: Document text
+        max_length: Maximum title length
+
+    Returns:
+        Title string ("Untitled" for empty text)
+    """
+    match = _HEADING_RE.search(text)
+    if match:
+        title = match.group(1)
+    else:
+        title = next((line.strip() for line in text.splitlines() if line.strip()), "Untitled")
+    title = title.strip().rstrip(":").strip() or "Untitled"
+    return title if len(title) <= max_length else title[:max_length - 3].rstrip() + "..."
+
+
+def extract_summary(text: str, title: str, max_sentences: int = 2, max_length: int = 300) -> str:
+    """
+    Build a summary from the lead sentences (or the first list entries).
+
+    Args:
+        text: Document text
+        title: Extracted title (skipped in the body)
+        max_sentences: Number of lead sentences
+        max_length: Maximum summary length
+
+    Returns:
+        Summary string
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    body = [line for line in lines if line.lstrip("#").strip().rstrip(":").strip() != title]
+
+    items = [m.group(1) for m in (_LIST_ITEM_RE.match(line) for line in body) if m]
+    prose = " ".join(
+        line for line in body
+        if not _LIST_ITEM_RE.match(line) and not line.startswith("#") and len(_WORD_RE.findall(line)) >= 4
+    )
+
+    if prose:
+        summary = " ".join(_SENTENCE_END_RE.split(prose)[:max_sentences])
+    elif items:
+        summary = f"{title}: {', '.join(items)}"
+    else:
+        summary = " ".join(body) or title
+
+    return summary if len(summary) <= max_length else summary[:max_length - 3].rstrip() + "..."
+
+
+def _is_symbol_line(line: str, max_words: int = 4) -> bool:
+    """A short line that carries symbols, arrows, currency signs or emoji."""
+    words = [word for word in _WORD_RE.findall(line) if len(word) >= 2]
+    if len(words) > max_words:
+        return False
+    return any(
+        unicodedata.category(ch).startswith("S") or ch in "•·"
+        for ch in line
+    )
+
+
+class LocalExtractor:
+    """Extracts DocumentMetadata locally (no API call)"""
+
+    def __init__(self, corpus: Optional[Iterable[str]] = None, max_keywords: int = 8):
+        """
+        Initialize extractor.
+
+        Args:
+            corpus: Document texts used for inverse document frequencies
+            max_keywords: Number of keywords to extract
+        """
+        self.max_keywords = max_keywords
+        self.document_count = 0
+        self.document_frequency = Counter()
+        for text in corpus or []:
+            self.add_to_corpus(text)
+
+    def add_to_corpus(self, text: str) -> None:
+        """
+        Count a document's terms for the inverse document frequencies.
+
+        Args:
+            text: Document text
+        """
+        self.document_count += 1
+        self.document_frequency.update(set(self._terms(text)))
+
+    @staticmethod
+    def _terms(text: str):
+        return [
+            word for word in (w.lower() for w in _WORD_RE.findall(text))
+            if len(word) >= 3 and word not in STOPWORDS
+        ]
+
+    def extract_keywords(self, text: str) -> list:
+        """
+        Rank the document's terms by TF-IDF.
+
+        Args:
+            text: Document text
+
+        Returns:
+            Keywords, best first (original spelling of the first occurrence)
+        """
+        terms = self._terms(text)
+        if not terms:
+            return []
+
+        spelling = {}
+        for word in _WORD_RE.findall(text):
+            spelling.setdefault(word.lower(), word)
+
+        counts = Counter(terms)
+        total = len(terms)
+        scores = {
+            term: (count / total) * (
+                math.log((1 + self.document_count) / (1 + self.document_frequency[term])) + 1
+            )
+            for term, count in counts.items()
+        }
+        ranked = sorted(scores, key=lambda term: (-scores[term], terms.index(term)))
+        return [spelling[term] for term in ranked[:self.max_keywords]]
+
+    def extract(self, text: str) -> DocumentMetadata:
+        """
+        Extract metadata from a document.
+
+        Args:
+            text: Document text
+
+        Returns:
+            DocumentMetadata built from local heuristics
+
+        Raises:
+            ValueError: If text is empty
+        """
+        if not text or not text.strip():
+            raise ValueError("Cannot analyze empty text")
+
+        title = extract_title(text)
+        language, _ = detect_language(text)
+        keywords = self.extract_keywords(text)
+
+        return DocumentMetadata(
+            title=title,
+            language=language,
+            topics=keywords[:3],
+            summary=extract_summary(text, title),
+            keywords=keywords
+        )
+
+
+class FastPathPolicy:
+    """Decides when a document is analyzed locally instead of by the LLM"""
+
+    def __init__(
+        self,
+        max_list_tokens: int = 120,
+        min_list_share: float = 0.6,
+        max_trivial_tokens: int = 25,
+        min_word_share: float = 0.5,
+        max_symbol_tokens: int = 300,
+        min_symbol_line_share: float = 0.5,
+        min_language_confidence: float = MIN_LANGUAGE_CONFIDENCE
+    ):
+        """
+        Initialize policy.
+
+        Args:
+            max_list_tokens: Largest document still treated as a short list
+            min_list_share: Share of non-empty lines that must be list items
+            max_trivial_tokens: Documents up to this size are always analyzed locally
+            min_word_share: Below this share of characters in words, a document
+                counts as mostly symbols
+            max_symbol_tokens: Largest document checked for symbol-dominated lines
+            min_symbol_line_share: Share of short lines carrying symbols/emoji from
+                which such a document counts as mostly symbols
+            min_language_confidence: Lists and symbol documents whose language is
+                detected with less confidence are left to the LLM
+        """
+        self.max_list_tokens = max_list_tokens
+        self.min_list_share = min_list_share
+        self.max_trivial_tokens = max_trivial_tokens
+        self.min_word_share = min_word_share
+        self.max_symbol_tokens = max_symbol_tokens
+        self.min_symbol_line_share = min_symbol_line_share
+        self.min_language_confidence = min_language_confidence
+
+    def decide(self, text: str) -> Tuple[bool, str]:
+        """
+        Decide whether the LLM can be skipped.
+
+        Args:
+            text: Document text
+
+        Returns:
+            Tuple of (use local extraction, reason)
+        """
+        tokens = estimate_tokens(text)
+        if tokens <= self.max_trivial_tokens:
+            return True, "trivial"
+
+        reason = self._local_reason(text, tokens)
+        if reason is None:
+            return False, "llm"
+        # The local extractor would store a guessed language
+        _, confidence = detect_language(text)
+        if confidence < self.min_language_confidence:
+            return False, "ambiguous_language"
+        return True, reason
+
+    def _local_reason(self, text: str, tokens: int) -> Optional[str]:
+        """Why a non-trivial document can be analyzed locally, or None."""
+        lines = [line for line in text.splitlines() if line.strip()]
+        list_items = sum(1 for line in lines if _LIST_ITEM_RE.match(line))
+        if tokens <= self.max_list_tokens and lines and list_items / len(lines) >= self.min_list_share:
+            return "short_list"
+
+        # Letters of real words (2+ characters) vs. all non-space characters
+        visible = sum(1 for ch in text if not ch.isspace())
+        in_words = sum(len(word) for word in _WORD_RE.findall(text) if len(word) >= 2)
+        if visible and in_words / visible < self.min_word_share:
+            return "mostly_symbols"
+
+        if tokens <= self.max_symbol_tokens and lines:
+            symbolic = sum(1 for line in lines if _is_symbol_line(line))
+            if symbolic / len(lines) >= self.min_symbol_line_share:
+                return "mostly_symbols"
+
+        return None
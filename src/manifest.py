@@ -0,0 +1,253 @@
+"""
+File manifest for incremental re-scans.
+
+The file_manifest table remembers, per path, the size, modification time
+(ns) and inode a file had when its content hash was last computed. A re-scan
+only stats the files: unchanged entries are skipped without opening them,
+and only new or modified files are read. A new path whose stat matches a
+vanished entry (same inode, size and mtime), or whose content hash does, is
+reported as a rename of that entry. Entries of files that were stored as a
+document also keep its id, so a new revision can replace it.
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ScanResult:
+    """Files of a re-scan, split by what happened to them since the last scan"""
+
+    def __init__(self):
+        self.unchanged: List[Path] = []
+        self.new: List[Path] = []
+        self.changed: List[Path] = []
+        # (old path, new path) pairs recognized by stat
+        self.renamed: List[Tuple[str, Path]] = []
+
+    @property
+    def to_read(self) -> List[Path]:
+        """Files that have to be opened (new or modified)."""
+        return self.new + self.changed
+
+
+class FileManifest:
+    """
+    Persistent stat and hash record of scanned files.
+
+    Schema:
+        - file_manifest: One row per path with size, mtime_ns, inode, content hash
+          and the id of the document stored from it (NULL if none, e.g. a duplicate)
+    """
+
+    def __init__(self, db_path: str = "archaeologist.db"):
+        """
+        Initialize database connection.
+
+        Args:
+            db_path: Path to SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+
+        try:
+            # Shared by worker threads; access is serialized by self._lock
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the manifest table if it doesn't exist."""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_manifest (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    doc_id INTEGER
+                )
+            """)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(file_manifest)")}
+            if "doc_id" not in columns:
+                self.conn.execute("ALTER TABLE file_manifest ADD COLUMN doc_id INTEGER")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_manifest_hash ON file_manifest(content_hash)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_manifest_inode ON file_manifest(inode)")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize file manifest: {e}")
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        """Absolute path used as manifest key (no filesystem access)."""
+        return os.path.abspath(path)
+
+    def _entries(self) -> Dict[str, Tuple[int, int, int, str]]:
+        """All entries as path -> (size, mtime_ns, inode, content_hash)."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime_ns, inode, content_hash FROM file_manifest"
+            ).fetchall()
+        return {row["path"]: (row["size"], row["mtime_ns"], row["inode"], row["content_hash"]) for row in rows}
+
+    def doc_ids(self, files: Iterable[Path]) -> Dict[str, int]:
+        """
+        Documents stored from files (e.g. the previous revision of edited files).
+
+        Args:
+            files: Files to look up
+
+        Returns:
+            str(path) -> document id, for the files a document was stored from
+        """
+        doc_ids = {}
+        with self._lock:
+            for path in files:
+                row = self.conn.execute(
+                    "SELECT doc_id FROM file_manifest WHERE path = ?", (self._key(path),)
+                ).fetchone()
+                if row is not None and row["doc_id"] is not None:
+                    doc_ids[str(path)] = row["doc_id"]
+        return doc_ids
+
+    def scan(self, files: Iterable[Path]) -> ScanResult:
+        """
+        Classify files by stat alone, without reading them.
+
+        Renames recognized by stat are applied to the manifest right away.
+
+        Args:
+            files: Files found by the current scan
+
+        Returns:
+            ScanResult with unchanged, new, changed and renamed files
+        """
+        entries = self._entries()
+        result = ScanResult()
+        unmatched = []
+
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = entries.get(self._key(path))
+            if entry is None:
+                unmatched.append((path, stat))
+            elif entry[:3] == (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+                result.unchanged.append(path)
+            else:
+                result.changed.append(path)
+
+        if unmatched:
+            # Vanished entries by (size, mtime, inode): a new path with the same stat is the same file
+            vanished = {
+                entry[:3]: key for key, entry in entries.items() if entry[2] and not os.path.exists(key)
+            }
+            for path, stat in unmatched:
+                old = vanished.pop((stat.st_size, stat.st_mtime_ns, stat.st_ino), None)
+                if old is None:
+                    result.new.append(path)
+                else:
+                    self._move(old, path)
+                    result.renamed.append((old, path))
+                    result.unchanged.append(path)
+
+        return result
+
+    def record(self, path: Path, content_hash: str, doc_id: Optional[int] = None) -> Optional[str]:
+        """
+        Record the current stat and content hash of a file that was read.
+
+        A vanished entry with the same content hash is taken over, i.e. the
+        file was renamed (and possibly touched), along with its document id.
+
+        Args:
+            path: File that was read
+            content_hash: SHA256 hash of its content
+            doc_id: Document stored from this file (None if it was not stored, e.g. a duplicate)
+
+        Returns:
+            Old path if the file is recognized as a rename, otherwise None
+        """
+        stat = os.stat(path)
+        key = self._key(path)
+
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, doc_id FROM file_manifest WHERE content_hash = ? AND path != ?", (content_hash, key)
+            ).fetchall()
+        renamed = next((row for row in rows if not os.path.exists(row["path"])), None)
+        renamed_from = renamed["path"] if renamed is not None else None
+        if doc_id is None and renamed is not None:
+            doc_id = renamed["doc_id"]
+
+        with self._lock:
+            try:
+                if renamed_from is not None:
+                    self.conn.execute("DELETE FROM file_manifest WHERE path = ?", (renamed_from,))
+                self.conn.execute(
+                    """INSERT OR REPLACE INTO file_manifest (path, size, mtime_ns, inode, content_hash, doc_id)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (key, stat.st_size, stat.st_mtime_ns, stat.st_ino, content_hash, doc_id)
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to update file manifest: {e}")
+        return renamed_from
+
+    def _move(self, old: str, new: Path) -> None:
+        """Re-key an entry to a file's new path."""
+        with self._lock:
+            try:
+                self.conn.execute(
+                    "UPDATE OR REPLACE file_manifest SET path = ?, updated_at = CURRENT_TIMESTAMP WHERE path = ?",
+                    (self._key(new), old)
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to update file manifest: {e}")
+
+    def prune(self, root: Path) -> int:
+        """
+        Drop entries of files below a directory that no longer exist.
+
+        Args:
+            root: Scanned directory
+
+        Returns:
+            Number of removed entries
+        """
+        prefix = self._key(root).rstrip(os.sep) + os.sep
+        gone = [key for key in self._entries() if key.startswith(prefix) and not os.path.exists(key)]
+        if gone:
+            with self._lock:
+                try:
+                    self.conn.executemany("DELETE FROM file_manifest WHERE path = ?", ((key,) for key in gone))
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    self.conn.rollback()
+                    raise RuntimeError(f"Failed to update file manifest: {e}")
+        return len(gone)
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
@@ -33,3 +33,25 @@ class DocumentMetadata(BaseModel):
                 "keywords": ["ML", "supervised learning", "training data", "model"]
             }
         }
+
+
+class KeyedDocumentMetadata(DocumentMetadata):
+    """
+    DocumentMetadata tagged with the id of the document it belongs to.
+
+    Used when several documents are analyzed in one request.
+
+    Attributes:
+        doc_id: Id of the document as given in the request
+    """
+    doc_id: str = Field(..., description="Id of the document exactly as given in the request")
+
+
+class PackedMetadata(BaseModel):
+    """
+    Metadata for several documents analyzed in one request.
+
+    Attributes:
+        documents: One entry per document, keyed by doc_id
+    """
+    documents: List[KeyedDocumentMetadata] = Field(..., description="One metadata entry per document")
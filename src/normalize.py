@@ -0,0 +1,256 @@
+"""
+Text normalization ahead of embedding and analysis.
+
+Exports from Confluence and chat tools carry a lot of text that says
+nothing about the document: inline base64 images, navigation and page
+chrome, headers repeated on every page, whitespace runs. TextNormalizer
+removes it before the text is embedded or sent to Claude.
+
+Documents are stored and hashed as read (documents.content_hash stays the
+hash of the file content); only the derived text is normalized. Because
+normalization is deterministic for a given configuration, the LLM cache,
+which is keyed by the analyzed text, stays stable across runs.
+"""
+
+import re
+import threading
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from .tokens import estimate_tokens
+
+
+# Inline images: Markdown, HTML and bare data URIs, plus long base64 lines
+_MARKDOWN_DATA_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\(\s*data:[^)]*\)")
+_HTML_DATA_IMAGE_RE = re.compile(r"<img\b[^>]*\bsrc\s*=\s*[\"']data:[^\"']*[\"'][^>]*>", re.IGNORECASE)
+_DATA_URI_RE = re.compile(r"data:[\w/+.-]+;base64,[A-Za-z0-9+/=\s]{64,}")
+_BASE64_LINE_RE = re.compile(r"^[ \t]*[A-Za-z0-9+/]{200,}={0,2}[ \t]*$", re.MULTILINE)
+
+_HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_INVISIBLE_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+_INNER_SPACE_RE = re.compile("(?<=\\S)[ \t\u00a0]{2,}")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+# Page chrome of Confluence exports and chat transcripts (English and German UI)
+DEFAULT_BOILERPLATE_PATTERNS = (
+    r"(Skip to end of metadata|Go to start of metadata)",
+    r"(Zum Ende der Metadaten springen|Zum Anfang der Metadaten wechseln|Zum Anfang der Metadaten springen)",
+    r"(Created by|Erstellt von) .{1,80}(last modified|last updated|zuletzt geändert|zuletzt aktualisiert).*",
+    r"(Jump to|Springe zu|Wechseln zu):? *(navigation|search|Navigation|Suche).*",
+    r"(Powered by|Printed by|Bereitgestellt von) Atlassian Confluence.*",
+    r"(Report a bug|Atlassian News|Fehler melden|Atlassian-Neuigkeiten)",
+    r"(No labels|Keine Stichwörter|Keine Labels)",
+    r"(Be the first to like this|Sei der Erste, dem das gefällt)",
+)
+
+# Button labels of the same exports; as single words they are only removed from
+# documents that also carry one of the lines above
+UI_LABEL_PATTERNS = (
+    r"(Like|Gefällt mir)",
+    r"(Copy code|Code kopieren|Copy|Kopieren|Share|Teilen|Edit|Bearbeiten)",
+)
+
+
+def _line_re(patterns: Iterable[str]) -> re.Pattern:
+    """Whole-line expression for the patterns, allowing quote and emphasis markers around them."""
+    return re.compile(r"[ \t>*_]*(?:" + "|".join(patterns) + r")[ \t*_\r]*", re.IGNORECASE)
+
+
+class TextNormalizer:
+    """
+    Removes noise from document text before embedding and analysis.
+
+    Each stage can be switched off; additional boilerplate line patterns
+    can be supplied. Statistics over all processed documents are kept for
+    reporting.
+    """
+
+    def __init__(
+        self,
+        strip_images: bool = True,
+        strip_boilerplate: bool = True,
+        strip_repeated_lines: bool = True,
+        collapse_whitespace: bool = True,
+        boilerplate_patterns: Optional[Iterable[str]] = None,
+        min_repeats: int = 3,
+        min_repeated_line_chars: int = 15
+    ):
+        """
+        Initialize normalizer.
+
+        Args:
+            strip_images: Replace inline base64 images and data URIs with a short placeholder
+            strip_boilerplate: Drop HTML comments and lines matching boilerplate patterns
+                (outside code blocks; headings and list items are never matched)
+            strip_repeated_lines: Keep only the first occurrence of lines repeated many times
+                (page headers/footers); table rows and code blocks are left alone
+            collapse_whitespace: Remove invisible characters, trailing blanks, runs of
+                blanks inside lines and runs of empty lines
+            boilerplate_patterns: Extra regular expressions for whole boilerplate lines
+            min_repeats: Occurrences from which a line counts as repeated
+            min_repeated_line_chars: Shorter lines are never treated as repeated
+
+        Raises:
+            ValueError: If min_repeats is below 2 or a pattern is not a valid expression
+        """
+        if min_repeats < 2:
+            raise ValueError("min_repeats must be at least 2")
+
+        self.strip_images = strip_images
+        self.strip_boilerplate = strip_boilerplate
+        self.strip_repeated_lines = strip_repeated_lines
+        self.collapse_whitespace = collapse_whitespace
+        self.min_repeats = min_repeats
+        self.min_repeated_line_chars = min_repeated_line_chars
+
+        patterns = list(DEFAULT_BOILERPLATE_PATTERNS) + list(boilerplate_patterns or ())
+        try:
+            self._boilerplate_re = _line_re(patterns)
+            self._label_re = _line_re(UI_LABEL_PATTERNS)
+        except re.error as e:
+            raise ValueError(f"Invalid boilerplate pattern: {e}")
+
+        self._lock = threading.Lock()
+        self.stats = {"documents": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def normalize(self, text: str) -> str:
+        """
+        Normalize a document (without touching the statistics).
+
+        Args:
+            text: Document content as read
+
+        Returns:
+            Normalized text; the original text if nothing would be left
+        """
+        return self._normalize(text)[0]
+
+    def process(self, text: str) -> Tuple[str, dict]:
+        """
+        Normalize a document and report what was removed.
+
+        Args:
+            text: Document content as read
+
+        Returns:
+            Tuple of (normalized text, report with removed images, boilerplate
+            and repeated lines, and estimated tokens before/after/saved)
+        """
+        result, report = self._normalize(text)
+
+        report["tokens_before"] = estimate_tokens(text)
+        report["tokens_after"] = estimate_tokens(result)
+        report["tokens_saved"] = report["tokens_before"] - report["tokens_after"]
+
+        with self._lock:
+            self.stats["documents"] += 1
+            self.stats["tokens_before"] += report["tokens_before"]
+            self.stats["tokens_after"] += report["tokens_after"]
+
+        return result, report
+
+    def _normalize(self, text: str) -> Tuple[str, dict]:
+        """Run the enabled stages; returns the text and the removal counts."""
+        report = {"images": 0, "boilerplate_lines": 0, "repeated_lines": 0}
+        result = text
+
+        if self.strip_images:
+            result, report["images"] = self._strip_images(result)
+        if self.strip_boilerplate:
+            result = _HTML_COMMENT_RE.sub("", result)
+            result, report["boilerplate_lines"] = self._strip_boilerplate(result)
+        if self.strip_repeated_lines:
+            result, report["repeated_lines"] = self._strip_repeated_lines(result)
+        if self.collapse_whitespace:
+            result = self._collapse_whitespace(result)
+
+        if not result.strip():
+            result = text
+        return result, report
+
+    @staticmethod
+    def _strip_images(text: str) -> Tuple[str, int]:
+        """Replace inline images with '[Bild: alt]' placeholders."""
+        text, markdown = _MARKDOWN_DATA_IMAGE_RE.subn(
+            lambda match: f"[Bild: {match.group(1)}]" if match.group(1).strip() else "[Bild]", text
+        )
+        text, html = _HTML_DATA_IMAGE_RE.subn("[Bild]", text)
+        text, bare = _DATA_URI_RE.subn("[Daten]", text)
+        text, lines = _BASE64_LINE_RE.subn("", text)
+        return text, markdown + html + bare + lines
+
+    def _strip_boilerplate(self, text: str) -> Tuple[str, int]:
+        """Drop boilerplate lines outside code blocks, and UI labels of documents that have some."""
+        lines = text.split("\n")
+        prose, in_code = [], False
+        for index, line in enumerate(lines):
+            if _FENCE_RE.match(line):
+                in_code = not in_code
+            elif not in_code:
+                prose.append(index)
+
+        chrome = {index for index in prose if self._boilerplate_re.fullmatch(lines[index])}
+        if chrome:
+            chrome |= {index for index in prose if self._label_re.fullmatch(lines[index])}
+        if not chrome:
+            return text, 0
+        return "\n".join(line for index, line in enumerate(lines) if index not in chrome), len(chrome)
+
+    def _strip_repeated_lines(self, text: str) -> Tuple[str, int]:
+        """Drop all but the first occurrence of frequently repeated lines outside code and tables."""
+        lines = text.split("\n")
+        candidates = Counter()
+        in_code = False
+        for line in lines:
+            if _FENCE_RE.match(line):
+                in_code = not in_code
+                continue
+            key = line.strip()
+            if not in_code and len(key) >= self.min_repeated_line_chars and not key.startswith("|"):
+                candidates[key] += 1
+
+        repeated = {key for key, count in candidates.items() if count >= self.min_repeats}
+        if not repeated:
+            return text, 0
+
+        kept, seen, removed, in_code = [], set(), 0, False
+        for line in lines:
+            if _FENCE_RE.match(line):
+                in_code = not in_code
+            key = line.strip()
+            if not in_code and key in repeated:
+                if key in seen:
+                    removed += 1
+                    continue
+                seen.add(key)
+            kept.append(line)
+        return "\n".join(kept), removed
+
+    @staticmethod
+    def _collapse_whitespace(text: str) -> str:
+        """Remove invisible characters and blank runs; indentation and code blocks are kept."""
+        text = _INVISIBLE_RE.sub("", text.replace("\r\n", "\n").replace("\r", "\n"))
+        lines, in_code = [], False
+        for line in text.split("\n"):
+            if _FENCE_RE.match(line):
+                in_code = not in_code
+            elif not in_code:
+                line = _INNER_SPACE_RE.sub(" ", line)
+            lines.append(line.rstrip())
+        return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+    def get_stats(self) -> dict:
+        """
+        Get totals over all processed documents.
+
+        Returns:
+            Dictionary with documents, estimated tokens before/after, tokens saved and saved ratio
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+        stats["saved_ratio"] = (
+            round(stats["tokens_saved"] / stats["tokens_before"], 4) if stats["tokens_before"] else 0.0
+        )
+        return stats
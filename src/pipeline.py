@@ -0,0 +1,614 @@
+"""
+Concurrent staged ingestion of many documents.
+
+Documents flow through bounded queues between the stages
+
+    paths -> read/extract/hash (threads) -> embed (batched) -> analyze (threads) -> store (batched)
+
+so reading and embedding continue while Claude calls are in flight, and a
+full queue makes the stage before it wait (backpressure). The store stage
+runs on the thread that calls IngestPipeline.run(), which keeps the SQLite
+connection of DocDatabase on the thread that created it. PDF, DOCX, HTML and
+CSV files are converted to text in the worker processes of an ExtractorPool
+(src/extractors.py) before they are hashed. Archive members and NDJSON records
+(SourceDocument from src/sources.py) can be passed in place of paths.
+
+With a JobQueue, each file's progress is saved as it passes the stages; a run
+over the same job skips stored files and reuses saved embeddings and
+metadata, so an interrupted run resumes where it stopped.
+"""
+
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .database import DocDatabase
+from .dedup import NearDuplicateIndex, patch_metadata
+from .embedder import LocalEmbedder
+from .jobs import ITEM_ANALYZED, ITEM_EMBEDDED, ITEM_SKIPPED, ITEM_STORED, JobQueue, WorkItem
+from .llm import Analyzer
+from .local_extractor import FastPathPolicy, LocalExtractor
+from .normalize import TextNormalizer
+from .extractors import ExtractorPool, extract_document
+from .sources import SourceDocument
+
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input
+_DONE = object()
+
+# Stage names, in pipeline order
+STAGE_READ = "read"
+STAGE_EMBED = "embed"
+STAGE_ANALYZE = "analyze"
+STAGE_STORE = "store"
+STAGES = (STAGE_READ, STAGE_EMBED, STAGE_ANALYZE, STAGE_STORE)
+
+
+class PipelineItem:
+    """One document on its way through the pipeline"""
+
+    def __init__(self, path: Path):
+        """
+        Initialize item.
+
+        Args:
+            path: Source file
+        """
+        self.path = path
+        self.content: Optional[str] = None
+        self.content_hash: Optional[str] = None
+        self.canonical_hash: Optional[str] = None
+        self.text: Optional[str] = None
+        self.tokens_saved = 0
+        self.embedding: Optional[List[float]] = None
+        self.signature = None
+        self.duplicate = None
+        self.metadata = None
+        self.extraction_path: Optional[str] = None
+        self.error: Optional[str] = None
+        self.skip: Optional[str] = None
+        self.work_id: Optional[int] = None
+        self.resumed: Optional[str] = None
+
+    def result(self, status: str, doc_id: Optional[int] = None) -> dict:
+        """Summary of the item for the run report."""
+        return {
+            "path": str(self.path),
+            "status": status,
+            "content_hash": self.content_hash,
+            "doc_id": doc_id,
+            "extraction_path": self.extraction_path,
+            "title": self.metadata.title if self.metadata is not None else None,
+            "tokens_saved": self.tokens_saved,
+            "resumed_from": self.resumed,
+            "error": self.error or self.skip
+        }
+
+
+class _StageStats:
+    """Item count and busy time of one stage (all of its workers)"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.items = 0
+        self.batches = 0
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, busy: float) -> None:
+        with self._lock:
+            self.items += items
+            self.batches += 1
+            self.busy_s += busy
+
+
+class IngestPipeline:
+    """
+    Ingests many documents with overlapping read, embed, analyze and store stages.
+
+    Usage:
+        pipeline = IngestPipeline(db, embedder, analyzer, normalizer=TextNormalizer())
+        summary = pipeline.run(Path("docs").rglob("*.md"))
+    """
+
+    def __init__(
+        self,
+        db: DocDatabase,
+        embedder: LocalEmbedder,
+        analyzer: Analyzer,
+        normalizer: Optional[TextNormalizer] = None,
+        local_extractor: Optional[LocalExtractor] = None,
+        fast_path: Optional[FastPathPolicy] = None,
+        dedup: Optional[NearDuplicateIndex] = None,
+        read_workers: int = 2,
+        analyze_workers: int = 8,
+        embed_batch_size: int = 16,
+        store_batch_size: int = 32,
+        queue_size: int = 32,
+        force_reprocess: bool = False,
+        jobs: Optional[JobQueue] = None,
+        job_id: Optional[int] = None,
+        extractors: Optional[ExtractorPool] = None
+    ):
+        """
+        Initialize pipeline.
+
+        Args:
+            db: Database; only used from the thread calling run()
+            embedder: Embedding generator (one batching worker)
+            analyzer: LLM analyzer, shared by the analyze workers
+            normalizer: Optional noise removal before embedding and analysis
+            local_extractor: Extractor for documents that skip the LLM
+            fast_path: Policy deciding when the LLM is skipped (needs local_extractor)
+            dedup: Near-duplicate index; matches reuse the stored metadata
+            read_workers: Threads reading, hashing and normalizing files
+            analyze_workers: Concurrent analyses (Claude requests in flight)
+            embed_batch_size: Most documents per embedding call
+            store_batch_size: Most documents per database transaction
+            queue_size: Capacity of each queue between two stages
+            force_reprocess: Process documents that are already stored (their metadata
+                and embedding are updated in place, see DocDatabase.upsert_documents())
+            jobs: Optional work queue saving each file's progress
+            job_id: Job the files belong to (required with jobs)
+            extractors: Worker processes converting PDF, DOCX, HTML and CSV files to
+                text (without, they are converted on the read threads)
+
+        Raises:
+            ValueError: If a worker count, batch size or queue size is not positive,
+                or jobs is given without job_id
+        """
+        if jobs is not None and job_id is None:
+            raise ValueError("job_id is required with jobs")
+        for name, value in (("read_workers", read_workers), ("analyze_workers", analyze_workers),
+                            ("embed_batch_size", embed_batch_size), ("store_batch_size", store_batch_size),
+                            ("queue_size", queue_size)):
+            if value < 1:
+                raise ValueError(f"{name} must be positive")
+
+        self.db = db
+        self.embedder = embedder
+        self.analyzer = analyzer
+        self.normalizer = normalizer
+        self.local_extractor = local_extractor
+        self.fast_path = fast_path
+        self.dedup = dedup
+        self.read_workers = read_workers
+        self.analyze_workers = analyze_workers
+        self.embed_batch_size = embed_batch_size
+        self.store_batch_size = store_batch_size
+        self.queue_size = queue_size
+        self.force_reprocess = force_reprocess
+        self.jobs = jobs
+        self.job_id = job_id
+        self.extractors = extractors
+
+        self._local_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(
+        self,
+        paths: Iterable[Path],
+        on_result: Optional[Callable[[dict], None]] = None,
+        replaces: Optional[Dict[str, str]] = None
+    ) -> dict:
+        """
+        Ingest documents until all paths are processed.
+
+        Args:
+            paths: Files or SourceDocuments to ingest (consumed lazily, e.g. a glob generator)
+            on_result: Optional callback receiving each document's result as it is stored
+            replaces: str(path) -> id of the document stored from the file's previous
+                revision; it is replaced in place (keeping its ID) instead of adding
+                a new one
+
+        Returns:
+            Summary with counts (stored, skipped, failed), per-stage throughput
+            and the per-document results
+        """
+        self._stop.clear()
+        self._known = set()
+        if not self.force_reprocess:
+            self._known = self.db.get_content_hashes()
+            if self.db.canonical_duplicates:
+                # A canonical hash equals a content hash only for canonically equal texts
+                self._known |= self.db.get_canonical_hashes()
+        self._results: List[dict] = []
+        self._on_result = on_result
+        self._replaces = replaces or {}
+        self._stats = {
+            STAGE_READ: _StageStats(self.read_workers),
+            STAGE_EMBED: _StageStats(1),
+            STAGE_ANALYZE: _StageStats(self.analyze_workers),
+            STAGE_STORE: _StageStats(1)
+        }
+
+        path_queue: queue.Queue = queue.Queue(self.queue_size)
+        embed_queue: queue.Queue = queue.Queue(self.queue_size)
+        analyze_queue: queue.Queue = queue.Queue(self.queue_size)
+        store_queue: queue.Queue = queue.Queue(self.queue_size)
+
+        threads = [threading.Thread(target=self._feed, args=(paths, path_queue), name="ingest-feed", daemon=True)]
+        read_left = _Countdown(self.read_workers, lambda: embed_queue.put(_DONE))
+        threads += [
+            threading.Thread(target=self._read_worker, args=(path_queue, embed_queue, read_left),
+                             name=f"ingest-read-{n}", daemon=True)
+            for n in range(self.read_workers)
+        ]
+        threads.append(threading.Thread(target=self._embed_worker, args=(embed_queue, analyze_queue),
+                                        name="ingest-embed", daemon=True))
+        analyze_left = _Countdown(self.analyze_workers, lambda: store_queue.put(_DONE))
+        threads += [
+            threading.Thread(target=self._analyze_worker, args=(analyze_queue, store_queue, analyze_left),
+                             name=f"ingest-analyze-{n}", daemon=True)
+            for n in range(self.analyze_workers)
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._store_loop(store_queue)
+        except BaseException:
+            # Let the workers run out instead of blocking on full queues
+            self._stop.set()
+            raise
+
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        counts = {"stored": 0, "skipped": 0, "failed": 0}
+        resumed = 0
+        for result in self._results:
+            counts[result["status"]] += 1
+            resumed += result["resumed_from"] is not None
+
+        return {
+            **counts,
+            "resumed": resumed,
+            "elapsed_s": round(elapsed, 3),
+            "documents_per_s": round(counts["stored"] / elapsed, 3) if elapsed else 0.0,
+            "stages": {name: self._stage_summary(name, elapsed) for name in STAGES},
+            "results": self._results
+        }
+
+    def _stage_summary(self, name: str, elapsed: float) -> dict:
+        """Throughput and utilization of a stage over the run."""
+        stats = self._stats[name]
+        return {
+            "workers": stats.workers,
+            "items": stats.items,
+            "batches": stats.batches,
+            "busy_s": round(stats.busy_s, 3),
+            "items_per_busy_s": round(stats.items / stats.busy_s, 3) if stats.busy_s else 0.0,
+            "utilization": round(stats.busy_s / (stats.workers * elapsed), 4) if elapsed else 0.0
+        }
+
+    def _finish(self, item: PipelineItem, status: str, doc_id: Optional[int] = None) -> None:
+        """Record an item's final state (store thread only)."""
+        result = item.result(status, doc_id)
+        self._results.append(result)
+        if self._on_result is not None:
+            self._on_result(result)
+
+    def _put(self, target: queue.Queue, item) -> None:
+        """Blocking put that gives up once the run is stopped."""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _feed(self, paths: Iterable[Path], path_queue: queue.Queue) -> None:
+        """Source stage: enqueue paths, then one end marker per reader."""
+        try:
+            for path in paths:
+                if self._stop.is_set():
+                    break
+                if isinstance(path, SourceDocument):
+                    self._put(path_queue, path)
+                elif Path(path).is_file():
+                    self._put(path_queue, Path(path))
+        except Exception as e:
+            logger.error(f"Listing input files failed: {e}")
+        finally:
+            for _ in range(self.read_workers):
+                path_queue.put(_DONE)
+
+    def _read_worker(self, path_queue: queue.Queue, embed_queue: queue.Queue, done: "_Countdown") -> None:
+        """Read, hash and normalize files; skip known content."""
+        try:
+            while True:
+                path = path_queue.get()
+                if path is _DONE or self._stop.is_set():
+                    break
+
+                started = time.perf_counter()
+                item = PipelineItem(path)
+                try:
+                    # Registered before reading, so read failures are recorded (and retried) too;
+                    # files finished (or given up) in an earlier run of the job need no work
+                    work = self._attach(item) if self.jobs is not None else None
+                    if self.jobs is None or work is not None:
+                        self._read(item, work)
+                except Exception as e:
+                    # Any failure (e.g. a corrupt archive member) fails the item, not the reader
+                    item.error = str(e) or type(e).__name__
+                self._stats[STAGE_READ].record(1, time.perf_counter() - started)
+                self._put(embed_queue, item)
+        finally:
+            done.count_down()
+
+    def _read(self, item: PipelineItem, work: Optional[WorkItem]) -> None:
+        """Read and hash an item's file, then resume its saved state and prepare it."""
+        if isinstance(item.path, SourceDocument):
+            document = item.path.read(self.extractors)
+        else:
+            document = extract_document(item.path, self.extractors)
+        if not document.text.strip():
+            raise ValueError("File is empty")
+        item.content, item.content_hash = document.text, document.content_hash
+        if self.db.canonical_duplicates:
+            item.canonical_hash = self.db._compute_canonical_hash(item.content)
+
+        if work is not None:
+            self._resume(item, work)
+        self._prepare(item)
+
+    def _prepare(self, item: PipelineItem) -> None:
+        """Skip known content, otherwise derive the text to embed and analyze."""
+        # Known from the database or claimed by another file of this run
+        if self._claim(item.content_hash, item.canonical_hash):
+            item.skip = "Duplicate"
+            if item.work_id is not None:
+                self.jobs.mark_skipped(item.work_id, "Content already stored")
+        elif self.normalizer is not None:
+            item.text, report = self.normalizer.process(item.content)
+            item.tokens_saved = report["tokens_saved"]
+        else:
+            item.text = item.content
+
+    def _claim(self, content_hash: str, canonical_hash: Optional[str] = None) -> bool:
+        """Claim a document's hashes for this run; True if it is stored or already claimed."""
+        hashes = {content_hash, canonical_hash} - {None}
+        with self._claim_lock:
+            known = not hashes.isdisjoint(self._known)
+            self._known |= hashes
+        return known
+
+    def _attach(self, item: PipelineItem) -> Optional[WorkItem]:
+        """
+        Attach the item's work item in the job, registering it if needed.
+
+        Returns:
+            The work item, or None if the file needs no more work in this job (item.skip says why)
+        """
+        work = self.jobs.get_item(self.job_id, item.path)
+        item.work_id = work.id
+        if work.status in (ITEM_STORED, ITEM_SKIPPED):
+            item.skip = f"{work.status.capitalize()} in an earlier run"
+            return None
+        if not self.jobs.retryable(work):
+            item.skip = f"Gave up after {work.attempts} failed attempts: {work.last_error}"
+            return None
+        return work
+
+    def _resume(self, item: PipelineItem, work: WorkItem) -> None:
+        """Reuse the embedding and metadata saved for the item's content in an earlier run."""
+        # Saved results are only valid for unchanged content
+        if work.resumable(item.content_hash):
+            if work.embedding is not None:
+                item.embedding = work.embedding
+                item.resumed = ITEM_EMBEDDED
+            if work.metadata is not None:
+                item.metadata = work.metadata
+                item.extraction_path = work.extraction_path
+                item.resumed = ITEM_ANALYZED
+
+    def _embed_worker(self, embed_queue: queue.Queue, analyze_queue: queue.Queue) -> None:
+        """Embed documents in batches and look up near-duplicates."""
+        finished = False
+        while not finished:
+            batch = [embed_queue.get()]
+            # Whatever else is already waiting joins the batch
+            while len(batch) < self.embed_batch_size:
+                try:
+                    batch.append(embed_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _DONE in batch:
+                finished = True
+                batch = [item for item in batch if item is not _DONE]
+
+            todo = [item for item in batch if item.error is None and item.skip is None]
+            if todo:
+                started = time.perf_counter()
+                # Resumed items keep their saved embedding
+                missing = [item for item in todo if item.embedding is None]
+                try:
+                    if missing:
+                        embeddings = self.embedder.generate_embeddings_batch([item.text for item in missing])
+                        for item, embedding in zip(missing, embeddings):
+                            item.embedding = embedding
+                            if item.work_id is not None:
+                                self.jobs.mark_embedded(item.work_id, item.content_hash, embedding)
+                    if self.dedup is not None:
+                        for item in todo:
+                            item.signature = self.dedup.signature(item.text)
+                            if not self.force_reprocess and item.metadata is None:
+                                item.duplicate = self.dedup.find(item.text, item.embedding, item.signature)
+                except Exception as e:
+                    for item in todo:
+                        item.error = f"Embedding failed: {e}"
+                self._stats[STAGE_EMBED].record(len(missing), time.perf_counter() - started)
+
+            for item in batch:
+                self._put(analyze_queue, item)
+
+        for _ in range(self.analyze_workers):
+            analyze_queue.put(_DONE)
+
+    def _analyze_worker(self, analyze_queue: queue.Queue, store_queue: queue.Queue, done: "_Countdown") -> None:
+        """Extract metadata with Claude or the local fast path."""
+        try:
+            while True:
+                item = analyze_queue.get()
+                if item is _DONE:
+                    break
+
+                # Near-duplicates are resolved by the store stage, which owns the database
+                if item.error is None and item.skip is None and item.duplicate is None and item.metadata is None:
+                    started = time.perf_counter()
+                    try:
+                        use_local = False
+                        if self.fast_path is not None and self.local_extractor is not None:
+                            use_local, _ = self.fast_path.decide(item.text)
+                        if use_local:
+                            with self._local_lock:
+                                item.metadata = self.local_extractor.extract(item.text)
+                            item.extraction_path = "local"
+                        else:
+                            item.metadata = self.analyzer.analyze_text(item.text)
+                            item.extraction_path = "llm"
+                        if item.work_id is not None:
+                            self.jobs.mark_analyzed(item.work_id, item.metadata, item.extraction_path)
+                    except Exception as e:
+                        item.error = str(e)
+                    self._stats[STAGE_ANALYZE].record(1, time.perf_counter() - started)
+                self._put(store_queue, item)
+        finally:
+            done.count_down()
+
+    def _store_loop(self, store_queue: queue.Queue) -> None:
+        """Store finished documents in batches until all analyze workers are done."""
+        finished = False
+        while not finished:
+            batch = [store_queue.get()]
+            while len(batch) < self.store_batch_size:
+                try:
+                    batch.append(store_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _DONE in batch:
+                finished = True
+                batch = [item for item in batch if item is not _DONE]
+
+            started = time.perf_counter()
+            pending = []
+            for item in batch:
+                if item.skip is not None:
+                    self._finish(item, "skipped")
+                elif item.error is not None:
+                    self._fail(item)
+                else:
+                    self._resolve_duplicate(item)
+                    if item.error is not None:
+                        self._fail(item)
+                    else:
+                        pending.append(item)
+
+            if pending:
+                try:
+                    stored = self._store(pending)
+                except RuntimeError as e:
+                    stored = [(None, False)] * len(pending)
+                    for item in pending:
+                        item.error = str(e)
+
+                for item, (doc_id, created) in zip(pending, stored):
+                    if doc_id is None:
+                        item.error = item.error or "Document already exists"
+                        self._fail(item)
+                        continue
+                    if item.work_id is not None:
+                        self.jobs.mark_stored(item.work_id, doc_id)
+                    if self.local_extractor is not None and created:
+                        with self._local_lock:
+                            self.local_extractor.add_to_corpus(item.text)
+                    if self.dedup is not None:
+                        # A new revision matching its own previous one is no duplicate
+                        reused = item.extraction_path == "dedup" and item.duplicate[0] != doc_id
+                        self.dedup.add(doc_id, item.text, item.embedding,
+                                       item.duplicate if reused else None, item.signature)
+                    logger.info(f"[OK] {item.path.name} -> ID {doc_id} ({item.extraction_path}): {item.metadata.title}")
+                    self._finish(item, "stored", doc_id)
+
+                self._stats[STAGE_STORE].record(len(pending), time.perf_counter() - started)
+
+    def _store(self, items: List[PipelineItem]) -> List[Tuple[Optional[int], bool]]:
+        """Store a batch; new revisions of edited files replace their previous document."""
+        results = {}
+        new = []
+        for item in items:
+            doc_id = self._replaces.get(str(item.path))
+            if doc_id is None:
+                new.append(item)
+                continue
+            try:
+                if not self.db.replace_document(
+                    doc_id, item.content, item.metadata, item.embedding, item.extraction_path
+                ):
+                    # Removed in the meantime
+                    new.append(item)
+                    continue
+            except ValueError as e:
+                item.error, doc_id = str(e), None
+            results[id(item)] = (doc_id, False)
+
+        if new:
+            documents = [(item.content, item.metadata, item.embedding, item.extraction_path) for item in new]
+            if self.force_reprocess:
+                # Stored documents are updated in place instead of rejected
+                stored = self.db.upsert_documents(documents)
+            else:
+                stored = [(doc_id, True) for doc_id in self.db.add_documents(documents)]
+            results.update(zip(map(id, new), stored))
+        return [results[id(item)] for item in items]
+
+    def _fail(self, item: PipelineItem) -> None:
+        """Log and record a failed item (store thread only)."""
+        logger.error(f"[ERROR] {item.path}: {item.error}")
+        if item.work_id is not None:
+            self.jobs.mark_failed(item.work_id, item.error)
+        self._finish(item, "failed")
+
+    def _resolve_duplicate(self, item: PipelineItem) -> None:
+        """Reuse the stored metadata of a near-duplicate, or analyze if it is gone."""
+        if item.duplicate is None:
+            return
+        duplicate_id, method, similarity = item.duplicate
+        stored = self.db.get_document(duplicate_id)
+        if stored is not None:
+            item.metadata = patch_metadata(stored[1], item.text)
+            item.extraction_path = "dedup"
+            logger.info(f"{item.path.name}: near-duplicate of ID {duplicate_id} ({method}, {similarity:.2f})")
+            return
+        try:
+            item.metadata = self.analyzer.analyze_text(item.text)
+            item.extraction_path = "llm"
+        except Exception as e:
+            item.error = str(e)
+
+
+class _Countdown:
+    """Runs a callback when the last of n workers has finished"""
+
+    def __init__(self, n: int, on_zero: Callable[[], None]):
+        self._n = n
+        self._on_zero = on_zero
+        self._lock = threading.Lock()
+
+    def count_down(self) -> None:
+        with self._lock:
+            self._n -= 1
+            last = self._n == 0
+        if last:
+            self._on_zero()
@@ -0,0 +1,77 @@
+"""
+Claude model pricing for cost estimates.
+
+Prices are USD per million tokens (list prices, without batch discount).
+"""
+
+from typing import Tuple
+
+
+# Model family prefix -> (input, output) USD per million tokens
+MODEL_PRICING = {
+    "claude-opus-4": (15.00, 75.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-opus": (15.00, 75.00),
+    "claude-3-haiku": (0.25, 1.25),
+}
+
+# Fallback for unknown models (Sonnet pricing)
+DEFAULT_PRICING = (3.00, 15.00)
+
+# Prompt caching multipliers relative to the input price
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.10
+
+# Message Batches API discount
+BATCH_DISCOUNT = 0.50
+
+
+def get_pricing(model: str) -> Tuple[float, float]:
+    """
+    Look up (input, output) prices for a model id.
+
+    Args:
+        model: Claude model identifier (dated ids and -latest aliases are matched by family)
+
+    Returns:
+        Tuple of USD per million input and output tokens
+    """
+    matches = [prefix for prefix in MODEL_PRICING if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_PRICING
+    return MODEL_PRICING[max(matches, key=len)]
+
+
+def estimate_cost(
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cache_creation_tokens: int = 0,
+    cache_read_tokens: int = 0,
+    batch: bool = False
+) -> float:
+    """
+    Estimate the USD cost of a request.
+
+    Args:
+        model: Claude model identifier
+        input_tokens: Uncached input tokens
+        output_tokens: Output tokens
+        cache_creation_tokens: Input tokens written to the prompt cache
+        cache_read_tokens: Input tokens read from the prompt cache
+        batch: True if sent through the Message Batches API
+
+    Returns:
+        Estimated cost in USD
+    """
+    input_price, output_price = get_pricing(model)
+    cost = (
+        input_tokens * input_price
+        + cache_creation_tokens * input_price * CACHE_WRITE_MULTIPLIER
+        + cache_read_tokens * input_price * CACHE_READ_MULTIPLIER
+        + output_tokens * output_price
+    ) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
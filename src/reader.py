@@ -0,0 +1,238 @@
+"""
+Single-pass reading and hashing of document files.
+
+read_document() memory-maps a file and decodes it chunk by chunk, hashing
+while it decodes, so large files are neither read twice (UTF-8 attempt, then
+latin-1) nor re-encoded as a whole to compute their hash. Before decoding,
+the first bytes are checked:
+
+- magic bytes of common binary formats (PDF, images, archives, executables,
+  Office files, SQLite) and NUL bytes reject the file early
+- a byte order mark selects UTF-8/16/32
+- a charset declaration (HTML meta, XML declaration, Emacs/Python coding
+  line) names the encoding used if the file is not valid UTF-8
+
+Otherwise the file is decoded as UTF-8 with a latin-1 fallback. Line endings
+are translated to '\\n' as in text mode, so content_hash is
+sha256(text.encode('utf-8')), the hash DocDatabase stores.
+"""
+
+import codecs
+import hashlib
+import io
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+# Files above this size are rejected (configurable per call)
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+SNIFF_BYTES = 4096
+
+# (magic bytes, format) of files that are not text; formats with short ASCII
+# signatures (executables, audio) are caught by the NUL byte check instead
+BINARY_SIGNATURES = (
+    (b"%PDF-", "PDF"),
+    (b"\x89PNG\r\n\x1a\n", "PNG image"),
+    (b"\xff\xd8\xff", "JPEG image"),
+    (b"GIF87a", "GIF image"),
+    (b"GIF89a", "GIF image"),
+    (b"PK\x03\x04", "ZIP archive (or DOCX/XLSX)"),
+    (b"\x1f\x8b", "gzip archive"),
+    (b"\xfd7zXZ\x00", "xz archive"),
+    (b"7z\xbc\xaf\x27\x1c", "7z archive"),
+    (b"Rar!\x1a\x07", "RAR archive"),
+    (b"\x7fELF", "ELF executable"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "OLE document (DOC/XLS)"),
+    (b"SQLite format 3\x00", "SQLite database"),
+    (b"\x00\x00\x00\x18ftyp", "MP4 video"),
+    (b"\x00\x00\x00\x20ftyp", "MP4 video"),
+    (b"\xca\xfe\xba\xbe", "Java class"),
+)
+
+# Byte order marks, longest first (the UTF-32 LE BOM starts with the UTF-16 LE one)
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+_CHARSET_RE = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)"""
+    rb"""|<\?xml[^>]+encoding\s*=\s*["']([\w.:-]+)"""
+    rb"""|-\*-.*coding[:=]\s*([\w.-]+)""",
+    re.IGNORECASE
+)
+
+
+class UnsupportedFileError(ValueError):
+    """The file is binary or too large to be read as a text document."""
+
+
+class FileTooLargeError(UnsupportedFileError):
+    """The file exceeds the configured size limit."""
+
+
+class TextFile:
+    """A decoded document file"""
+
+    def __init__(
+        self,
+        path: Path,
+        text: str,
+        content_hash: str,
+        encoding: str,
+        size: int,
+        mime_type: str = "text/plain"
+    ):
+        """
+        Initialize result.
+
+        Args:
+            path: File path
+            text: Decoded content with '\\n' line endings
+            content_hash: SHA256 of the UTF-8 encoded text
+            encoding: Encoding the file was decoded with
+            size: File size in bytes
+            mime_type: Format of the file (text extracted by src/extractors.py otherwise)
+        """
+        self.path = path
+        self.text = text
+        self.content_hash = content_hash
+        self.encoding = encoding
+        self.size = size
+        self.mime_type = mime_type
+
+
+def sniff_encoding(head: bytes) -> Tuple[Optional[str], int]:
+    """
+    Determine the encoding from the first bytes of a file.
+
+    Args:
+        head: First bytes of the file
+
+    Returns:
+        Tuple of (encoding or None if undetermined, length of the BOM to skip);
+        without a BOM the encoding is the one the file declares
+
+    Raises:
+        UnsupportedFileError: If the bytes belong to a binary format
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    for signature, kind in BINARY_SIGNATURES:
+        if head.startswith(signature):
+            raise UnsupportedFileError(f"Binary file ({kind})")
+    if b"\x00" in head:
+        raise UnsupportedFileError("Binary file (contains NUL bytes)")
+
+    match = _CHARSET_RE.search(head)
+    if match:
+        declared = next(group for group in match.groups() if group).decode("ascii", "replace")
+        try:
+            return codecs.lookup(declared).name, 0
+        except LookupError:
+            pass
+    return None, 0
+
+
+def _decode(view, start: int, encoding: str, hash_bytes: bool) -> Tuple[str, str]:
+    """Decode and hash view[start:] in chunks; raises UnicodeDecodeError on invalid input."""
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)("strict"), translate=True)
+    hasher = hashlib.sha256()
+    pieces = []
+    for offset in range(start, len(view), CHUNK_SIZE):
+        chunk = view[offset:offset + CHUNK_SIZE]
+        piece = decoder.decode(chunk)
+        pieces.append(piece)
+        # Plain UTF-8 without CR: the bytes are already the UTF-8 encoded text
+        hasher.update(chunk if hash_bytes else piece.encode("utf-8"))
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        pieces.append(tail)
+        hasher.update(tail.encode("utf-8"))
+    return "".join(pieces), hasher.hexdigest()
+
+
+def read_document(path: Path, max_bytes: Optional[int] = DEFAULT_MAX_BYTES) -> TextFile:
+    """
+    Read, decode and hash a text file in one pass.
+
+    Args:
+        path: File path
+        max_bytes: Largest accepted file size (None for no limit)
+
+    Returns:
+        TextFile with text, content hash and detected encoding
+
+    Raises:
+        OSError: If the file cannot be opened
+        UnsupportedFileError: If the file is binary or larger than max_bytes
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if max_bytes is not None and size > max_bytes:
+            raise FileTooLargeError(f"File too large ({size} bytes, limit {max_bytes})")
+        if size == 0:
+            return TextFile(path, "", hashlib.sha256(b"").hexdigest(), "utf-8", 0)
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return _read_view(path, view, size)
+
+
+def decode_document(data: bytes, path: Path, max_bytes: Optional[int] = DEFAULT_MAX_BYTES) -> TextFile:
+    """
+    Decode and hash the bytes of a document that is not a file on disk
+    (e.g. an archive member), like read_document() does for files.
+
+    Args:
+        data: Document bytes
+        path: Name or source identifier reported in the result
+        max_bytes: Largest accepted size (None for no limit)
+
+    Returns:
+        TextFile with text, content hash and detected encoding
+
+    Raises:
+        UnsupportedFileError: If the data is binary or larger than max_bytes
+    """
+    if max_bytes is not None and len(data) > max_bytes:
+        raise FileTooLargeError(f"File too large ({len(data)} bytes, limit {max_bytes})")
+    if not data:
+        return TextFile(path, "", hashlib.sha256(b"").hexdigest(), "utf-8", 0)
+    return _read_view(path, data, len(data))
+
+
+def _read_view(path: Path, view, size: int) -> TextFile:
+    """Sniff, decode and hash a non-empty buffer (mmap or bytes)."""
+    encoding, skip = sniff_encoding(view[:SNIFF_BYTES])
+    utf8_bom = skip and encoding == "utf-8"
+    if utf8_bom:
+        # Kept as U+FEFF like text-mode reading always did, so stored hashes stay valid
+        skip = 0
+    # Valid UTF-8 wins over a declared charset (which is often wrong)
+    if not skip:
+        try:
+            hash_bytes = view.find(b"\r") == -1
+            text, content_hash = _decode(view, 0, "utf-8", hash_bytes)
+            return TextFile(path, text, content_hash, "utf-8", size)
+        except UnicodeDecodeError:
+            if utf8_bom:
+                raise UnsupportedFileError("File has a UTF-8 BOM but is not valid UTF-8")
+            # Every byte is a latin-1 character, so the fallback always decodes
+            if encoding in (None, "utf-8"):
+                encoding = "latin-1"
+    try:
+        text, content_hash = _decode(view, skip, encoding, False)
+    except UnicodeDecodeError as e:
+        raise UnsupportedFileError(f"File is not valid {encoding}: {e}")
+    return TextFile(path, text, content_hash, encoding, size)
@@ -0,0 +1,150 @@
+"""
+Model routing for document analysis.
+
+Short, simply structured documents are analyzed with a small, fast model;
+everything else goes to the analyzer's default model. When the small
+model's output fails validation, the document is escalated to the
+default model. Latency, tokens and estimated cost are recorded per route.
+"""
+
+import logging
+import re
+import threading
+
+from .pricing import estimate_cost
+from .tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+SMALL_MODEL = "claude-3-5-haiku-20241022"
+
+# Route names
+ROUTE_SMALL = "small"
+ROUTE_DEFAULT = "default"
+
+# Markdown headings, code fences and table rows mark structured documents
+_SECTION_RE = re.compile(r"^\s*(#{1,6}\s|```|\|)", re.MULTILINE)
+
+
+class ModelRouter:
+    """Chooses a model per document by size and structural complexity"""
+
+    def __init__(
+        self,
+        small_model: str = SMALL_MODEL,
+        max_small_tokens: int = 1500,
+        max_small_sections: int = 4,
+        escalate: bool = True
+    ):
+        """
+        Initialize routing policy.
+
+        Args:
+            small_model: Model used for documents below the thresholds
+            max_small_tokens: Largest document (estimated tokens) sent to the small model
+            max_small_sections: Most headings/code fences/table rows for the small model
+            escalate: Retry with the default model when the small model's output is invalid
+
+        Raises:
+            ValueError: If a threshold is negative
+        """
+        if max_small_tokens < 0 or max_small_sections < 0:
+            raise ValueError("Routing thresholds must not be negative")
+
+        self.small_model = small_model
+        self.max_small_tokens = max_small_tokens
+        self.max_small_sections = max_small_sections
+        self.escalate = escalate
+        self._lock = threading.Lock()
+        self.route_stats = {
+            ROUTE_SMALL: self._empty_stats(),
+            ROUTE_DEFAULT: self._empty_stats()
+        }
+
+    @staticmethod
+    def _empty_stats() -> dict:
+        return {
+            "documents": 0,
+            "escalations": 0,
+            "requests": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "latency_s": 0.0,
+            "cost_usd": 0.0
+        }
+
+    def route(self, text: str) -> str:
+        """
+        Choose the route for a document.
+
+        Args:
+            text: Document content
+
+        Returns:
+            ROUTE_SMALL or ROUTE_DEFAULT
+        """
+        if estimate_tokens(text) > self.max_small_tokens:
+            return ROUTE_DEFAULT
+        if len(_SECTION_RE.findall(text)) > self.max_small_sections:
+            return ROUTE_DEFAULT
+        return ROUTE_SMALL
+
+    def record_document(self, route: str, escalated: bool = False) -> None:
+        """
+        Count a document analyzed on a route.
+
+        Args:
+            route: Route the document was first sent to
+            escalated: True if it had to be re-analyzed with the default model
+        """
+        with self._lock:
+            self.route_stats[route]["documents"] += 1
+            if escalated:
+                self.route_stats[route]["escalations"] += 1
+
+    def record_request(self, route: str, model: str, usage, latency: float) -> None:
+        """
+        Add one API request to a route's latency and cost totals.
+
+        Args:
+            route: Route the request belongs to
+            model: Model the request was sent to
+            usage: response.usage of the request
+            latency: Wall-clock duration in seconds
+        """
+        cost = estimate_cost(
+            model,
+            usage.input_tokens,
+            usage.output_tokens,
+            getattr(usage, "cache_creation_input_tokens", None) or 0,
+            getattr(usage, "cache_read_input_tokens", None) or 0
+        )
+        with self._lock:
+            stats = self.route_stats[route]
+            stats["requests"] += 1
+            stats["input_tokens"] += usage.input_tokens
+            stats["output_tokens"] += usage.output_tokens
+            stats["latency_s"] += latency
+            stats["cost_usd"] += cost
+
+    def get_stats(self) -> dict:
+        """
+        Get per-route statistics.
+
+        Returns:
+            Dictionary route -> counts, token totals, average latency,
+            cost and escalation rate
+        """
+        with self._lock:
+            result = {route: dict(stats) for route, stats in self.route_stats.items()}
+
+        for stats in result.values():
+            stats["avg_latency_s"] = (
+                round(stats["latency_s"] / stats["requests"], 3) if stats["requests"] else 0.0
+            )
+            stats["escalation_rate"] = (
+                round(stats["escalations"] / stats["documents"], 4) if stats["documents"] else 0.0
+            )
+            stats["cost_usd"] = round(stats["cost_usd"], 6)
+        return result
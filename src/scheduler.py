@@ -0,0 +1,407 @@
+"""
+Budget-aware scheduling of document ingestion.
+
+Queued documents get a token and cost estimate before anything is sent to
+the API (Analyzer.estimate_usage), from their text where the budget or the
+ordering needs it and from the file size otherwise. The queue is ordered by
+a policy, and a run budget (USD, tokens, wall-clock time) decides per
+document whether it is analyzed with Claude, degraded to the local
+extractor, or deferred to a later run. Actual spend is read from the usage ledger, so packed requests,
+repairs and escalations count against the budget as they happen.
+"""
+
+import logging
+import math
+import re
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .ledger import UsageLedger
+from .reader import TextFile, read_document
+from .tokens import CHARS_PER_TOKEN
+
+
+logger = logging.getLogger(__name__)
+
+# Ordering policies
+POLICY_NAME = "name"
+POLICY_SMALL = "small"
+POLICY_NEWEST = "newest"
+POLICY_PRIORITY = "priority"
+POLICIES = (POLICY_NAME, POLICY_SMALL, POLICY_NEWEST, POLICY_PRIORITY)
+
+# What happens to the remaining documents once the budget is reached
+ON_EXHAUSTED_STOP = "stop"
+ON_EXHAUSTED_DEGRADE = "degrade"
+
+# Per-document decisions
+DECISION_ANALYZE = "analyze"
+DECISION_DEGRADE = "degrade"
+DECISION_DEFER = "defer"
+
+# #hashtags in the text (not Markdown headings, not issue numbers)
+_HASHTAG_RE = re.compile(r"(?<![\w#&])#([^\W\d_][\w-]*)")
+# "tags: a, b" or "tags: [a, b]" line, e.g. in front matter
+_TAGS_LINE_RE = re.compile(r"^\s*tags\s*:\s*\[?([^\]\n]*)\]?\s*$", re.IGNORECASE | re.MULTILINE)
+
+
+def extract_tags(path: Path, text: str) -> set:
+    """
+    Collect the tags of a document for priority scheduling.
+
+    Tags are #hashtags, entries of a 'tags:' line and the names of the
+    directories the file lives in, all lower-cased.
+
+    Args:
+        path: File path (relative parts are used as tags)
+        text: Document content
+
+    Returns:
+        Set of tags
+    """
+    tags = {tag.lower() for tag in _HASHTAG_RE.findall(text)}
+    for line in _TAGS_LINE_RE.findall(text[:4000]):
+        tags.update(tag.strip().strip("'\"").lower() for tag in line.split(",") if tag.strip())
+    tags.update(part.lower() for part in path.parent.parts if part not in ("", ".", "/"))
+    return tags
+
+
+class RunBudget:
+    """Spending limits of one ingestion run"""
+
+    def __init__(
+        self,
+        max_cost_usd: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        on_exhausted: str = ON_EXHAUSTED_STOP
+    ):
+        """
+        Initialize limits (None = unlimited).
+
+        Args:
+            max_cost_usd: Estimated USD the run may spend
+            max_tokens: Input + output tokens (incl. prompt cache) the run may spend
+            max_seconds: Wall-clock time the run may take
+            on_exhausted: 'stop' to defer the remaining documents, 'degrade'
+                to analyze them with the local extractor
+
+        Raises:
+            ValueError: If a limit is negative or on_exhausted is unknown
+        """
+        for name, limit in (("max_cost_usd", max_cost_usd), ("max_tokens", max_tokens), ("max_seconds", max_seconds)):
+            if limit is not None and limit < 0:
+                raise ValueError(f"{name} must not be negative")
+        if on_exhausted not in (ON_EXHAUSTED_STOP, ON_EXHAUSTED_DEGRADE):
+            raise ValueError(f"on_exhausted must be '{ON_EXHAUSTED_STOP}' or '{ON_EXHAUSTED_DEGRADE}'")
+
+        self.max_cost_usd = max_cost_usd
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.on_exhausted = on_exhausted
+
+    @property
+    def limited(self) -> bool:
+        """True if any limit is set."""
+        return any(limit is not None for limit in (self.max_cost_usd, self.max_tokens, self.max_seconds))
+
+    def exceeded_by(self, cost_usd: float, tokens: int, elapsed: float) -> Optional[str]:
+        """
+        Check spend (already spent plus what is about to be spent) against the limits.
+
+        Args:
+            cost_usd: USD
+            tokens: Tokens
+            elapsed: Seconds since the run started
+
+        Returns:
+            Name of the first exceeded limit ('cost', 'tokens', 'time'), or None
+        """
+        if self.max_cost_usd is not None and cost_usd > self.max_cost_usd:
+            return "cost"
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return "tokens"
+        if self.max_seconds is not None and elapsed > self.max_seconds:
+            return "time"
+        return None
+
+
+class QueuedDocument:
+    """A queued document with its estimate"""
+
+    def __init__(self, path: Path, estimate: dict, tags: set, mtime: float):
+        """
+        Initialize queued document.
+
+        Args:
+            path: File path
+            estimate: Result of Analyzer.estimate_usage()
+            tags: Tags for priority scheduling
+            mtime: Modification time of the file
+        """
+        self.path = path
+        self.estimate = estimate
+        self.tags = tags
+        self.mtime = mtime
+        self.decision: Optional[str] = None
+
+    @property
+    def estimated_tokens(self) -> int:
+        """Estimated input + output tokens."""
+        return self.estimate["input_tokens"] + self.estimate["output_tokens"]
+
+
+class IngestScheduler:
+    """
+    Orders queued documents and enforces the run budget.
+
+    Usage:
+        scheduler = IngestScheduler(analyzer, ledger, RunBudget(max_cost_usd=2.0), policy="small")
+        scheduler.add_files(files)
+        for item, decision in scheduler:
+            ...                                   # analyze, degrade or skip the item
+            logger.info(scheduler.status_line())
+    """
+
+    def __init__(
+        self,
+        analyzer,
+        ledger: UsageLedger,
+        budget: Optional[RunBudget] = None,
+        policy: str = POLICY_NAME,
+        priority_tags: Iterable[str] = ()
+    ):
+        """
+        Initialize scheduler.
+
+        Args:
+            analyzer: Analyzer whose estimate_usage() prices the documents
+            ledger: Usage ledger of the current run (source of actual spend)
+            budget: Optional run budget (default: unlimited)
+            policy: Ordering policy: 'name', 'small' (cheapest first),
+                'newest' (latest modification first) or 'priority'
+            priority_tags: Tags in descending priority for the 'priority' policy;
+                documents without a listed tag follow, cheapest first
+
+        Raises:
+            ValueError: If the policy is unknown
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}' (use one of: {', '.join(POLICIES)})")
+
+        self.analyzer = analyzer
+        self.ledger = ledger
+        self.budget = budget or RunBudget()
+        self.policy = policy
+        self.priority_tags = [tag.lower().lstrip("#") for tag in priority_tags]
+        self.items: List[QueuedDocument] = []
+        self.exhausted: Optional[str] = None
+        self._started: Optional[float] = None
+        self.counts = {DECISION_ANALYZE: 0, DECISION_DEGRADE: 0, DECISION_DEFER: 0}
+
+    def add(self, path: Path, text: Optional[str] = None) -> QueuedDocument:
+        """
+        Queue a document and estimate its cost.
+
+        Args:
+            path: File path (or SourceDocument of an archive member/NDJSON record)
+            text: Document content; without it the estimate is based on the file
+                size and only folder names count as tags
+
+        Returns:
+            The queued document
+        """
+        # Archive members carry their own modification time and size
+        mtime, size = getattr(path, "mtime", None), getattr(path, "size", None)
+        if mtime is None or size is None:
+            try:
+                stat = path.stat()
+                mtime, size = stat.st_mtime, stat.st_size
+            except OSError:
+                mtime, size = mtime or 0.0, 0
+
+        if text is not None and text.strip():
+            estimate = self.analyzer.estimate_usage(text)
+        elif text is None and size:
+            estimate = self.analyzer.estimate_usage(document_tokens=math.ceil(size / CHARS_PER_TOKEN))
+        else:
+            estimate = {"model": None, "requests": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+        item = QueuedDocument(path, estimate, extract_tags(path, text or ""), mtime)
+        self.items.append(item)
+        return item
+
+    def add_files(
+        self,
+        files: Iterable[Path],
+        normalize: Optional[Callable[[str], str]] = None,
+        read: Callable[[Path], TextFile] = read_document
+    ) -> None:
+        """
+        Queue files; unreadable files are queued with an empty estimate.
+
+        Files are only read (and extracted) up front if a budget or the 'small'
+        or 'priority' policy needs their text; otherwise they are estimated
+        from their size. The text is not kept.
+
+        Args:
+            files: File paths
+            normalize: Optional text normalization applied before estimating
+                (the one applied before analysis, see src/normalize.py)
+            read: Function reading a file (e.g. one that also extracts PDF text)
+        """
+        read_text = self.budget.limited or self.policy in (POLICY_SMALL, POLICY_PRIORITY)
+        for path in files:
+            if not read_text:
+                self.add(path)
+                continue
+            try:
+                text = read(path).text
+            except (OSError, ValueError, RuntimeError):
+                text = ""
+            self.add(path, normalize(text) if normalize and text.strip() else text)
+
+        total = sum(item.estimate["cost_usd"] for item in self.items)
+        logger.info(f"Queued {len(self.items)} documents, estimated ~${total:.4f} for a full analysis")
+
+    def ordered(self) -> List[QueuedDocument]:
+        """
+        Get the queue in policy order.
+
+        Returns:
+            QueuedDocuments, first to be processed first
+        """
+        if self.policy == POLICY_SMALL:
+            return sorted(self.items, key=lambda item: (item.estimated_tokens, str(item.path)))
+        if self.policy == POLICY_NEWEST:
+            return sorted(self.items, key=lambda item: (-item.mtime, str(item.path)))
+        if self.policy == POLICY_PRIORITY:
+            ranks = {tag: rank for rank, tag in reversed(list(enumerate(self.priority_tags)))}
+
+            def priority(item: QueuedDocument) -> Tuple[int, int, str]:
+                rank = min((ranks[tag] for tag in item.tags if tag in ranks), default=len(ranks))
+                return rank, item.estimated_tokens, str(item.path)
+
+            return sorted(self.items, key=priority)
+        return sorted(self.items, key=lambda item: str(item.path))
+
+    def plan(self) -> List[QueuedDocument]:
+        """
+        Get the items the budget is expected to cover, by estimate, in policy order.
+
+        Useful to restrict prefetching (e.g. packed analysis) to documents
+        that will be analyzed in this run.
+
+        Returns:
+            Leading QueuedDocuments whose cumulative estimate fits the cost and token limits
+        """
+        spent = self._spent()
+        cost, tokens = spent["cost_usd"], spent["tokens"]
+        planned = []
+        for item in self.ordered():
+            cost += item.estimate["cost_usd"]
+            tokens += item.estimated_tokens
+            if self.budget.exceeded_by(cost, tokens, 0.0):
+                break
+            planned.append(item)
+        return planned
+
+    def __iter__(self) -> Iterator[Tuple[QueuedDocument, str]]:
+        """
+        Yield (item, decision) in policy order.
+
+        The budget is checked before each item against the ledger's actual
+        spend plus the item's estimate. Once a limit would be exceeded, the
+        item and all following ones are degraded or deferred according to
+        the budget's on_exhausted setting.
+        """
+        self._started = time.monotonic()
+        for item in self.ordered():
+            if self.exhausted is None and self.budget.limited:
+                spent = self._spent()
+                reason = self.budget.exceeded_by(
+                    spent["cost_usd"] + item.estimate["cost_usd"],
+                    spent["tokens"] + item.estimated_tokens,
+                    time.monotonic() - self._started
+                )
+                if reason is not None:
+                    self.exhausted = reason
+                    logger.warning(
+                        f"Run budget reached ({reason}) - "
+                        f"{'degrading to local extraction' if self.budget.on_exhausted == ON_EXHAUSTED_DEGRADE else 'deferring'} "
+                        f"the remaining documents"
+                    )
+
+            if self.exhausted is None:
+                item.decision = DECISION_ANALYZE
+            elif self.budget.on_exhausted == ON_EXHAUSTED_DEGRADE:
+                item.decision = DECISION_DEGRADE
+            else:
+                item.decision = DECISION_DEFER
+            self.counts[item.decision] += 1
+            yield item, item.decision
+
+    def _spent(self) -> dict:
+        """Actual spend of the current run from the ledger."""
+        totals = self.ledger.run_totals()
+        return {
+            "cost_usd": totals["cost_usd"],
+            "tokens": (
+                totals["input_tokens"] + totals["output_tokens"]
+                + totals["cache_creation_input_tokens"] + totals["cache_read_input_tokens"]
+            )
+        }
+
+    def status(self) -> dict:
+        """
+        Get the budget status of the run.
+
+        Returns:
+            Dictionary with spend, limits, elapsed time, queue progress,
+            decision counts and the remaining documents' estimated cost
+        """
+        spent = self._spent()
+        pending = [item for item in self.items if item.decision is None]
+        return {
+            "policy": self.policy,
+            "queued": len(self.items),
+            "pending": len(pending),
+            "analyzed": self.counts[DECISION_ANALYZE],
+            "degraded": self.counts[DECISION_DEGRADE],
+            "deferred": self.counts[DECISION_DEFER],
+            "spent_usd": round(spent["cost_usd"], 6),
+            "spent_tokens": spent["tokens"],
+            "max_cost_usd": self.budget.max_cost_usd,
+            "max_tokens": self.budget.max_tokens,
+            "max_seconds": self.budget.max_seconds,
+            "elapsed_s": round(time.monotonic() - self._started, 1) if self._started else 0.0,
+            "pending_estimate_usd": round(sum(item.estimate["cost_usd"] for item in pending), 6),
+            "exhausted": self.exhausted
+        }
+
+    def status_line(self) -> str:
+        """
+        One-line budget status for progress logging.
+
+        Returns:
+            E.g. 'Budget: $0.0421 / $1.00 (4.2%) | 18,230 tokens | 12/200 docs | 35s'
+        """
+        status = self.status()
+        cost = f"${status['spent_usd']:.4f}"
+        if status["max_cost_usd"] is not None:
+            share = status["spent_usd"] / status["max_cost_usd"] * 100 if status["max_cost_usd"] else 100.0
+            cost += f" / ${status['max_cost_usd']:.2f} ({share:.1f}%)"
+        tokens = f"{status['spent_tokens']:,} tokens"
+        if status["max_tokens"] is not None:
+            tokens += f" / {status['max_tokens']:,}"
+        elapsed = f"{status['elapsed_s']:.0f}s"
+        if status["max_seconds"] is not None:
+            elapsed += f" / {status['max_seconds']:.0f}s"
+
+        line = (
+            f"Budget: {cost} | {tokens} | "
+            f"{status['queued'] - status['pending']}/{status['queued']} docs | {elapsed}"
+        )
+        if status["exhausted"]:
+            line += f" | exhausted ({status['exhausted']}): {status['degraded']} degraded, {status['deferred']} deferred"
+        return line
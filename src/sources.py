@@ -0,0 +1,347 @@
+"""
+Streaming document sources: ZIP and tar archives and NDJSON exports.
+
+iter_source() yields one SourceDocument per archive member or NDJSON line
+without unpacking anything to disk. Documents are identified by a source
+id that keeps the member path:
+
+    /data/dump.zip!letters/1890/brief.txt      (archive member)
+    /data/export.ndjson#42                     (NDJSON record with id 42)
+    /data/export.ndjson#42@17                  (another record with id 42, on line 17)
+
+Archive members and NDJSON lines are only located while iterating (their
+offset is recorded) and loaded when a document is read (e.g. on the read
+threads of IngestPipeline), so only the documents in flight are held in
+memory. Compressed tar has no index: reading a member decompresses the
+archive again up to the member.
+"""
+
+import fnmatch
+import glob
+import json
+import sys
+import tarfile
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterator, Optional, Sequence
+
+from .extractors import ExtractorPool, extract_bytes
+from .reader import DEFAULT_MAX_BYTES, FileTooLargeError, TextFile
+
+
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+# Fields holding the document text and id of an NDJSON record, in order of preference
+TEXT_FIELDS = ("text", "content", "body")
+ID_FIELDS = ("id", "_id", "uuid")
+
+_ARCHIVE_SEPARATOR = "!"
+_LINE_SEPARATOR = "#"
+
+
+class SourceDocument:
+    """A document inside an archive or stream"""
+
+    def __init__(
+        self,
+        source_id: str,
+        member: str,
+        size: int,
+        load: Callable[[], bytes],
+        mtime: float = 0.0
+    ):
+        """
+        Initialize document.
+
+        Args:
+            source_id: Identifier of the document (container path plus member path or line)
+            member: Path of the member inside its container (used for the name and folder tags)
+            size: Size in bytes
+            load: Function returning the document's bytes
+            mtime: Modification time of the member (0 if unknown)
+        """
+        self.source_id = source_id
+        self.member = PurePosixPath(member)
+        self.size = size
+        self.mtime = mtime
+        self._load = load
+
+    @property
+    def name(self) -> str:
+        """File name of the member."""
+        return self.member.name
+
+    @property
+    def parent(self) -> PurePosixPath:
+        """Folder of the member inside its container."""
+        return self.member.parent
+
+    def read(self, pool: Optional[ExtractorPool] = None, max_bytes: Optional[int] = DEFAULT_MAX_BYTES) -> TextFile:
+        """
+        Load, decode (or extract) and hash the document.
+
+        Args:
+            pool: Optional extractor pool for PDF, DOCX, HTML and CSV members
+            max_bytes: Largest accepted size (None for no limit)
+
+        Returns:
+            TextFile whose path is the source id
+
+        Raises:
+            UnsupportedFileError: If the member is binary or too large
+            ValueError: If the member cannot be loaded (e.g. an invalid NDJSON line)
+            RuntimeError: If text extraction fails
+        """
+        if max_bytes is not None and self.size > max_bytes:
+            raise FileTooLargeError(f"File too large ({self.size} bytes, limit {max_bytes})")
+        return extract_bytes(self._load(), Path(self.source_id), pool, max_bytes)
+
+    def save(self, target: Path) -> None:
+        """
+        Write the document's bytes to a file.
+
+        Args:
+            target: File to write
+        """
+        Path(target).write_bytes(self._load())
+
+    def __str__(self) -> str:
+        return self.source_id
+
+    def __repr__(self) -> str:
+        return f"SourceDocument({self.source_id!r})"
+
+
+def is_stream_source(path: Path) -> bool:
+    """
+    Check whether a path is an archive or NDJSON export that iter_source() can read.
+
+    Args:
+        path: File path
+
+    Returns:
+        True for ZIP and tar archives and NDJSON files
+    """
+    name = Path(path).name.lower()
+    return Path(path).is_file() and name.endswith(ZIP_SUFFIXES + TAR_SUFFIXES + NDJSON_SUFFIXES)
+
+
+def _matches(member: str, patterns: Optional[Sequence[str]]) -> bool:
+    """True if the member's file name matches one of the glob patterns (or there are none)."""
+    name = PurePosixPath(member).name
+    return not patterns or any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def iter_zip(path: Path, patterns: Optional[Sequence[str]] = None) -> Iterator[SourceDocument]:
+    """
+    Iterate the file members of a ZIP archive.
+
+    Args:
+        path: Archive path
+        patterns: Glob patterns matched against member file names (None for all members)
+
+    Yields:
+        SourceDocument per member; its bytes are read from the archive when it is read
+    """
+    archive_path = Path(path).resolve()
+    with zipfile.ZipFile(archive_path) as archive:
+        infos = archive.infolist()
+
+    def loader(info: zipfile.ZipInfo) -> Callable[[], bytes]:
+        def load() -> bytes:
+            # Opened per member, so several threads can read members concurrently
+            with zipfile.ZipFile(archive_path) as archive:
+                return archive.read(info)
+        return load
+
+    for info in infos:
+        if info.is_dir() or not _matches(info.filename, patterns):
+            continue
+        try:
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+        except (OverflowError, ValueError):
+            mtime = 0.0
+        yield SourceDocument(
+            f"{archive_path}{_ARCHIVE_SEPARATOR}{info.filename}", info.filename, info.file_size, loader(info), mtime
+        )
+
+
+def iter_tar(path: Path, patterns: Optional[Sequence[str]] = None) -> Iterator[SourceDocument]:
+    """
+    Iterate the file members of a (possibly compressed) tar archive.
+
+    Args:
+        path: Archive path
+        patterns: Glob patterns matched against member file names (None for all members)
+
+    Yields:
+        SourceDocument per member; its bytes are read from the archive when it is read
+    """
+    archive_path = Path(path).resolve()
+
+    def loader(member: tarfile.TarInfo) -> Callable[[], bytes]:
+        def load() -> bytes:
+            # The member header holds its data offset, so the archive is reopened and
+            # read from there (opened per member, like ZIP members)
+            with tarfile.open(archive_path, "r:*") as archive:
+                return archive.extractfile(member).read()
+        return load
+
+    with tarfile.open(archive_path, "r:*") as archive:
+        for member in archive:
+            if not member.isfile() or not _matches(member.name, patterns):
+                continue
+            yield SourceDocument(
+                f"{archive_path}{_ARCHIVE_SEPARATOR}{member.name}", member.name, member.size,
+                loader(member), float(member.mtime)
+            )
+
+
+def _record_text(line: bytes, text_fields: Sequence[str]) -> bytes:
+    """Document text of an NDJSON line, UTF-8 encoded."""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if isinstance(record, str):
+        return record.encode("utf-8")
+    if not isinstance(record, dict):
+        raise ValueError("NDJSON line is neither an object nor a string")
+    for field in text_fields:
+        if isinstance(record.get(field), str):
+            return record[field].encode("utf-8")
+    raise ValueError(f"NDJSON record has no text field ({', '.join(text_fields)})")
+
+
+def _record_id(line: bytes, line_number: int) -> str:
+    """Id of an NDJSON record (its id field, otherwise the line number)."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return str(line_number)
+    if isinstance(record, dict):
+        for field in ID_FIELDS:
+            value = record.get(field)
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                return str(value)
+    return str(line_number)
+
+
+def iter_ndjson(
+    path: Path,
+    text_fields: Sequence[str] = TEXT_FIELDS,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+) -> Iterator[SourceDocument]:
+    """
+    Iterate the records of an NDJSON (JSON Lines) export, one document per line.
+
+    Each line is an object with the text in one of text_fields (or a plain
+    JSON string). The source id ends in the record's id field, or its line
+    number if it has none; a repeated id gets the line number appended
+    ('#42@17'), so every record keeps its own id. '-' reads from standard
+    input.
+
+    Args:
+        path: NDJSON file, or '-' for standard input
+        text_fields: Fields holding the document text, in order of preference
+        max_bytes: Lines above this size are yielded without reading their id
+            (reading the document then fails as too large)
+
+    Yields:
+        SourceDocument per non-empty line; invalid lines fail when read.
+        Lines of a file are read again from their offset, lines from
+        standard input are kept in memory.
+    """
+    from_stdin = str(path) == "-"
+    container = "<stdin>" if from_stdin else str(Path(path).resolve())
+    stream = sys.stdin.buffer if from_stdin else open(path, "rb")
+
+    def loader(line: bytes, offset: int) -> Callable[[], bytes]:
+        def load() -> bytes:
+            if from_stdin:
+                return _record_text(line, text_fields)
+            with open(container, "rb") as f:
+                f.seek(offset)
+                return _record_text(f.readline(), text_fields)
+        return load
+
+    seen = set()
+    offset = 0
+    try:
+        for line_number, line in enumerate(stream, 1):
+            line_offset, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            size = len(line)
+            if max_bytes is not None and size > max_bytes:
+                line = b""
+            record_id = _record_id(line, line_number) if line else str(line_number)
+            if record_id in seen:
+                record_id = f"{record_id}@{line_number}"
+            seen.add(record_id)
+            yield SourceDocument(
+                f"{container}{_LINE_SEPARATOR}{record_id}", f"{Path(container).stem}-{record_id}.txt", size,
+                loader(line if from_stdin else b"", line_offset)
+            )
+    finally:
+        if not from_stdin:
+            stream.close()
+
+
+def iter_source(
+    path: Path,
+    patterns: Optional[Sequence[str]] = None,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+) -> Iterator[SourceDocument]:
+    """
+    Iterate the documents of an archive or NDJSON export.
+
+    Args:
+        path: ZIP or tar archive, or NDJSON file ('-' for NDJSON on standard input)
+        patterns: Glob patterns matched against archive member file names
+            (None for all members; not used for NDJSON)
+        max_bytes: NDJSON lines above this size are not parsed for their id
+
+    Yields:
+        SourceDocument per member or record
+
+    Raises:
+        ValueError: If the path is not a supported archive or NDJSON file
+    """
+    name = Path(path).name.lower()
+    if str(path) == "-" or name.endswith(NDJSON_SUFFIXES):
+        return iter_ndjson(path, max_bytes=max_bytes)
+    if name.endswith(ZIP_SUFFIXES):
+        return iter_zip(path, patterns)
+    if name.endswith(TAR_SUFFIXES):
+        return iter_tar(path, patterns)
+    raise ValueError(f"Not an archive or NDJSON file: {path}")
+
+
+def load_source(source_id: str) -> Optional[SourceDocument]:
+    """
+    Find a document again by its source id (e.g. to resume a job).
+
+    Args:
+        source_id: Id of a document yielded by iter_source()
+
+    Returns:
+        The document, or None if its container or the member is gone
+    """
+    container, separator, member = source_id.rpartition(_ARCHIVE_SEPARATOR)
+    # Only the member's own data is read from the archive
+    patterns = [glob.escape(PurePosixPath(member).name)]
+    if not separator or not is_stream_source(Path(container)):
+        container, separator, _ = source_id.rpartition(_LINE_SEPARATOR)
+        patterns = None
+        if not separator or not is_stream_source(Path(container)):
+            return None
+
+    try:
+        documents = iter_source(Path(container), patterns)
+        return next((document for document in documents if document.source_id == source_id), None)
+    except (OSError, ValueError, zipfile.BadZipFile, tarfile.TarError):
+        return None
@@ -0,0 +1,114 @@
+"""
+Local token estimation and token-based text chunking.
+
+Claude's tokenizer is not available offline, so token counts are
+estimated from the text: word pieces of roughly four characters, one
+token per punctuation mark and per non-Latin character. The estimate
+errs on the high side, which is the safe direction for budgets.
+"""
+
+import math
+import re
+from typing import List
+
+
+# Words (Latin script incl. umlauts/accents), single symbols, or single CJK/emoji characters
+_TOKEN_RE = re.compile(r"[A-Za-z0-9À-ɏ]+|[^\sA-Za-z0-9À-ɏ]")
+
+# Average characters per token for Latin-script words
+CHARS_PER_TOKEN = 4.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of Claude tokens in a text.
+
+    Args:
+        text: Input text
+
+    Returns:
+        Estimated token count
+    """
+    tokens = 0
+    for match in _TOKEN_RE.finditer(text):
+        length = match.end() - match.start()
+        tokens += 1 if length == 1 else math.ceil(length / CHARS_PER_TOKEN)
+    return tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text so that its estimated token count fits a budget.
+
+    Args:
+        text: Input text
+        max_tokens: Token budget
+
+    Returns:
+        The longest prefix of text (ending at a token boundary) within the budget
+    """
+    tokens = 0
+    for match in _TOKEN_RE.finditer(text):
+        length = match.end() - match.start()
+        tokens += 1 if length == 1 else math.ceil(length / CHARS_PER_TOKEN)
+        if tokens > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens (estimated).
+
+    Paragraph boundaries are preferred, then line boundaries; only single
+    lines longer than the budget are cut mid-line.
+
+    Args:
+        text: Input text
+        max_tokens: Token budget per chunk
+
+    Returns:
+        List of non-empty chunks in document order
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+
+    pieces: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        lines: List[str] = []
+        lines_tokens = 0
+        for line in paragraph.splitlines():
+            line_tokens = estimate_tokens(line)
+            if lines and lines_tokens + line_tokens > max_tokens:
+                pieces.append("\n".join(lines))
+                lines, lines_tokens = [], 0
+            while line_tokens > max_tokens:
+                head = truncate_to_tokens(line, max_tokens)
+                if not head:
+                    # A single oversized token; cut by characters
+                    head = line[:int(max_tokens * CHARS_PER_TOKEN)]
+                pieces.append(head)
+                line = line[len(head):]
+                line_tokens = estimate_tokens(line)
+            lines.append(line)
+            lines_tokens += line_tokens
+        if lines:
+            pieces.append("\n".join(lines))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        piece_tokens = estimate_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+
+    return [chunk for chunk in chunks if chunk.strip()]
@@ -0,0 +1,643 @@
+"""
+Filesystem watch mode for continuous ingestion.
+
+Watchers report paths that were written or moved into the watched folders:
+InotifyWatcher uses Linux inotify through ctypes (no extra dependency),
+PollingWatcher compares directory snapshots and works everywhere. A
+Debouncer coalesces bursts of events, so a file that is saved several times
+in a row is ingested once, after it has been quiet for a moment. WatchDaemon
+hands the settled paths to a handler (normally IngestPipeline.run) and
+publishes queue depth and ingestion lag in the watch_status table, where the
+web interface reads them.
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import os
+import select
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .manifest import FileManifest
+
+
+logger = logging.getLogger(__name__)
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Returned by a watcher when events were lost and the folders must be rescanned
+RESCAN = Path("<rescan>")
+
+
+def iter_files(roots: Iterable[Path], recursive: bool = True) -> Iterable[Path]:
+    """
+    List the files below the given folders.
+
+    Args:
+        roots: Folders
+        recursive: Include subfolders
+
+    Returns:
+        Iterator over file paths
+    """
+    for root in roots:
+        stack = [str(root)]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        yield Path(entry.path)
+                except OSError:
+                    continue
+
+
+def inotify_available() -> bool:
+    """Whether the C library provides inotify (Linux)."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        return hasattr(libc, "inotify_init1")
+    except OSError:
+        return False
+
+
+class InotifyWatcher:
+    """Reports files closed after writing or moved into the watched folders (Linux)"""
+
+    def __init__(self, roots: Sequence[Path], recursive: bool = True):
+        """
+        Start watching.
+
+        Args:
+            roots: Folders to watch
+            recursive: Also watch subfolders, including ones created later
+
+        Raises:
+            RuntimeError: If inotify is unavailable or a folder cannot be watched
+        """
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            raise RuntimeError(f"inotify is not available: {e}")
+        if self._fd < 0:
+            raise RuntimeError(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+
+        self.recursive = recursive
+        self._dirs: Dict[int, Path] = {}
+        for root in roots:
+            self._add_tree(Path(root))
+
+    def _add_watch(self, directory: Path) -> None:
+        """Watch one folder."""
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise RuntimeError(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+        self._dirs[wd] = directory
+
+    def _add_tree(self, directory: Path) -> List[Path]:
+        """Watch a folder (and its subfolders); returns the files already inside."""
+        self._add_watch(directory)
+        files = []
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return files
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if self.recursive:
+                    files.extend(self._add_tree(Path(entry.path)))
+            elif entry.is_file():
+                files.append(Path(entry.path))
+        return files
+
+    def poll(self, timeout: float) -> List[Path]:
+        """
+        Wait for events.
+
+        Args:
+            timeout: Seconds to wait at most
+
+        Returns:
+            Written or moved-in files (RESCAN if the kernel queue overflowed)
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths, offset = [], 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                paths.append(RESCAN)
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                # A new subfolder may already contain files before its watch exists
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        paths.extend(self._add_tree(path))
+                    except RuntimeError as e:
+                        logger.warning(str(e))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return paths
+
+    def close(self) -> None:
+        """Stop watching."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Reports new or modified files by comparing periodic folder snapshots"""
+
+    def __init__(self, roots: Sequence[Path], recursive: bool = True, interval: float = 2.0):
+        """
+        Take the initial snapshot.
+
+        Args:
+            roots: Folders to watch
+            recursive: Include subfolders
+            interval: Seconds between two snapshots
+        """
+        self.roots = [Path(root) for root in roots]
+        self.recursive = recursive
+        self.interval = interval
+        self._snapshot = self._take()
+        self._next = time.monotonic() + interval
+
+    def _take(self) -> Dict[Path, Tuple[int, int]]:
+        """Current (size, mtime_ns) of every file."""
+        snapshot = {}
+        for path in iter_files(self.roots, self.recursive):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout: float) -> List[Path]:
+        """
+        Wait until the next snapshot is due (at most timeout) and compare.
+
+        Args:
+            timeout: Seconds to wait at most
+
+        Returns:
+            New or modified files
+        """
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        self._next = time.monotonic() + self.interval
+
+        snapshot = self._take()
+        changed = [path for path, stat in snapshot.items() if self._snapshot.get(path) != stat]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+
+class Debouncer:
+    """
+    Coalesces repeated events per path.
+
+    A path is ready once no new event arrived for quiet_s seconds, or at the
+    latest max_delay_s after its first event (files that are written to
+    continuously still get ingested).
+    """
+
+    def __init__(self, quiet_s: float = 1.0, max_delay_s: float = 10.0):
+        """
+        Initialize debouncer.
+
+        Args:
+            quiet_s: Seconds without events before a path is ready
+            max_delay_s: Seconds after the first event when a path is ready regardless
+
+        Raises:
+            ValueError: If max_delay_s is less than quiet_s
+        """
+        if max_delay_s < quiet_s:
+            raise ValueError("max_delay_s must not be less than quiet_s")
+        self.quiet_s = quiet_s
+        self.max_delay_s = max_delay_s
+        self._pending: Dict[Path, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.events = 0
+
+    def add(self, path: Path, now: Optional[float] = None) -> None:
+        """Record an event for a path."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            first, _ = self._pending.get(path, (now, now))
+            self._pending[path] = (first, now)
+            self.events += 1
+
+    def ready(self, now: Optional[float] = None) -> List[Tuple[Path, float]]:
+        """
+        Take the paths that have settled.
+
+        Returns:
+            (path, time of its first event) pairs, oldest first
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [
+                (path, first) for path, (first, last) in self._pending.items()
+                if now - last >= self.quiet_s or now - first >= self.max_delay_s
+            ]
+            for path, _ in due:
+                del self._pending[path]
+        return sorted(due, key=lambda entry: entry[1])
+
+    def oldest_age(self, now: Optional[float] = None) -> float:
+        """Seconds since the first event of the longest waiting path."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return max((now - first for first, _ in self._pending.values()), default=0.0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+class WatchStatus:
+    """
+    Status of running watchers, readable by other processes.
+
+    Schema:
+        - watch_status: One row per watcher with queue depth, lag and counters
+    """
+
+    def __init__(self, db_path: str = "archaeologist.db"):
+        """
+        Initialize database connection.
+
+        Args:
+            db_path: Path to SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to connect to database: {e}")
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the status table if it doesn't exist."""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS watch_status (
+                    watcher_id TEXT PRIMARY KEY,
+                    roots TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    queue_depth INTEGER DEFAULT 0,
+                    in_flight INTEGER DEFAULT 0,
+                    oldest_pending_s REAL DEFAULT 0,
+                    events INTEGER DEFAULT 0,
+                    ingested INTEGER DEFAULT 0,
+                    skipped INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    last_lag_s REAL,
+                    avg_lag_s REAL,
+                    max_lag_s REAL
+                )
+            """)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to initialize watch status: {e}")
+
+    def update(self, watcher_id: str, status: dict) -> None:
+        """
+        Write the current status of a watcher.
+
+        Args:
+            watcher_id: Id of the watcher
+            status: Values of the watch_status columns
+        """
+        columns = ["watcher_id"] + list(status)
+        with self._lock:
+            try:
+                self.conn.execute(
+                    f"""INSERT INTO watch_status ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+                        ON CONFLICT(watcher_id) DO UPDATE SET
+                        {', '.join(f'{column} = excluded.{column}' for column in status)},
+                        updated_at = CURRENT_TIMESTAMP""",
+                    [watcher_id, *status.values()]
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise RuntimeError(f"Failed to write watch status: {e}")
+
+    def remove(self, watcher_id: str) -> None:
+        """Drop the row of a stopped watcher."""
+        with self._lock:
+            self.conn.execute("DELETE FROM watch_status WHERE watcher_id = ?", (watcher_id,))
+            self.conn.commit()
+
+    def all(self) -> List[dict]:
+        """
+        Get all watcher rows.
+
+        Returns:
+            List of dictionaries, with seconds_since_update added
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                """SELECT *, (julianday('now') - julianday(updated_at)) * 86400 AS seconds_since_update
+                   FROM watch_status ORDER BY started_at"""
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Close database connection."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensures connection is closed."""
+        self.close()
+
+
+class WatchDaemon:
+    """
+    Feeds changed files of watched folders into an ingestion handler.
+
+    Usage:
+        daemon = WatchDaemon([Path("inbox")], pipeline.run, patterns=["*.md"])
+        daemon.run()
+    """
+
+    def __init__(
+        self,
+        roots: Sequence[Path],
+        handler: Callable[..., dict],
+        patterns: Sequence[str] = ("*.txt", "*.md"),
+        recursive: bool = True,
+        use_inotify: bool = True,
+        poll_interval: float = 2.0,
+        debouncer: Optional[Debouncer] = None,
+        manifest: Optional[FileManifest] = None,
+        status: Optional[WatchStatus] = None,
+        batch_size: int = 64
+    ):
+        """
+        Initialize daemon.
+
+        Args:
+            roots: Folders to watch
+            handler: Called with settled paths and replaces (path -> id of the document
+                stored from the file's previous revision, from the manifest), like
+                IngestPipeline.run(); returns its summary
+            patterns: Glob patterns of the file names to ingest
+            recursive: Include subfolders
+            use_inotify: Use inotify where available (otherwise poll)
+            poll_interval: Seconds between snapshots of the polling fallback
+            debouncer: Event coalescing (default: 1s quiet, 10s max delay)
+            manifest: File manifest; unchanged files (e.g. only touched) are not
+                handed to the handler, the startup catch-up only reads new files, and
+                edited files replace the document of their previous revision
+            status: Where queue depth and lag are published
+            batch_size: Most paths per handler call
+
+        Raises:
+            ValueError: If a root is not a directory
+        """
+        for root in roots:
+            if not Path(root).is_dir():
+                raise ValueError(f"Path is not a directory: {root}")
+
+        self.roots = [Path(root) for root in roots]
+        self.handler = handler
+        self.patterns = list(patterns)
+        self.recursive = recursive
+        self.use_inotify = use_inotify
+        self.poll_interval = poll_interval
+        self.debouncer = debouncer or Debouncer()
+        self.manifest = manifest
+        self.status = status
+        self.batch_size = batch_size
+        self.watcher_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.mode: Optional[str] = None
+        self.in_flight = 0
+        self.stats = {"events": 0, "ingested": 0, "skipped": 0, "failed": 0, "batches": 0}
+        self._lags: List[float] = []
+        self._stop = threading.Event()
+
+    def _matches(self, path: Path) -> bool:
+        """Whether a file name matches one of the patterns."""
+        return any(fnmatch.fnmatch(path.name, pattern) for pattern in self.patterns)
+
+    def _open_watcher(self):
+        """inotify if possible, otherwise polling."""
+        if self.use_inotify and inotify_available():
+            try:
+                watcher = InotifyWatcher(self.roots, self.recursive)
+                self.mode = "inotify"
+                return watcher
+            except RuntimeError as e:
+                logger.warning(f"{e} - falling back to polling")
+        self.mode = "polling"
+        return PollingWatcher(self.roots, self.recursive, self.poll_interval)
+
+    def _enqueue(self, paths: Iterable[Path]) -> None:
+        """Queue matching files, filtering out files the manifest knows as unchanged."""
+        paths = [path for path in paths if self._matches(path)]
+        if self.manifest is not None and paths:
+            paths = self.manifest.scan(paths).to_read
+        for path in paths:
+            self.debouncer.add(path)
+
+    def catch_up(self) -> None:
+        """Queue files that are new or changed since the last run."""
+        self._enqueue(iter_files(self.roots, self.recursive))
+        logger.info(f"Catch-up: {len(self.debouncer)} new or modified file(s) queued")
+
+    def _watch(self, watcher) -> None:
+        """Event thread: move watcher events into the debouncer."""
+        while not self._stop.is_set():
+            try:
+                paths = watcher.poll(0.5)
+            except Exception as e:
+                logger.error(f"Watcher failed: {e}")
+                self._stop.set()
+                break
+            if RESCAN in paths:
+                logger.warning("Event queue overflowed - rescanning watched folders")
+                paths = list(iter_files(self.roots, self.recursive))
+            self.stats["events"] += len(paths)
+            self._enqueue(paths)
+
+    def _publish(self) -> None:
+        """Write queue depth and lag to the status table."""
+        if self.status is None:
+            return
+        lags = self._lags
+        try:
+            self.status.update(self.watcher_id, {
+                "roots": ", ".join(str(root) for root in self.roots),
+                "mode": self.mode,
+                "queue_depth": len(self.debouncer),
+                "in_flight": self.in_flight,
+                "oldest_pending_s": round(self.debouncer.oldest_age(), 3),
+                "events": self.stats["events"],
+                "ingested": self.stats["ingested"],
+                "skipped": self.stats["skipped"],
+                "failed": self.stats["failed"],
+                "last_lag_s": round(lags[-1], 3) if lags else None,
+                "avg_lag_s": round(sum(lags) / len(lags), 3) if lags else None,
+                "max_lag_s": round(max(lags), 3) if lags else None
+            })
+        except RuntimeError as e:
+            logger.warning(str(e))
+
+    def _ingest(self, batch: List[Tuple[Path, float]]) -> None:
+        """Hand a batch to the handler and account lag (first event -> stored)."""
+        first_seen = {str(path): first for path, first in batch}
+        paths = [path for path, _ in batch]
+        self.in_flight = len(batch)
+        self._publish()
+        try:
+            # Edited files are stored over their previous revision instead of next to it
+            replaces = self.manifest.doc_ids(paths) if self.manifest is not None else {}
+            summary = self.handler(paths, replaces=replaces)
+        except Exception as e:
+            logger.error(f"Ingestion of {len(batch)} file(s) failed: {e}")
+            self.stats["failed"] += len(batch)
+            return
+        finally:
+            self.in_flight = 0
+
+        now = time.monotonic()
+        self.stats["batches"] += 1
+        for result in summary.get("results", []):
+            if result["status"] == "stored":
+                self.stats["ingested"] += 1
+                self._lags.append(now - first_seen.get(result["path"], now))
+            elif result["status"] == "skipped":
+                self.stats["skipped"] += 1
+            else:
+                self.stats["failed"] += 1
+            if self.manifest is not None and result.get("content_hash") and result["status"] != "failed":
+                try:
+                    # Only a stored document belongs to this file (a duplicate's belongs to another)
+                    self.manifest.record(Path(result["path"]), result["content_hash"], result["doc_id"])
+                except (OSError, RuntimeError):
+                    pass
+        # Bounded history for the averages
+        self._lags = self._lags[-1000:]
+
+        lag = f", last lag {self._lags[-1]:.1f}s" if self._lags else ""
+        logger.info(
+            f"Ingested batch of {len(batch)}: {summary.get('stored', 0)} stored, "
+            f"{summary.get('skipped', 0)} skipped, {summary.get('failed', 0)} failed; "
+            f"queue {len(self.debouncer)}{lag}"
+        )
+
+    def run(self, catch_up: bool = True) -> dict:
+        """
+        Watch and ingest until stop() is called or the process is interrupted.
+
+        Args:
+            catch_up: First queue files that changed while no watcher was running
+
+        Returns:
+            Counters (events, ingested, skipped, failed, batches) and lag statistics
+        """
+        watcher = self._open_watcher()
+        logger.info(f"Watching {', '.join(str(root) for root in self.roots)} ({self.mode})")
+        if catch_up:
+            self.catch_up()
+
+        thread = threading.Thread(target=self._watch, args=(watcher,), name="watch-events", daemon=True)
+        thread.start()
+        try:
+            while not self._stop.is_set():
+                ready = self.debouncer.ready()
+                if not ready:
+                    self._publish()
+                    self._stop.wait(min(0.5, self.debouncer.quiet_s))
+                    continue
+                for start in range(0, len(ready), self.batch_size):
+                    self._ingest(ready[start:start + self.batch_size])
+                self._publish()
+        finally:
+            self._stop.set()
+            thread.join(timeout=2)
+            watcher.close()
+            if self.status is not None:
+                try:
+                    self.status.remove(self.watcher_id)
+                except sqlite3.Error:
+                    pass
+
+        lags = self._lags
+        return {
+            **self.stats,
+            "avg_lag_s": round(sum(lags) / len(lags), 3) if lags else None,
+            "max_lag_s": round(max(lags), 3) if lags else None
+        }
+
+    def stop(self) -> None:
+        """Ask run() to return after the current batch."""
+        self._stop.set()
@@ -0,0 +1,154 @@
+"""
+Watch Mode for Never-Tired-Archaeologist
+
+Watches folders and ingests new or edited documents within seconds:
+filesystem events (inotify, or polling where inotify is unavailable) are
+debounced and the settled files run through the concurrent ingestion
+pipeline. Queue depth and lag are published for the web interface
+(/api/watch).
+
+Usage:
+    python watch_documents.py inbox
+    python watch_documents.py docs notes --pattern "*.md" --quiet 2 --poll
+"""
+
+import logging
+import signal
+import sys
+from pathlib import Path
+
+from src import Analyzer, DocDatabase, LocalEmbedder, MetadataCache
+from src.dedup import NearDuplicateIndex
+from src.extractors import EXTRACTABLE_PATTERNS, ExtractorPool
+from src.fake_anthropic import FAKE_DB_PATH, FakeAnthropicServer
+from src.ledger import UsageLedger
+from src.local_extractor import FastPathPolicy, LocalExtractor
+from src.manifest import FileManifest
+from src.normalize import TextNormalizer
+from src.pipeline import IngestPipeline
+from src.watcher import Debouncer, WatchDaemon, WatchStatus
+
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler('archaeologist.log')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Watch folders and ingest new or edited documents")
+    parser.add_argument("folders", nargs="+", help="Folders to watch")
+    parser.add_argument("--pattern", "-p", action="append",
+                        help="File pattern to ingest (repeatable; default: text, Markdown, PDF, DOCX, HTML, CSV)")
+    parser.add_argument("--no-recursive", action="store_true", help="Do not watch subfolders")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    parser.add_argument("--interval", type=float, default=2.0,
+                        help="Seconds between snapshots when polling (default: 2)")
+    parser.add_argument("--quiet", type=float, default=1.0,
+                        help="Seconds a file must be unchanged before it is ingested (default: 1)")
+    parser.add_argument("--max-delay", type=float, default=10.0,
+                        help="Ingest a file at the latest this many seconds after its first change (default: 10)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent Claude analyses (default: 8)")
+    parser.add_argument("--no-catch-up", action="store_true",
+                        help="Ignore files changed while the watcher was not running")
+    parser.add_argument("--no-fast-path", action="store_true", help="Always use Claude, also for trivial documents")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Analyze near-duplicates instead of reusing their metadata")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="Embed and analyze the text as read (keep images, boilerplate, whitespace)")
+    parser.add_argument("--fake", action="store_true",
+                        help=f"Use a local fake API (offline, no costs); stores into {FAKE_DB_PATH}")
+    parser.add_argument("--db", type=str, help=f"Database path (default: archaeologist.db, {FAKE_DB_PATH} with --fake)")
+    args = parser.parse_args()
+    args.db = args.db or (FAKE_DB_PATH if args.fake else "archaeologist.db")
+
+    fake_server = FakeAnthropicServer().start() if args.fake else None
+    normalizer = None if args.no_normalize else TextNormalizer()
+
+    db = DocDatabase(args.db)
+    embedder = LocalEmbedder()
+    ledger = UsageLedger(args.db)
+    analyzer = Analyzer(
+        cache=MetadataCache(args.db),
+        ledger=ledger,
+        api_key="fake" if fake_server else None,
+        base_url=fake_server.url if fake_server else None
+    )
+
+    local_extractor = None
+    if not args.no_fast_path:
+        local_extractor = LocalExtractor(
+            normalizer.normalize(content) if normalizer else content
+            for _, content, _ in db.get_all_documents()
+        )
+
+    dedup = None
+    if not args.no_dedup:
+        dedup = NearDuplicateIndex(args.db)
+        dedup.backfill(normalizer.normalize if normalizer else None)
+
+    pipeline = IngestPipeline(
+        db=db,
+        embedder=embedder,
+        analyzer=analyzer,
+        normalizer=normalizer,
+        local_extractor=local_extractor,
+        fast_path=None if args.no_fast_path else FastPathPolicy(),
+        dedup=dedup,
+        analyze_workers=args.workers,
+        extractors=ExtractorPool()
+    )
+
+    manifest = FileManifest(args.db)
+    status = WatchStatus(args.db)
+    daemon = WatchDaemon(
+        [Path(folder) for folder in args.folders],
+        pipeline.run,
+        patterns=args.pattern or ["*.txt", "*.md", *EXTRACTABLE_PATTERNS],
+        recursive=not args.no_recursive,
+        use_inotify=not args.poll,
+        poll_interval=args.interval,
+        debouncer=Debouncer(args.quiet, args.max_delay),
+        manifest=manifest,
+        status=status
+    )
+
+    # Service managers stop daemons with SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+
+    try:
+        totals = daemon.run(catch_up=not args.no_catch_up)
+    except KeyboardInterrupt:
+        daemon.stop()
+        totals = daemon.stats
+        print("\n[WARNING] Watch mode stopped by user")
+
+    logger.info(
+        f"Watch mode ended: {totals['ingested']} ingested, {totals['skipped']} skipped, "
+        f"{totals['failed']} failed from {totals['events']} event(s)"
+    )
+    run_totals = ledger.run_totals()
+    logger.info(
+        f"LLM usage (run {ledger.run_id}): {run_totals['requests']} request(s), ~${run_totals['cost_usd']:.4f}"
+    )
+
+    if dedup is not None:
+        dedup.close()
+    pipeline.extractors.close()
+    status.close()
+    manifest.close()
+    ledger.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
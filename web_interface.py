@@ -9,13 +9,16 @@ from typing import List, Dict, Optional
 import json
 from datetime import datetime
 import hashlib
+import threading
 
 from flask import Flask, render_template, request, jsonify, send_from_directory
 import numpy as np
 
+from src.cache import LRUCache
 from src.database import DocDatabase
 from src.embedder import LocalEmbedder
 from src.models import DocumentMetadata
+from src.watcher import WatchStatus
 
 
 # Configure logging
@@ -30,6 +33,118 @@ app.config['JSON_AS_ASCII'] = False  # Support for UTF-8
 db = DocDatabase()
 embedder = None  # Lazy load
 
+# Query text -> embedding vector (independent of the corpus, so only size/TTL bound)
+query_embedding_cache = LRUCache(maxsize=512, ttl=3600)
+
+# (query, limit) -> ranked result list, dropped whenever the corpus changes
+search_result_cache = LRUCache(maxsize=128)
+_cached_corpus_version = None
+watch_status = None  # Lazy load
+
+
+class EmbeddingIndex:
+    """
+    In-memory matrix of normalized document embeddings for semantic search.
+
+    refresh() only loads documents added since the previous refresh (higher
+    ids), so documents ingested by watch_documents.py become searchable
+    without re-reading the whole corpus; it reloads everything only when
+    documents were removed or re-analyzed (new metadata_history rows).
+    """
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.metadata: List[Dict] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.last_id = 0
+        self.last_revision = 0
+        self.refreshed_at: Optional[str] = None
+        self.added_last_refresh = 0
+        self.full_reloads = 0
+        self._lock = threading.Lock()
+
+    def _load(self, cursor, after_id: int) -> tuple:
+        cursor.execute(
+            "SELECT id, metadata_json, embedding_json FROM documents "
+            "WHERE embedding_json IS NOT NULL AND id > ? ORDER BY id",
+            (after_id,)
+        )
+        ids, metadata, vectors = [], [], []
+        for doc_id, metadata_json, embedding_json in cursor.fetchall():
+            ids.append(doc_id)
+            metadata.append(json.loads(metadata_json))
+            vectors.append(json.loads(embedding_json))
+        if not vectors:
+            return ids, metadata, None
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return ids, metadata, matrix
+
+    def refresh(self, cursor) -> int:
+        """Add new documents; returns how many were added."""
+        cursor.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0), (SELECT COALESCE(MAX(id), 0) FROM metadata_history) "
+            "FROM documents WHERE embedding_json IS NOT NULL"
+        )
+        # Every in-place update of a document adds a metadata_history row
+        count, max_id, revision = cursor.fetchone()
+        with self._lock:
+            if count == len(self.ids) and max_id == self.last_id and revision == self.last_revision:
+                return 0
+            ids, metadata, matrix = self._load(cursor, self.last_id)
+            if len(self.ids) + len(ids) == count and (revision == self.last_revision or not self.ids):
+                self.ids += ids
+                self.metadata += metadata
+                if matrix is not None:
+                    self.matrix = matrix if self.matrix is None else np.vstack([self.matrix, matrix])
+            else:
+                # Documents were removed or updated in place: rebuild
+                self.ids, self.metadata, self.matrix = self._load(cursor, 0)
+                self.full_reloads += 1
+            self.last_id = self.ids[-1] if self.ids else 0
+            self.last_revision = revision
+            self.added_last_refresh = len(ids)
+            self.refreshed_at = datetime.now().isoformat(timespec='seconds')
+            return len(ids)
+
+    def search(self, query_embedding: List[float], limit: int, exclude_id: Optional[int] = None) -> List[Dict]:
+        """Rank documents by cosine similarity to a query embedding."""
+        with self._lock:
+            if self.matrix is None:
+                return []
+            query = np.asarray(query_embedding, dtype=np.float32)
+            scores = self.matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+            order = np.argsort(-scores)
+            results = []
+            for index in order:
+                if self.ids[index] == exclude_id:
+                    continue
+                metadata = self.metadata[index]
+                results.append({
+                    'id': self.ids[index],
+                    'title': metadata.get('title', 'Untitled'),
+                    'language': metadata.get('language', 'unknown'),
+                    'topics': metadata.get('topics', []),
+                    'summary': metadata.get('summary', ''),
+                    'similarity': round(float(scores[index]), 4)
+                })
+                if len(results) >= limit:
+                    break
+            return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'documents': len(self.ids),
+                'last_id': self.last_id,
+                'refreshed_at': self.refreshed_at,
+                'added_last_refresh': self.added_last_refresh,
+                'full_reloads': self.full_reloads
+            }
+
+
+embedding_index = EmbeddingIndex()
+
 
 def get_embedder():
     """Lazy load embedder (heavy operation)"""
@@ -40,18 +155,50 @@ def get_embedder():
     return embedder
 
 
+def normalize_query(query: str) -> str:
+    """Normalize query text (whitespace collapsed; case is kept, the embedder may be cased)"""
+    return " ".join(query.split())
+
+
+def get_query_embedding(query_text: str) -> List[float]:
+    """Return the embedding for a query, served from the LRU cache when possible"""
+    key = normalize_query(query_text)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        # The normalized text is both the key and what gets embedded
+        embedding = get_embedder().generate_embedding(key)
+        query_embedding_cache.put(key, embedding)
+    return embedding
+
+
+def invalidate_search_cache():
+    """Drop cached result lists (call after adding documents in this process)"""
+    search_result_cache.clear()
+
+
+def _check_corpus_version():
+    """
+    Invalidate cached result lists if another connection changed the database.
+
+    PRAGMA data_version changes whenever a different connection commits,
+    so documents added by main.py, organize_documents.py or the watcher are
+    picked up; the embedding index then loads just the new documents.
+    """
+    global _cached_corpus_version
+    cursor = db.conn.cursor()
+    cursor.execute("PRAGMA data_version")
+    version = cursor.fetchone()[0]
+    if version != _cached_corpus_version:
+        invalidate_search_cache()
+        embedding_index.refresh(cursor)
+        _cached_corpus_version = version
+
+
 def compute_hash(content: str) -> str:
     """Compute SHA256 hash of document content"""
     return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
 
-def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """Calculate cosine similarity between two vectors"""
-    a = np.array(vec1)
-    b = np.array(vec2)
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
-
-
 @app.route('/')
 def index():
     """Home page with search interface"""
@@ -153,38 +300,27 @@ def semantic_search():
         return jsonify({'error': 'Query text is required'}), 400
 
     try:
-        # Generate embedding for query
-        emb = get_embedder()
-        query_embedding = emb.generate_embedding(query_text)
-
-        # Get all documents with embeddings
-        cursor = db.conn.cursor()
-        cursor.execute("SELECT id, metadata_json, embedding_json FROM documents WHERE embedding_json IS NOT NULL")
-
-        similarities = []
-        for row in cursor.fetchall():
-            doc_id, metadata_json, embedding_json = row
-            doc_embedding = json.loads(embedding_json)
-
-            similarity = cosine_similarity(query_embedding, doc_embedding)
-            metadata = json.loads(metadata_json)
-
-            similarities.append({
-                'id': doc_id,
-                'title': metadata.get('title', 'Untitled'),
-                'language': metadata.get('language', 'unknown'),
-                'topics': metadata.get('topics', []),
-                'summary': metadata.get('summary', ''),
-                'similarity': round(similarity, 4)
+        _check_corpus_version()
+        result_key = (normalize_query(query_text), limit)
+        cached = search_result_cache.get(result_key)
+        if cached is not None:
+            return jsonify({
+                'query': query_text,
+                'total_results': len(cached),
+                'results': cached
             })
 
-        # Sort by similarity (highest first)
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
+        # Generate embedding for query (cached by normalized text)
+        query_embedding = get_query_embedding(query_text)
+
+        # Rank all documents with embeddings (highest similarity first)
+        top_results = embedding_index.search(query_embedding, limit)
+        search_result_cache.put(result_key, top_results)
 
         return jsonify({
             'query': query_text,
-            'total_results': len(similarities[:limit]),
-            'results': similarities[:limit]
+            'total_results': len(top_results),
+            'results': top_results
         })
 
     except Exception as e:
@@ -234,33 +370,15 @@ def find_similar(doc_id):
     query_metadata = json.loads(row[1])
 
     # Find similar documents
-    cursor.execute("SELECT id, metadata_json, embedding_json FROM documents WHERE id != ? AND embedding_json IS NOT NULL", (doc_id,))
-
-    similarities = []
-    for row in cursor.fetchall():
-        other_id, metadata_json, embedding_json = row
-        doc_embedding = json.loads(embedding_json)
-
-        similarity = cosine_similarity(query_embedding, doc_embedding)
-        metadata = json.loads(metadata_json)
-
-        similarities.append({
-            'id': other_id,
-            'title': metadata.get('title', 'Untitled'),
-            'language': metadata.get('language', 'unknown'),
-            'topics': metadata.get('topics', []),
-            'summary': metadata.get('summary', ''),
-            'similarity': round(similarity, 4)
-        })
-
-    similarities.sort(key=lambda x: x['similarity'], reverse=True)
+    _check_corpus_version()
+    similarities = embedding_index.search(query_embedding, limit, exclude_id=doc_id)
 
     return jsonify({
         'source_document': {
             'id': doc_id,
             'title': query_metadata.get('title', 'Untitled')
         },
-        'similar_documents': similarities[:limit]
+        'similar_documents': similarities
     })
 
 
@@ -298,7 +416,30 @@ def get_stats():
         'total_documents': total,
         'documents_with_embeddings': with_embeddings,
         'languages': languages,
-        'top_topics': [{'topic': t[0], 'count': t[1]} for t in top_topics]
+        'top_topics': [{'topic': t[0], 'count': t[1]} for t in top_topics],
+        'cache': {
+            'query_embeddings': query_embedding_cache.stats(),
+            'search_results': search_result_cache.stats()
+        }
+    })
+
+
+@app.route('/api/watch')
+def get_watch_status():
+    """Queue depth and lag of running watchers, and the state of the search index"""
+    global watch_status
+    if watch_status is None:
+        watch_status = WatchStatus(str(db.db_path))
+
+    _check_corpus_version()
+    watchers = watch_status.all()
+    for watcher in watchers:
+        # A watcher that stopped updating was probably killed
+        watcher['stale'] = watcher['seconds_since_update'] > 30
+
+    return jsonify({
+        'watchers': watchers,
+        'index': embedding_index.stats()
     })
 
 